@@ -3,9 +3,29 @@ import re
 from dronecontrol.tools import tools as tools_module
 from dronecontrol.follow import follow as follow_entry
 from dronecontrol.hands import mapper as hands_entry
+from dronecontrol.common.executor import ExecutorMode
+from dronecontrol.common.recorder import RecordFormat
+from dronecontrol.common.scheduler import LatePolicy
+from dronecontrol.common.pilot import System
+from dronecontrol.common.video_source import SyntheticSource
 
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+EXECUTOR_CHOICE = click.Choice([mode.name.lower() for mode in ExecutorMode])
+EXECUTOR_HELP = "where to run blocking vision calls: on the event loop, in a worker thread or also pose detection in worker processes"
+MONITOR_HELP = "record event loop lag, action timings and slow callbacks and save them to a JSON file"
+METRICS_PORT_HELP = "serve performance metrics in the Prometheus format on http://localhost:PORT/metrics"
+METRICS_FILE_HELP = "write performance metrics in the Prometheus format to a file every few seconds"
+GESTURE_MODEL_HELP = "gesture model trained with tools train-gestures to use instead of the rule-based detector"
+ADAPTIVE_HELP = "run detection less often while the image is not changing, back to every frame on motion"
+READY_HELP = f"pilot health checks required before flying among {', '.join(System.HEALTH_CHECKS)}, empty for none"
+
+def parse_ready_checks(ctx, param, value):
+    checks = tuple(value.replace(",", " ").split())
+    unknown = [check for check in checks if check not in System.HEALTH_CHECKS]
+    if unknown:
+        raise click.BadParameter(f"unknown checks {', '.join(unknown)}")
+    return checks
 
 @click.group(context_settings=CONTEXT_SETTINGS)
 def main():
@@ -16,16 +36,47 @@ def main():
 @click.option("-p", "--port", type=int, help="port for UDP connections")
 @click.option("-s", "--serial", is_flag=False, flag_value="", help="connect to drone system through serial, default device is /dev/ttyUSB0")
 @click.option("-f", "--file", type=click.Path(exists=True, readable=True), help="file to use as source instead of the camera")
-def hand(ip, port, serial, file):
-    hands_entry.main(ip, port, serial, file)
+@click.option("-k", "--terminal-keys", "read_terminal", is_flag=True, help="also read keyboard commands typed in the terminal")
+@click.option("--executor", default="thread", type=EXECUTOR_CHOICE, help=EXECUTOR_HELP)
+@click.option("--monitor", "monitor_file", type=click.Path(dir_okay=False, writable=True), help=MONITOR_HELP)
+@click.option("--hold-frames", type=int, help="frames a gesture must be seen before it is acted on")
+@click.option("--hold-time", type=float, help="seconds a gesture must be seen before it is acted on")
+@click.option("--two-hands", "yaw_hand", type=click.Choice(["Left", "Right"], case_sensitive=False),
+              help="control with both hands, the given hand for yaw and altitude and the other for movement")
+@click.option("--continuous", is_flag=True, help="move with velocities proportional to the open hand displacement instead of fixed steps")
+@click.option("--ready-checks", default=" ".join(System.READY_CHECKS), callback=parse_ready_checks, help=READY_HELP)
+@click.option("--metrics-port", type=int, help=METRICS_PORT_HELP)
+@click.option("--metrics-file", type=click.Path(dir_okay=False, writable=True), help=METRICS_FILE_HELP)
+@click.option("--adaptive", "adaptive_inference", is_flag=True, help=ADAPTIVE_HELP)
+@click.option("--gesture-model", type=click.Path(exists=True, dir_okay=False), help=GESTURE_MODEL_HELP)
+def hand(ip, port, serial, file, read_terminal, executor, monitor_file, hold_frames, hold_time, yaw_hand, continuous, ready_checks,
+         metrics_port, metrics_file, adaptive_inference, gesture_model):
+    hands_entry.main(ip, port, serial, file, read_terminal, ExecutorMode[executor.upper()], monitor_file,
+                     hold_frames, hold_time, yaw_hand.capitalize() if yaw_hand else None, continuous, ready_checks,
+                     metrics_port, metrics_file, adaptive_inference, gesture_model)
 
 @main.command()
 @click.option("--ip", default="", help="pilot IP address, ignored if serial is provided")
 @click.option("-p", "--port", default=None, help="pilot UDP port, ignored if serial is provided, default is 14540")
 @click.option("--sim", "simulator", is_flag=False, flag_value="", help="run with AirSim as flight engine, optionally provide ip the sim listens to")
 @click.option("-s", "--serial", is_flag=False, flag_value="", help="use serial to connect to PX4 (HITL), optionally provide the address of the serial port")
-def follow(ip, port, simulator, serial):
-    follow_entry.main(ip, simulator, serial, port)
+@click.option("-k", "--terminal-keys", "read_terminal", is_flag=True, help="also read keyboard commands typed in the terminal")
+@click.option("--executor", default="thread", type=EXECUTOR_CHOICE, help=EXECUTOR_HELP)
+@click.option("--monitor", "monitor_file", type=click.Path(dir_okay=False, writable=True), help=MONITOR_HELP)
+@click.option("--trace", "trace_file", type=click.Path(dir_okay=False, writable=True), help="record per-frame stage spans and save them to a Chrome trace file on exit or when pressing [p]")
+@click.option("-m", "--multi-person", is_flag=True, help="track everyone in view and follow only the locked person, press [n] to switch")
+@click.option("-r", "--rate", default=follow_entry.LOOP_RATE, type=float, help="target loop rate in Hz, 0 runs as fast as possible")
+@click.option("--late-policy", default="skip_render", type=click.Choice([policy.name.lower() for policy in LatePolicy]),
+              help="when a loop cycle is late skip showing the image, skip the missed cycles or run detection less often")
+@click.option("--ready-checks", default=" ".join(System.READY_CHECKS), callback=parse_ready_checks, help=READY_HELP)
+@click.option("--metrics-port", type=int, help=METRICS_PORT_HELP)
+@click.option("--metrics-file", type=click.Path(dir_okay=False, writable=True), help=METRICS_FILE_HELP)
+@click.option("--adaptive", "adaptive_inference", is_flag=True, help=ADAPTIVE_HELP + " and the person is centred")
+def follow(ip, port, simulator, serial, read_terminal, executor, monitor_file, trace_file, multi_person, rate, late_policy,
+           ready_checks, metrics_port, metrics_file, adaptive_inference):
+    follow_entry.main(ip, simulator, serial, port, read_terminal, ExecutorMode[executor.upper()], monitor_file,
+                      trace_file, multi_person, rate, LatePolicy[late_policy.upper()], ready_checks, metrics_port, metrics_file,
+                      adaptive_inference)
 
 @main.group()
 def tools():
@@ -38,14 +89,24 @@ def tools():
 @click.option("-c", "--camera", "use_camera", is_flag=True, help="use a physical camera as source")
 @click.option("-h", "--hand-detection", "use_hands", is_flag=True, help="use hand detection for image processing")
 @click.option("-p", "--pose-detection", "use_pose", is_flag=True, help="use pose detection for image processing")
-@click.option("-f", "--file", help="file name to use as video source")
-def test_camera(simulator, hardware, use_wsl, use_camera, use_hands, use_pose, file):
+@click.option("-f", "--file", help="video file, frame archive or recording folder to use as video source")
+@click.option("--cache", "cache_dir", type=click.Path(file_okay=False), help="folder to cache detected landmarks for reuse on the same images")
+@click.option("--executor", default="thread", type=EXECUTOR_CHOICE, help=EXECUTOR_HELP)
+@click.option("--max-speed", is_flag=True, help="read the video file as fast as possible instead of at its frame rate")
+@click.option("--skip", default=0, help="frames of the video file dropped after each one read, to simulate slower cameras")
+@click.option("--record-format", default="mjpg", type=click.Choice([f.name.lower() for f in RecordFormat]),
+              help="encoding of recorded videos: motion JPEG, lossless FFV1, raw frames or a frame archive, all with a timestamp index")
+@click.option("--monitor", "monitor_file", type=click.Path(dir_okay=False, writable=True), help=MONITOR_HELP)
+def test_camera(simulator, hardware, use_wsl, use_camera, use_hands, use_pose, file, cache_dir, executor, max_speed, skip,
+                record_format, monitor_file):
     tools_module.test_camera(simulator is not None, hardware is not None, use_wsl, use_camera, 
-                             use_hands, use_pose, hardware, simulator, file)
+                             use_hands, use_pose, hardware, simulator, file, cache_dir,
+                             ExecutorMode[executor.upper()], not max_speed, skip, RecordFormat[record_format.upper()],
+                             monitor_file)
 
 @tools.command()
 @click.option("--yaw/--forward", default=True, help="test the controller yaw or forward movement")
-@click.option("-f", "--file", default=None, help="file name to use as data source")
+@click.option("-f", "--file", default=None, help="results folder or older JSON results file to plot instead of running the test")
 def test_controller(yaw, file):
     tools_module.test_controller(yaw, file)
 
@@ -62,5 +123,81 @@ def tune(yaw, manual, time, kp_values, ki_values, kd_values):
     kd_values = [float(n) for n in re.sub('[^\-\.\d\s]', '', kd_values).split(" ")]
     tools_module.tune_pid(yaw, manual, time, kp_values, ki_values, kd_values)
 
+@tools.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("-o", "--output", default="gestures.npz", type=click.Path(dir_okay=False, writable=True), help="file to save the trained model to")
+@click.option("-j", "--jobs", type=int, default=None, help="number of worker processes, defaults to the number of CPUs")
+@click.option("--cache/--no-cache", "use_cache", default=True, help="reuse the landmarks stored in previous runs")
+@click.option("--hidden", "hidden_units", default=32, help="units in the hidden layer of the model")
+@click.option("-e", "--epochs", default=300, help="passes over the training hands")
+@click.option("--validation", default=0.2, help="fraction of the files held out to measure the accuracy")
+def train_gestures(directory, output, jobs, use_cache, hidden_units, epochs, validation):
+    tools_module.train_gestures(directory, output, jobs, use_cache, hidden_units, epochs, validation)
+
+@tools.group()
+def benchmark():
+    pass
+
+@benchmark.command("gestures")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("-j", "--jobs", type=int, default=None, help="number of worker processes, defaults to the number of CPUs")
+@click.option("--cache/--no-cache", "use_cache", default=True, help="reuse the landmarks stored in previous runs")
+@click.option("-m", "--model", type=click.Path(exists=True, dir_okay=False), help=GESTURE_MODEL_HELP)
+def benchmark_gestures(directory, jobs, use_cache, model):
+    tools_module.benchmark_gestures(directory, jobs, use_cache, model)
+
+@benchmark.command("tracking")
+@click.option("-n", "--frames", default=100, help="number of frames to render for each crowd size")
+@click.option("-p", "--people", default="1 3 10", help="crowd sizes to test")
+@click.option("--sprite", type=click.Path(exists=True, dir_okay=False), help="image with transparency or video clip of a person on a plain background to use instead of a drawn figure")
+@click.option("--background", type=click.Path(exists=True, dir_okay=False), help="image to use as background")
+def benchmark_tracking(frames, people, sprite, background):
+    tools_module.benchmark_tracking(frames, [int(n) for n in people.split()], sprite, background)
+
+@benchmark.command("follow")
+@click.option("-n", "--frames", default=600, help="number of frames to run")
+@click.option("-t", "--trajectory", default="sideways", type=click.Choice(SyntheticSource.TRAJECTORIES), help="path the synthetic person walks")
+@click.option("--sprite", type=click.Path(exists=True, dir_okay=False), help="image with transparency or video clip of a person on a plain background to use instead of a drawn figure")
+@click.option("--background", type=click.Path(exists=True, dir_okay=False), help="image to use as background")
+@click.option("-s", "--speed", default=0.5, help="walking speed of the person in m/s")
+@click.option("--closed-loop/--open-loop", default=True, help="turn and move the camera with the controller outputs")
+def benchmark_follow(frames, trajectory, sprite, background, speed, closed_loop):
+    tools_module.benchmark_follow(frames, trajectory, sprite, background, closed_loop, speed)
+
+@benchmark.command("frames")
+@click.option("-n", "--frames", default=300, help="number of frames to process")
+def benchmark_frames(frames):
+    tools_module.benchmark_frames(frames)
+
+@benchmark.command("archive")
+@click.option("-n", "--frames", default=300, help="number of frames to record and replay")
+def benchmark_archive(frames):
+    tools_module.benchmark_archive(frames)
+
+@benchmark.command("camera")
+@click.option("-n", "--frames", default=300, help="number of frames to read")
+@click.option("-c", "--camera", default=0, help="index of the camera device")
+@click.option("--mjpg", "fourcc", flag_value="MJPG", default=None, help="request motion JPEG frames instead of the driver default")
+@click.option("--fps", type=float, help="frame rate to request")
+@click.option("--buffer-size", type=int, help="frames kept in the driver buffer")
+@click.option("--drain", is_flag=True, help="discard buffered frames to always read the newest one")
+@click.option("-w", "--work", default=0.0, help="seconds of simulated processing after each frame")
+def benchmark_camera(frames, camera, fourcc, fps, buffer_size, drain, work):
+    tools_module.benchmark_camera(frames, camera, fourcc, fps, buffer_size, drain, work)
+
+@benchmark.command("pid")
+@click.option("-n", "--gain-sets", default=100, help="number of random gain sets to simulate")
+@click.option("-s", "--steps", default=1000, help="time steps of each simulation")
+def benchmark_pid(gain_sets, steps):
+    tools_module.benchmark_pid(gain_sets, steps)
+
+@benchmark.command("fleet")
+@click.option("-n", "--count", default=2, help="number of vehicles, on consecutive UDP ports from 14540")
+@click.option("--ip", default=None, help="IP the vehicles connect to")
+@click.option("-r", "--rate", default=20.0, help="commands per second sent to each vehicle")
+@click.option("-t", "--time", "duration", default=10.0, help="seconds to run for each number of vehicles")
+def benchmark_fleet(count, ip, rate, duration):
+    tools_module.benchmark_fleet(count, ip, rate, duration)
+
 if __name__ == "__main__":
     main()
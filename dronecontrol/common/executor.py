@@ -0,0 +1,51 @@
+"""
+Executors to run blocking vision calls outside of the asyncio event loop
+
+@author: Laura Gonzalez
+"""
+
+import asyncio
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+class ExecutorMode(Enum):
+    INLINE = 0 # Run blocking calls directly on the event loop
+    THREAD = 1 # Run blocking calls in a worker thread
+    PROCESS = 2 # Also run CPU-bound Python calls in worker processes
+
+
+class VisionExecutor:
+    """Offload blocking calls so that the pilot coroutines keep running.
+
+    OpenCV and MediaPipe release the GIL while they work, so their calls
+    run in a thread pool. A single worker by default keeps calls to the
+    same model ordered. Pure Python work that holds the GIL can be sent
+    to a process pool with run_cpu, arguments and results must be picklable."""
+
+    def __init__(self, mode=ExecutorMode.THREAD, max_workers=1):
+        self.mode = mode
+        self.threads = ThreadPoolExecutor(max_workers, thread_name_prefix="vision") if mode != ExecutorMode.INLINE else None
+        self.processes = ProcessPoolExecutor(max_workers) if mode == ExecutorMode.PROCESS else None
+
+
+    async def run(self, func, *args):
+        """Await a blocking call that releases the GIL."""
+        if self.threads is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.threads, func, *args)
+
+
+    async def run_cpu(self, func, *args):
+        """Await a blocking call that holds the GIL."""
+        if self.processes is None:
+            return await self.run(func, *args)
+        return await asyncio.get_running_loop().run_in_executor(self.processes, func, *args)
+
+
+    def close(self):
+        """Wait for pending calls and stop the workers."""
+        if self.threads:
+            self.threads.shutdown()
+        if self.processes:
+            self.processes.shutdown()
@@ -0,0 +1,158 @@
+"""
+Control several vehicles from one process
+
+Each vehicle is a pilot System with its own mavsdk_server, as the
+MAVSDK API only talks to one vehicle per server. Embedded servers get
+consecutive gRPC ports and servers that are already running can be
+reused by address. Telemetry is cached from one subscription per
+stream so reading it never waits for a new stream.
+
+@author: Laura Gonzalez
+"""
+
+import asyncio
+import time
+import typing
+
+from dronecontrol.common import utils
+from dronecontrol.common.pilot import System
+
+
+class TelemetryCache:
+    """Keep the latest value of some telemetry streams of a vehicle."""
+    STREAMS = ("position", "velocity_ned", "heading", "flight_mode", "landed_state", "in_air", "armed", "battery")
+
+    def __init__(self, pilot: System, streams=STREAMS):
+        self.pilot = pilot
+        self.streams = streams
+        self.values = {}
+        self.updated = {}
+        self.__tasks = []
+
+
+    def start(self):
+        """Subscribe to every stream on the running event loop."""
+        self.__tasks = [asyncio.create_task(self.__follow(name)) for name in self.streams]
+
+
+    async def restart(self):
+        """Subscribe again after the streams were lost with the link."""
+        await self.stop()
+        self.start()
+
+
+    async def stop(self):
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+
+
+    def get(self, name: str, max_age: float=None):
+        """Return the last value of a stream, or None if there is none
+        or it is older than max_age seconds."""
+        if name not in self.values:
+            return None
+        if max_age is not None and time.perf_counter() - self.updated[name] > max_age:
+            return None
+        return self.values[name]
+
+
+    async def __follow(self, name):
+        async for value in getattr(self.pilot.mav.telemetry, name)():
+            self.values[name] = value
+            self.updated[name] = time.perf_counter()
+
+
+class Fleet:
+    """Connect to several vehicles and send actions to all or some of them.
+
+    Vehicles are identified by their index in the order they were given.
+    PX4 SITL instances listen on consecutive UDP ports, which is
+    the default when only a number of vehicles is given."""
+    BASE_GRPC_PORT = System.DEFAULT_GRPC_PORT
+
+    def __init__(self, count=0, ip=None, ports: typing.List[int]=None, serials: typing.List[str]=None,
+                 server_addresses: typing.List[str]=None):
+        """
+        count: number of vehicles on consecutive UDP ports from the default pilot port
+        ip: IP the vehicles connect to through UDP
+        ports: UDP port of each vehicle, overrides count
+        serials: serial address of each vehicle, added after the UDP ones
+        server_addresses: 'host' or 'host:port' of a running mavsdk_server for each vehicle in order,
+                          None or missing entries start an embedded server
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        ports = ports if ports else [System.DEFAULT_UDP_PORT + i for i in range(count)]
+        links = [dict(ip=ip, port=port) for port in ports] + \
+                [dict(use_serial=True, serial_address=serial) for serial in (serials or [])]
+        server_addresses = list(server_addresses or [])
+        server_addresses += [None] * (len(links) - len(server_addresses))
+
+        self.vehicles = [] # type: typing.List[System]
+        for link, address in zip(links, server_addresses):
+            grpc_port = self.BASE_GRPC_PORT + len(self.vehicles)
+            if address and ":" in address:
+                address, grpc_port = address.rsplit(":", 1)
+                grpc_port = int(grpc_port)
+            self.vehicles.append(System(**link, mavsdk_server_address=address, grpc_port=grpc_port))
+        self.telemetry = [TelemetryCache(vehicle) for vehicle in self.vehicles]
+        self.__queue_tasks = []
+
+
+    def __len__(self):
+        return len(self.vehicles)
+
+
+    @property
+    def connected(self) -> typing.List[int]:
+        """Indices of the vehicles that are ready."""
+        return [i for i, vehicle in enumerate(self.vehicles) if vehicle.is_ready]
+
+
+    async def connect(self) -> typing.List[int]:
+        """Connect to all vehicles at the same time and start their action
+        queues, link supervisors and telemetry caches. Return the indices of the connected vehicles."""
+        results = await asyncio.gather(*(vehicle.connect() for vehicle in self.vehicles), return_exceptions=True)
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                self.log.error(f"Vehicle {i} could not connect: {result!r}")
+                continue
+            self.telemetry[i].start()
+            self.vehicles[i].subscribe_to_reconnect(self.telemetry[i].restart)
+            self.__queue_tasks.append(asyncio.create_task(self.vehicles[i].start_queue()))
+            self.__queue_tasks.append(asyncio.create_task(self.vehicles[i].supervise()))
+
+        self.log.info(f"{len(self.connected)} of {len(self)} vehicles connected")
+        return self.connected
+
+
+    def broadcast(self, func: typing.Callable, interrupt=False, **kwargs):
+        """Queue an action on every connected vehicle."""
+        self.target(self.connected, func, interrupt, **kwargs)
+
+
+    def target(self, indices: typing.Iterable[int], func: typing.Callable, interrupt=False, **kwargs):
+        """Queue an action on some vehicles."""
+        for i in indices:
+            self.vehicles[i].queue_action(func, interrupt, **kwargs)
+
+
+    async def send(self, func: typing.Callable, indices: typing.Iterable[int]=None, **kwargs) -> list:
+        """Run a command on some vehicles at the same time without queueing it,
+        by default on all the connected ones. Return the result or exception of each."""
+        indices = self.connected if indices is None else indices
+        return await asyncio.gather(*(func(self.vehicles[i], **kwargs) for i in indices), return_exceptions=True)
+
+
+    async def stop(self):
+        """Stop the action queues, link supervisors and telemetry subscriptions."""
+        for task in self.__queue_tasks:
+            task.cancel()
+        await asyncio.gather(*self.__queue_tasks, *(cache.stop() for cache in self.telemetry), return_exceptions=True)
+        self.__queue_tasks = []
+
+
+    def close(self):
+        for vehicle in self.vehicles:
+            vehicle.close()
@@ -0,0 +1,116 @@
+"""
+Archive of raw frames that can be memory mapped for fast random-access replay
+
+The file has a fixed-size header, then all frames as contiguous uint8
+arrays and at the end an index with the timestamp of every frame.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import numpy as np
+
+from dronecontrol.common import utils
+
+
+EXTENSION = "dcfa"
+MAGIC = b"DCFA"
+VERSION = 1
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("version", "<u4"),
+    ("width", "<u4"), ("height", "<u4"), ("channels", "<u4"),
+    ("count", "<u8"), ("fps", "<f8"),
+])
+INDEX_DTYPE = np.dtype("<f8")
+
+
+class ArchiveWriter:
+    """Append frames to an archive file, the index is written on release.
+
+    Has the same interface as cv2.VideoWriter plus an optional timestamp."""
+    def __init__(self, filepath, size, fps=30, channels=3):
+        """
+        filepath: file to create
+        size: width and height of the frames
+        fps: nominal frame rate, used for frames written without a timestamp
+        channels: number of channels of the frames
+        """
+        self.filepath = filepath
+        self.header = np.zeros(1, HEADER_DTYPE)
+        self.header[0] = (MAGIC, VERSION, size[0], size[1], channels, 0, fps)
+        self.shape = (size[1], size[0], channels)
+        self.timestamps = []
+        self.file = open(filepath, "wb")
+        self.__write_header()
+
+
+    def isOpened(self):
+        return not self.file.closed
+
+
+    def write(self, frame: np.ndarray, timestamp: float=None):
+        if frame.shape != self.shape or frame.dtype != np.uint8:
+            raise ValueError(f"Frame of shape {frame.shape} and type {frame.dtype} does not match archive {self.shape}")
+        if timestamp is None:
+            timestamp = len(self.timestamps) / self.header[0]["fps"]
+        self.file.write(np.ascontiguousarray(frame).data)
+        self.timestamps.append(timestamp)
+
+
+    def release(self):
+        """Write the index and the final frame count."""
+        if self.file.closed:
+            return
+        self.file.write(np.asarray(self.timestamps, INDEX_DTYPE).tobytes())
+        self.header[0]["count"] = len(self.timestamps)
+        self.__write_header()
+        self.file.close()
+
+
+    def __write_header(self):
+        self.file.seek(0)
+        self.file.write(self.header.tobytes().ljust(HEADER_SIZE, b"\0"))
+        self.file.seek(0, os.SEEK_END)
+
+
+class FrameArchive:
+    """Memory-mapped read access to the frames of an archive.
+
+    Indexing returns views into the mapping without copying. With
+    writable=True the mapping is copy-on-write: drawing on a frame
+    copies only the touched pages and never changes the file.
+    Archives that were not closed are read without their index,
+    with timestamps from the nominal frame rate."""
+    def __init__(self, filepath, writable=False):
+        self.log = utils.make_stdout_logger(__name__)
+        self.filepath = filepath
+        header = np.fromfile(filepath, HEADER_DTYPE, count=1)
+        if len(header) == 0 or header[0]["magic"] != MAGIC:
+            raise ValueError(f"{filepath} is not a frame archive")
+        self.header = header[0]
+        self.width, self.height = int(self.header["width"]), int(self.header["height"])
+        self.shape = (self.height, self.width, int(self.header["channels"]))
+        self.fps = float(self.header["fps"])
+
+        count = int(self.header["count"])
+        frame_size = int(np.prod(self.shape))
+        mode = "c" if writable else "r"
+        if count == 0:
+            count = (os.path.getsize(filepath) - HEADER_SIZE) // frame_size
+            if count:
+                self.log.warning(f"Archive {filepath} was not closed, recovered {count} frames without index")
+            self.timestamps = np.arange(count) / self.fps
+        else:
+            self.timestamps = np.memmap(filepath, INDEX_DTYPE, "r", HEADER_SIZE + count * frame_size, (count,))
+
+        self.frames = np.memmap(filepath, np.uint8, mode, HEADER_SIZE, (count,) + self.shape) if count else \
+            np.empty((0,) + self.shape, np.uint8)
+
+
+    def __len__(self):
+        return len(self.frames)
+
+
+    def __getitem__(self, index) -> np.ndarray:
+        return self.frames[index]
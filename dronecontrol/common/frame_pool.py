@@ -0,0 +1,94 @@
+"""
+Pool of reusable frame buffers to avoid allocating full images on every frame
+
+@author: Laura Gonzalez
+"""
+
+import weakref
+import threading
+import numpy as np
+
+from dronecontrol.common import utils
+
+
+class FramePool:
+    """Hand out preallocated frames of a fixed shape and take them back when unused.
+
+    Frames are reference counted: acquire() returns a frame with one
+    reference, every extra holder calls retain() and each holder calls
+    release() when done. A frame returns to the pool when no one holds it.
+    The pool grows if all frames are in use, and frames that are dropped
+    without being released are left to the garbage collector."""
+    DEFAULT_SIZE = 4
+
+    def __init__(self, shape, dtype=np.uint8, size=DEFAULT_SIZE):
+        self.log = utils.make_stdout_logger(__name__)
+        self.shape = tuple(shape)
+        self.dtype = dtype
+        self.allocated = size
+        self.__refs = {}
+        self.__lock = threading.Lock()
+        self.__free = [self.__allocate() for _ in range(size)]
+
+        self.blank = np.zeros(self.shape, dtype)
+        self.blank.flags.writeable = False
+
+
+    def acquire(self) -> np.ndarray:
+        """Return a frame with undefined contents."""
+        with self.__lock:
+            if self.__free:
+                frame = self.__free.pop()
+            else:
+                frame = self.__allocate()
+                self.allocated += 1
+                self.log.debug(f"Frame pool grown to {self.allocated} frames")
+            self.__refs[id(frame)] = 1
+        return frame
+
+
+    def retain(self, frame: np.ndarray):
+        """Add a reference to a frame from the pool."""
+        with self.__lock:
+            if id(frame) in self.__refs:
+                self.__refs[id(frame)] += 1
+
+
+    def release(self, frame: np.ndarray):
+        """Remove a reference to a frame, ignored for frames not from the pool."""
+        if frame is None:
+            return
+        with self.__lock:
+            refs = self.__refs.get(id(frame))
+            if refs is None:
+                return
+            if refs > 1:
+                self.__refs[id(frame)] = refs - 1
+            else:
+                del self.__refs[id(frame)]
+                self.__free.append(frame)
+
+
+    def copy(self, image: np.ndarray) -> np.ndarray:
+        """Return a frame from the pool with the contents of an image."""
+        frame = self.acquire()
+        np.copyto(frame, image)
+        return frame
+
+
+    def in_use(self) -> int:
+        """Return the number of frames currently held."""
+        with self.__lock:
+            return len(self.__refs)
+
+
+    def __allocate(self):
+        frame = np.empty(self.shape, self.dtype)
+        weakref.finalize(frame, self.__forget, id(frame))
+        return frame
+
+
+    def __forget(self, frame_id):
+        """Drop the references of a frame that was collected without being released."""
+        with self.__lock:
+            self.__refs.pop(frame_id, None)
@@ -0,0 +1,95 @@
+"""
+Skip landmark inference on frames where nothing is changing
+
+@author: Laura Gonzalez
+"""
+
+import cv2
+import numpy as np
+
+from dronecontrol.common import utils, metrics
+
+
+class InferenceGovernor:
+    """Decide for each frame whether to run the model or reuse the last landmarks.
+
+    A frame is still when a small grayscale copy differs little from the
+    one of the last inferred frame and the controller error is small.
+    After some still frames the inference interval doubles up to a
+    maximum, and any motion or error brings it back to every frame at once.
+    Comparing with the last inferred frame also catches slow changes."""
+    THUMBNAIL_SIZE = (32, 24)
+    MOTION_THRESHOLD = 0.02 # Mean absolute difference as a fraction of full brightness
+    ERROR_THRESHOLD = 0.05  # Controller error in image fractions
+    STILL_FRAMES = 5        # Still frames before each halving of the rate
+    MAX_INTERVAL = 8        # Most frames between inferences
+
+    def __init__(self, motion_threshold=MOTION_THRESHOLD, error_threshold=ERROR_THRESHOLD,
+                 still_frames=STILL_FRAMES, max_interval=MAX_INTERVAL, name=""):
+        """
+        motion_threshold: frame difference above which the scene is moving
+        error_threshold: controller error above which inference runs on every frame
+        still_frames: still frames needed before each halving of the inference rate
+        max_interval: most frames between inferences while still
+        name: application label of the metrics
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.motion_threshold = motion_threshold
+        self.error_threshold = error_threshold
+        self.still_frames = still_frames
+        self.max_interval = max_interval
+        self.interval = 1
+        self.motion = 0.0
+        self.inferred = 0
+        self.skipped = 0
+        self.__reference = None
+        self.__still = 0
+        self.__since_inference = 0
+        registry = metrics.get_registry()
+        name = registry.instance(name)
+        self.__skipped_counter = registry.counter("inference_skipped_total", "Frames that reused the last landmarks", app=name)
+        registry.gauge("inference_interval", "Frames between inferences", app=name).set_function(lambda governor: governor.interval, self)
+
+
+    def should_infer(self, frame: np.ndarray, error=0.0) -> bool:
+        """Return whether to run inference on a frame given the current controller error,
+        which can be a single value or one for each axis."""
+        thumbnail = InferenceGovernor.__get_thumbnail(frame)
+        self.__since_inference += 1
+        if self.__reference is not None:
+            self.motion = np.abs(thumbnail - self.__reference).mean() / 255
+        moving = self.__reference is None or self.motion > self.motion_threshold
+        if moving or np.max(np.abs(error)) > self.error_threshold:
+            if self.interval > 1:
+                self.log.info(f"Change detected, inference on every frame (motion {self.motion:.3f})")
+            self.__still = 0
+            self.interval = 1
+        else:
+            self.__still += 1
+            interval = min(2 ** (self.__still // self.still_frames), self.max_interval)
+            if interval > self.interval:
+                self.log.debug(f"Scene still, inference every {interval} frames")
+            self.interval = interval
+
+        if self.__since_inference < self.interval:
+            self.skipped += 1
+            self.__skipped_counter.inc()
+            return False
+
+        self.__reference = thumbnail
+        self.__since_inference = 0
+        self.inferred += 1
+        return True
+
+
+    def log_stats(self):
+        total = self.inferred + self.skipped
+        if total:
+            self.log.info(f"Inference ran on {self.inferred} of {total} frames ({self.skipped / total:.0%} skipped)")
+
+
+    @staticmethod
+    def __get_thumbnail(frame: np.ndarray) -> np.ndarray:
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return cv2.resize(frame, InferenceGovernor.THUMBNAIL_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
@@ -4,56 +4,139 @@ Utility module to map keyboard inputs to pilot or tool actions
 @author: Laura Gonzalez
 """
 
-from mediapipe.python.solution_base import SolutionBase
+import os
+import sys
+import queue
+import select
+import inspect
+import functools
+import threading
+import cv2
 from dronecontrol.common import utils, pilot
-from dronecontrol.tools import tools
+
+try:
+    import termios, tty
+except ImportError:
+    import msvcrt
+
+
+QUIT_KEY = 'z'
+NO_KEY = -1
+POLL_TIME = 0.1
+
+PILOT_KEYS = {
+    'k': pilot.System.kill_engines,         # Kill switch
+    'h': pilot.System.return_home,          # Return home
+    '0': pilot.System.set_velocity,         # Stop
+    't': pilot.System.takeoff,              # Take-off
+    'l': pilot.System.land,                 # Land
+    'o': pilot.System.toggle_offboard,      # Toggle offboard
+    'w': pilot.System.move_fwd_positive,    # Forward
+    's': pilot.System.move_fwd_negative,    # Backward
+    'd': pilot.System.move_right,           # Right
+    'a': pilot.System.move_left,            # Left
+    'q': pilot.System.move_yaw_left,        # Yaw left
+    'e': pilot.System.move_yaw_right,       # Yaw right
+    '1': pilot.System.move_up,              # Up
+    '3': pilot.System.move_down,            # Down
+}
+
 
 class InputHandler:
-    """Handles a key input and converts it to a function."""
-    def __init__(self):
+    """Handles a key input and runs the function bound to it.
+
+    Keys are polled without waiting from the image windows and,
+    if enabled, read from the terminal on a background thread.
+    Each application binds its own actions to the keys."""
+    def __init__(self, read_terminal=False):
         self.log = utils.make_stdout_logger(__name__)
+        self.bindings = {}
+        self.keys = queue.Queue()
+        self.__stop = threading.Event()
+        self.__thread = None
+
+        if read_terminal:
+            self.start_terminal_reader()
+
+
+    def bind(self, key: str, func):
+        """Add or replace the function for a key, called without arguments."""
+        self.bindings[ord(key)] = func
+
+
+    def bind_pilot(self, run_action):
+        """Bind the pilot keys to run_action, called with the System method of each key."""
+        for key, action in PILOT_KEYS.items():
+            self.bind(key, functools.partial(run_action, action))
+
 
-    def handle(self, key: int):
+    def poll(self) -> int:
+        """Return the code of the next pressed key or -1 if there are none.
+
+        Never blocks, window events are processed
+        before looking for keys from the terminal."""
+        key = cv2.pollKey()
+        if key >= 0:
+            return key & 0xFF
+        try:
+            return self.keys.get_nowait()
+        except queue.Empty:
+            return NO_KEY
+
+
+    async def handle(self, key: int) -> bool:
+        """Run the function bound to a key, awaiting it if it returns a coroutine.
+
+        Return whether an action was run."""
         if key < 0:
-            return None
+            return False
 
         self.log.info(f"Pressed [{chr(key)}]")
-        if key == ord('z'): # Quit
+        if key == ord(QUIT_KEY):
             raise KeyboardInterrupt
-        elif key == ord('k'): # Kill switch
-            return pilot.System.kill_engines
-        elif key == ord('h'): # Return home
-            return pilot.System.return_home
-        elif key == ord('0'): # Stop
-            return pilot.System.set_velocity
-        elif key == ord('t'): # Take-off
-            return pilot.System.takeoff
-        elif key == ord('l'): # Land
-            return pilot.System.land
-        elif key == ord('o'): # Toggle offboard
-            return pilot.System.toggle_offboard
-        elif key == ord('w'): # Forward
-            return pilot.System.move_fwd_positive
-        elif key == ord('s'): # Backward
-            return pilot.System.move_fwd_negative
-        elif key == ord('d'): # Right
-            return pilot.System.move_right
-        elif key == ord('a'): # Left
-            return pilot.System.move_left
-        elif key == ord('q'): # Yaw left
-            return pilot.System.move_yaw_left
-        elif key == ord('e'): # Yaw right
-            return pilot.System.move_yaw_right
-        elif key == ord('1'): # Up
-            return pilot.System.move_up
-        elif key == ord('3'): # Down
-            return pilot.System.move_down
-        elif key == ord(' '): # Take picture / start video
-            return tools.VideoCamera.trigger
-        elif key == ord('<'): # Picture <> video
-            return tools.VideoCamera.change_mode
-        elif key == ord('r'): # Reset image processing
-            return SolutionBase.process
-
-        else:
-            log.warning(f"Key {chr(key)}:{key} is not bound to any action.")
\ No newline at end of file
+
+        func = self.bindings.get(key)
+        if func is None:
+            self.log.warning(f"Key {chr(key)}:{key} is not bound to any action.")
+            return False
+        result = func()
+        if inspect.isawaitable(result):
+            await result
+        return True
+
+
+    def start_terminal_reader(self):
+        """Read keys typed in the terminal on a background thread."""
+        if self.__thread or not sys.stdin.isatty():
+            return
+        self.__stop.clear()
+        self.__thread = threading.Thread(target=self.__read_terminal, name="input", daemon=True)
+        self.__thread.start()
+
+
+    def close(self):
+        """Stop reading keys from the terminal."""
+        self.__stop.set()
+        if self.__thread:
+            self.__thread.join()
+            self.__thread = None
+
+
+    def __read_terminal(self):
+        """Queue every key typed in the terminal until closed."""
+        if os.name == "nt":
+            while not self.__stop.wait(POLL_TIME):
+                while msvcrt.kbhit():
+                    self.keys.put(ord(msvcrt.getwch()))
+            return
+
+        descriptor = sys.stdin.fileno()
+        settings = termios.tcgetattr(descriptor)
+        try:
+            tty.setcbreak(descriptor)
+            while not self.__stop.is_set():
+                ready, _, _ = select.select([descriptor], [], [], POLL_TIME)
+                if ready:
+                    self.keys.put(ord(os.read(descriptor, 1)))
+        finally:
+            termios.tcsetattr(descriptor, termios.TCSADRAIN, settings)
@@ -0,0 +1,217 @@
+"""
+On-disk cache for the results of the MediaPipe landmark models
+
+Entries are keyed by the contents of the processed image
+(or file) and the configuration of the model, stored as
+NumPy arrays and memory-mapped when read back.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import typing
+import hashlib
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2, classification_pb2
+
+from dronecontrol.common import utils
+
+
+HAND_POINTS = 21
+POSE_POINTS = 33
+HAND_DTYPE = np.dtype([
+    ("points", np.float32, (HAND_POINTS, 3)),
+    ("world", np.float32, (HAND_POINTS, 3)),
+    ("label", "U5"),
+    ("score", np.float32),
+])
+POSE_DTYPE = np.dtype([
+    ("points", np.float32, (POSE_POINTS, 4)),
+])
+
+
+class HandResults(typing.NamedTuple):
+    multi_hand_landmarks: list
+    multi_hand_world_landmarks: list
+    multi_handedness: list
+
+
+class PoseResults(typing.NamedTuple):
+    pose_landmarks: landmark_pb2.NormalizedLandmarkList
+
+
+class LandmarkCache:
+    """Store landmark arrays on disk keyed by content hash.
+
+    The least recently used entries are removed when
+    the total size of the cache goes over max_size bytes."""
+    EXTENSION = ".npy"
+    DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+    def __init__(self, directory, config="", max_size=DEFAULT_MAX_SIZE):
+        """
+        directory: folder where entries are stored, created if needed
+        config: description of the model configuration, entries
+                from different configurations are kept apart
+        max_size: maximum size of the cache in bytes
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.directory = directory
+        self.config = str(config)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in self.__entries())
+
+
+    def get_key(self, image: np.ndarray) -> str:
+        """Return the key for an image array."""
+        digest = hashlib.sha1(self.config.encode())
+        digest.update(str(image.shape).encode())
+        digest.update(np.ascontiguousarray(image).data)
+        return digest.hexdigest()
+
+
+    def get_file_key(self, filepath: str) -> str:
+        """Return the key for the contents of a file."""
+        digest = hashlib.sha1(self.config.encode())
+        with open(filepath, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+    def get(self, key: str) -> typing.Optional[np.ndarray]:
+        """Return a read-only memory-mapped array for the key or None if it is not stored."""
+        path = self.__get_path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+
+        os.utime(path)
+        self.hits += 1
+        return array
+
+
+    def put(self, key: str, array: np.ndarray):
+        """Store an array and evict old entries if the cache is full."""
+        path = self.__get_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp" # Not an entry until it is renamed
+        with open(temp_path, "wb") as file:
+            np.save(file, array)
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(temp_path, path)
+        self.size += os.path.getsize(path) - old_size
+
+        if self.size > self.max_size:
+            self.__evict()
+
+
+    def process(self, model, image, to_array, from_array, key=None):
+        """Return the results of model.process(image) from the cache
+        or run the model and store them.
+
+        to_array and from_array convert between the model results and the cached array."""
+        key = key if key else self.get_key(image)
+        array = self.get(key)
+        if array is not None:
+            return from_array(array)
+
+        results = model.process(image)
+        self.put(key, to_array(results))
+        return results
+
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        for entry in self.__entries():
+            os.remove(entry.path)
+        self.size = 0
+
+
+    def __evict(self):
+        """Remove least recently used entries until the cache fits its maximum size."""
+        entries = sorted(self.__entries(), key=lambda entry: entry.stat().st_mtime)
+        self.size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self.size <= self.max_size:
+                break
+            self.size -= entry.stat().st_size
+            os.remove(entry.path)
+            self.log.debug(f"Evicted {entry.name}")
+
+
+    def __entries(self):
+        return [entry for entry in os.scandir(self.directory)
+                if entry.is_file() and entry.name.endswith(self.EXTENSION) and ".tmp" not in entry.name]
+
+
+    def __get_path(self, key):
+        return os.path.join(self.directory, key + self.EXTENSION)
+
+
+def hands_to_array(results) -> np.ndarray:
+    """Pack the results of the hands model into an array of HAND_DTYPE."""
+    hands = results.multi_hand_landmarks or []
+    array = np.zeros(len(hands), HAND_DTYPE)
+    for i, hand in enumerate(hands):
+        array[i]["points"] = [(p.x, p.y, p.z) for p in hand.landmark]
+        if results.multi_hand_world_landmarks:
+            array[i]["world"] = [(p.x, p.y, p.z) for p in results.multi_hand_world_landmarks[i].landmark]
+        classification = results.multi_handedness[i].classification[0]
+        array[i]["label"] = classification.label
+        array[i]["score"] = classification.score
+    return array
+
+
+def array_to_hands(array: np.ndarray) -> HandResults:
+    """Rebuild the results of the hands model from a packed array."""
+    if len(array) == 0:
+        return HandResults(None, None, None)
+
+    landmarks, world, handedness = [], [], []
+    for i, hand in enumerate(array):
+        landmarks.append(landmark_pb2.NormalizedLandmarkList(landmark=[
+            landmark_pb2.NormalizedLandmark(x=x, y=y, z=z) for x, y, z in hand["points"]]))
+        world.append(landmark_pb2.LandmarkList(landmark=[
+            landmark_pb2.Landmark(x=x, y=y, z=z) for x, y, z in hand["world"]]))
+        handedness.append(classification_pb2.ClassificationList(classification=[
+            classification_pb2.Classification(index=i, score=hand["score"], label=str(hand["label"]))]))
+    return HandResults(landmarks, world, handedness)
+
+
+def pose_to_array(results) -> np.ndarray:
+    """Pack the results of the pose model into an array of POSE_DTYPE."""
+    if not results.pose_landmarks:
+        return np.zeros(0, POSE_DTYPE)
+
+    array = np.zeros(1, POSE_DTYPE)
+    array[0]["points"] = [(p.x, p.y, p.z, p.visibility) for p in results.pose_landmarks.landmark]
+    return array
+
+
+def array_to_pose(array: np.ndarray) -> PoseResults:
+    """Rebuild the results of the pose model from a packed array."""
+    if len(array) == 0:
+        return PoseResults(None)
+
+    return PoseResults(landmark_pb2.NormalizedLandmarkList(landmark=[
+        landmark_pb2.NormalizedLandmark(x=x, y=y, z=z, visibility=v) for x, y, z, v in array[0]["points"]]))
+
+
+def process_hands(model, image, cache: LandmarkCache=None, key=None):
+    """Run the hands model on an RGB image, using the cache if provided."""
+    if cache is None:
+        return model.process(image)
+    return cache.process(model, image, hands_to_array, array_to_hands, key)
+
+
+def process_pose(model, image, cache: LandmarkCache=None, key=None):
+    """Run the pose model on an image, using the cache if provided."""
+    if cache is None:
+        return model.process(image)
+    return cache.process(model, image, pose_to_array, array_to_pose, key)
@@ -0,0 +1,262 @@
+"""
+Performance counters exported in the Prometheus text format
+
+Subsystems update counters, gauges and histograms of a shared registry
+while they run, which only costs an addition or a bucket search. The
+registry can be served on a local HTTP endpoint for a dashboard to
+scrape or written to a file at an interval, both from a background
+thread so the event loop never waits for an export.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import bisect
+import weakref
+import threading
+import typing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dronecontrol.common import utils
+
+
+PREFIX = "dronecontrol_"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Counter:
+    """Value that only goes up, such as frames or events."""
+    kind = "counter"
+
+    def __init__(self, labels: str):
+        self.labels = labels
+        self.value = 0.0
+
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+    def samples(self, name):
+        yield name, self.labels, self.value
+
+
+class Gauge:
+    """Value that goes up and down, or is read from a function when exported."""
+    kind = "gauge"
+
+    def __init__(self, labels: str):
+        self.labels = labels
+        self.value = 0.0
+        self.__function = None
+        self.__owner = None
+
+
+    def set(self, value):
+        self.value = value
+
+
+    def inc(self, amount=1.0):
+        self.value += amount
+
+
+    def set_function(self, func: typing.Callable[..., float], owner=None):
+        """Read the value from func when exported instead of setting it.
+
+        With an owner, func is called with it and the gauge only keeps a weak
+        reference to it, so the owner can be freed and is then left out."""
+        self.__function = func
+        self.__owner = weakref.ref(owner) if owner is not None else None
+
+
+    def samples(self, name):
+        if self.__owner is None:
+            yield name, self.labels, self.__function() if self.__function else self.value
+            return
+        owner = self.__owner()
+        if owner is not None:
+            yield name, self.labels, self.__function(owner)
+
+
+class Histogram:
+    """Count of observations in cumulative buckets, with their sum."""
+    kind = "histogram"
+
+    def __init__(self, labels: str, buckets=LATENCY_BUCKETS):
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+    def samples(self, name):
+        cumulative = 0
+        separator = "," if self.labels else ""
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            yield f"{name}_bucket", f'{self.labels}{separator}le="{le}"', cumulative
+        yield f"{name}_sum", self.labels, self.sum
+        yield f"{name}_count", self.labels, self.count
+
+
+class Registry:
+    """Metrics by name and labels, created on first use."""
+
+    def __init__(self):
+        self.__families = {} # name -> (type, help, {labels: metric})
+        self.__instances = {} # label value -> instances created
+        self.__lock = threading.Lock()
+
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        return self.__get(Counter, name, help, labels)
+
+
+    def gauge(self, name: str, help: str, **labels) -> Gauge:
+        return self.__get(Gauge, name, help, labels)
+
+
+    def histogram(self, name: str, help: str, buckets=LATENCY_BUCKETS, **labels) -> Histogram:
+        return self.__get(Histogram, name, help, labels, buckets)
+
+
+    def instance(self, name: str) -> str:
+        """Return a label value for a new instance of an object, the name for the first
+        one and then name-2, name-3... so instances do not share their metrics."""
+        with self.__lock:
+            count = self.__instances[name] = self.__instances.get(name, 0) + 1
+        return name if count == 1 else f"{name}-{count}"
+
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format."""
+        with self.__lock:
+            families = [(name, kind, help, list(metrics.values()))
+                        for name, (kind, help, metrics) in self.__families.items()]
+        lines = []
+        for name, kind, help, metrics in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind.kind}")
+            for metric in metrics:
+                for sample_name, labels, value in metric.samples(name):
+                    value = f"{float(value):.12g}"
+                    lines.append(f"{sample_name}{{{labels}}} {value}" if labels else f"{sample_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+    def __get(self, kind, name, help, labels, *args):
+        name = PREFIX + name
+        label_text = ",".join(f'{key}="{Registry.__escape(value)}"' for key, value in sorted(labels.items()))
+        with self.__lock:
+            family_kind, _, metrics = self.__families.setdefault(name, (kind, help, {}))
+            if family_kind is not kind:
+                raise ValueError(f"Metric {name} is a {family_kind.kind}, not a {kind.kind}")
+            if label_text not in metrics:
+                metrics[label_text] = kind(label_text, *args)
+            return metrics[label_text]
+
+
+    @staticmethod
+    def __escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Answer every GET on /metrics with the registry of the server."""
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    """Serve the registry on http://host:port/metrics and/or
+    write it to a file every interval seconds, from background threads."""
+    INTERVAL = 5.0
+
+    def __init__(self, port: int=None, filepath: str=None, interval=INTERVAL, host="127.0.0.1", registry: Registry=None):
+        """
+        port: local port to serve the metrics on, None to not serve them
+        filepath: file to write the metrics to, None to not write them
+        interval: seconds between writes to the file
+        host: address to listen on, only this computer by default
+        registry: metrics to export, the shared registry by default
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.registry = registry if registry else get_registry()
+        self.filepath = filepath
+        self.interval = interval
+        self.__server = None
+        self.__threads = []
+        self.__stop = threading.Event()
+
+        if port is not None:
+            self.__server = ThreadingHTTPServer((host, port), MetricsHandler)
+            self.__server.daemon_threads = True
+            self.__server.registry = self.registry
+            self.__threads.append(threading.Thread(target=self.__server.serve_forever, name="metrics-server", daemon=True))
+            self.log.info(f"Serving metrics on http://{host}:{self.__server.server_address[1]}/metrics")
+        if filepath:
+            self.__threads.append(threading.Thread(target=self.__write_loop, name="metrics-file", daemon=True))
+            self.log.info(f"Writing metrics to {filepath} every {interval:g} s")
+        for thread in self.__threads:
+            thread.start()
+
+
+    @property
+    def port(self) -> typing.Optional[int]:
+        return self.__server.server_address[1] if self.__server else None
+
+
+    def close(self):
+        """Stop serving and write the file one last time."""
+        self.__stop.set()
+        if self.__server:
+            self.__server.shutdown()
+            self.__server.server_close()
+        for thread in self.__threads:
+            thread.join()
+        self.__threads = []
+
+
+    def __write_loop(self):
+        while not self.__stop.wait(self.interval):
+            self.__write()
+        self.__write()
+
+
+    def __write(self):
+        try:
+            with open(self.filepath + ".tmp", "w") as file:
+                file.write(self.registry.render())
+            os.replace(self.filepath + ".tmp", self.filepath)
+        except Exception as e:
+            self.log.error(f"Could not write metrics to {self.filepath}: {e}")
+
+
+__registry = Registry()
+
+
+def get_registry() -> Registry:
+    """Return the registry shared by the whole program."""
+    return __registry
@@ -0,0 +1,164 @@
+"""
+Instrumentation for the asyncio event loop shared by vision and pilot tasks
+
+@author: Laura Gonzalez
+"""
+
+import time
+import json
+import logging
+import asyncio
+import numpy as np
+from collections import deque
+
+from dronecontrol.common import utils
+
+
+class LoopMonitor:
+    """Measure how late the event loop runs the pilot work.
+
+    A probe sleeps for a fixed interval and records the extra time
+    it took to be resumed, which is the time any other coroutine
+    would have been kept waiting by blocking work on the loop.
+    
+    When attached to a pilot system, it also records how long each
+    queued action waited to start and took to finish, and with
+    slow callback warnings on, every loop step that blocked for too long."""
+    INTERVAL = 0.1
+    SLOW_CALLBACK_TIME = 0.05
+    HISTORY = 10000 # Samples kept of each timing for the statistics
+
+    def __init__(self, interval=INTERVAL):
+        self.log = utils.make_stdout_logger(__name__)
+        self.interval = interval
+        self.lag = deque(maxlen=self.HISTORY)
+        self.actions = {}
+        self.timeouts = {}
+        self.slow_callbacks = deque(maxlen=self.HISTORY)
+        self.__task = None
+        self.__slow_callback_handler = None
+        self.__loop_debug = None # Debug state of the loop before watching slow callbacks
+
+
+    def start(self, slow_callback_time=None):
+        """Start measuring on the running event loop.
+        
+        Warn about loop steps that take longer than slow_callback_time seconds if provided."""
+        if self.__task is None:
+            self.__task = asyncio.create_task(self.__probe())
+        if slow_callback_time:
+            self.__watch_slow_callbacks(slow_callback_time)
+
+
+    async def stop(self):
+        """Stop measuring."""
+        if self.__slow_callback_handler:
+            logging.getLogger("asyncio").removeHandler(self.__slow_callback_handler)
+            self.__slow_callback_handler = None
+            loop, debug, duration = self.__loop_debug
+            loop.set_debug(debug)
+            loop.slow_callback_duration = duration
+        if self.__task is None:
+            return
+        self.__task.cancel()
+        try:
+            await self.__task
+        except asyncio.CancelledError:
+            pass
+        self.__task = None
+
+
+    def record_action(self, name, queue_time, start_time, end_time, timed_out=False):
+        """Save the timings of an action run by the pilot queue."""
+        self.actions.setdefault(name, deque(maxlen=self.HISTORY)).append((start_time - queue_time, end_time - start_time))
+        if timed_out:
+            self.timeouts[name] = self.timeouts.get(name, 0) + 1
+
+
+    def get_stats(self, measures: dict=None) -> dict:
+        """Return a summary of all the timings measured in milliseconds.
+
+        measures: optional lists of execution times by stage name to include"""
+        stats = {
+            "loop_lag": LoopMonitor.__summarize(self.lag),
+            "slow_callbacks": len(self.slow_callbacks),
+            "actions": {},
+        }
+        for name, timings in self.actions.items():
+            wait, duration = zip(*timings)
+            stats["actions"][name] = {
+                "wait": LoopMonitor.__summarize(wait),
+                "duration": LoopMonitor.__summarize(duration),
+                "timeouts": self.timeouts.get(name, 0),
+            }
+        if measures:
+            stats["stages"] = {name: LoopMonitor.__summarize(times) for name, times in measures.items() if times}
+        return stats
+
+
+    def export(self, filepath, measures: dict=None):
+        """Write the summary of all the timings to a JSON file."""
+        with open(filepath, "w") as file:
+            json.dump(self.get_stats(measures), file, indent=2)
+        self.log.info(f"Loop statistics saved to {filepath}")
+
+
+    def log_stats(self):
+        """Output the event loop lag and action timings measured so far."""
+        if self.lag:
+            lag = np.array(self.lag) * 1000
+            self.log.info(f"Event loop lag for {len(lag)} samples: mean {lag.mean():.2f} ms " +
+                          f"p99 {np.percentile(lag, 99):.2f} ms max {lag.max():.2f} ms")
+        for name, stats in self.get_stats()["actions"].items():
+            self.log.info(f"Action {name}: {stats['wait']['count']} runs, " +
+                          f"wait mean {stats['wait']['mean']:.1f} ms max {stats['wait']['max']:.1f} ms, " +
+                          f"duration mean {stats['duration']['mean']:.1f} ms, {stats['timeouts']} time-outs")
+        if self.slow_callbacks:
+            self.log.warning(f"{len(self.slow_callbacks)} slow callbacks blocked the event loop")
+
+
+    def __watch_slow_callbacks(self, slow_callback_time):
+        """Enable asyncio debug mode to get a warning for every slow loop step.
+
+        Debug mode slows the loop down, so the previous state is restored on stop."""
+        if self.__slow_callback_handler:
+            return
+        loop = asyncio.get_running_loop()
+        self.__loop_debug = (loop, loop.get_debug(), loop.slow_callback_duration)
+        loop.set_debug(True)
+        loop.slow_callback_duration = slow_callback_time
+
+        self.__slow_callback_handler = SlowCallbackHandler(self.slow_callbacks)
+        logging.getLogger("asyncio").addHandler(self.__slow_callback_handler)
+
+
+    async def __probe(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lag.append(max(0.0, time.perf_counter() - start - self.interval))
+
+
+    @staticmethod
+    def __summarize(values):
+        values = np.asarray(values, dtype=float) * 1000
+        if len(values) == 0:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "mean": float(values.mean()),
+            "p99": float(np.percentile(values, 99)),
+            "max": float(values.max()),
+        }
+
+
+class SlowCallbackHandler(logging.Handler):
+    """Collect the slow callback warnings logged by asyncio in debug mode."""
+    def __init__(self, records):
+        super().__init__(logging.WARNING)
+        self.records = records
+
+    def emit(self, record):
+        message = record.getMessage()
+        if "took" in message:
+            self.records.append(message)
@@ -1,17 +1,19 @@
 import asyncio
 import typing
 import math
+import time
 import mavsdk
 from mavsdk.action import ActionError
 from mavsdk.telemetry import LandedState, FlightMode
 from mavsdk.offboard import OffboardError, VelocityBodyYawspeed, PositionNedYaw
 
-from dronecontrol.common import utils
+from dronecontrol.common import utils, metrics
 
 
 class Action(typing.NamedTuple):
     func: typing.Callable
     kwargs: dict
+    queue_time: float = 0.0
 
 
 class System():
@@ -24,10 +26,23 @@ class System():
     WAIT_TIME = 0.05
     DEFAULT_SERIAL_ADDRESS = "/dev/ttyUSB0"
     DEFAULT_UDP_PORT = 14540
+    DEFAULT_GRPC_PORT = 50051
     TIMEOUT = 15
-
-
-    def __init__(self, ip=None, port=None, use_serial=False, serial_address=None):
+    # Telemetry health fields that can be required before the system is ready
+    HEALTH_CHECKS = {
+        "local_position": "is_local_position_ok",
+        "global_position": "is_global_position_ok",
+        "home_position": "is_home_position_ok",
+        "armable": "is_armable",
+    }
+    READY_CHECKS = ("global_position",)
+    HEARTBEAT_TIMEOUT = 1.0 # Seconds without telemetry before the link is considered lost
+    RECONNECT_DELAY = 0.5   # First wait between reconnection attempts, doubled on each failure
+    MAX_RECONNECT_DELAY = 8.0
+
+
+    def __init__(self, ip=None, port=None, use_serial=False, serial_address=None,
+                 mavsdk_server_address=None, grpc_port=DEFAULT_GRPC_PORT, ready_checks=READY_CHECKS):
         """
         Connection parameters to PX4 through MAVlink
 
@@ -35,18 +50,50 @@ class System():
             - Linux with default baudrate: '/dev/ttyUSB0'
             - Windows over telemetry radio: 'COM10:57600'
             - RPi UART over serial cable: '/dev/serial0:921600'
+
+        By default an embedded mavsdk_server is started on the gRPC port,
+        each system needs its own port. With a server address an already
+        running mavsdk_server is used instead.
+
+        ready_checks: names from HEALTH_CHECKS that must pass before the
+        system is ready, e.g. none indoors where there is no global position.
         """
+        unknown = set(ready_checks) - set(self.HEALTH_CHECKS)
+        if unknown:
+            raise ValueError(f"Unknown readiness checks: {', '.join(sorted(unknown))}")
         self.is_ready = False
+        self.link_ok = False
+        self.offboard_on = False # Offboard mode as last reported, kept up to date while supervised
+        self.outages = [] # type: typing.List[float]
+        self.ready_checks = tuple(ready_checks)
         self.actions = [] # type: typing.List[Action]
         self.current_action_name = ""
         self.port = port or self.DEFAULT_UDP_PORT
         self.ip = ip
         self.serial = (serial_address if serial_address else self.DEFAULT_SERIAL_ADDRESS) if use_serial else None
-        self.mav = mavsdk.System()
+        self.mav = mavsdk.System(mavsdk_server_address=mavsdk_server_address, port=grpc_port)
         self.log = utils.make_stdout_logger(__name__)
+        self.monitor = None # Optional LoopMonitor to record action timings
+        self.__server = dict(mavsdk_server_address=mavsdk_server_address, port=grpc_port)
+        self.__supervised = False
+        self.__wants_offboard = False
+        self.__last_heartbeat = 0.0
+        self.__reconnect_subscribers = []
+
+        registry = metrics.get_registry()
+        self.__vehicle = registry.instance(self.__get_address())
+        registry.gauge("pilot_queue_depth", "Actions waiting in the pilot queue",
+                       vehicle=self.__vehicle).set_function(lambda system: len(system.actions), self)
+        registry.gauge("pilot_link_up", "Whether telemetry is arriving from the vehicle",
+                       vehicle=self.__vehicle).set_function(lambda system: int(system.link_ok), self)
+        self.__setpoints = registry.counter("pilot_setpoints_total", "Velocity setpoints sent", vehicle=self.__vehicle)
+        self.__outages = registry.counter("pilot_link_outages_total", "Link outages recovered", vehicle=self.__vehicle)
+        self.__outage_time = registry.counter("pilot_link_outage_seconds_total", "Time without link", vehicle=self.__vehicle)
+        self.__action_metrics = {}
 
 
     def close(self):
+        self.__stop_server()
         del self.mav
 
 
@@ -64,10 +111,20 @@ class System():
                     action = self.actions.pop(0)
                     self.current_action_name = action.func.__name__
                     self.log.info("Execute action: %s", self.current_action_name)
+                    start_time = time.perf_counter()
+                    timed_out = False
                     try:
                         await asyncio.wait_for(action.func(self, **action.kwargs), timeout=10)
                     except asyncio.exceptions.TimeoutError:
                         self.log.warning(f"Time out waiting for {self.current_action_name}")
+                        timed_out = True
+                    if self.monitor:
+                        self.monitor.record_action(self.current_action_name, action.queue_time,
+                                                   start_time, time.perf_counter(), timed_out)
+                    if self.current_action_name not in self.__action_metrics:
+                        self.__action_metrics[self.current_action_name] = metrics.get_registry().histogram(
+                            "pilot_action_seconds", "Time to run a queued action", vehicle=self.__vehicle, action=self.current_action_name)
+                    self.__action_metrics[self.current_action_name].observe(time.perf_counter() - start_time)
                     self.current_action_name = ""
                 else:
                     await asyncio.sleep(self.WAIT_TIME)
@@ -85,7 +142,7 @@ class System():
             self.clear_queue()
         if func is None:
             return
-        action = Action(func, kwargs)
+        action = Action(func, kwargs, time.perf_counter())
         self.actions.append(action)
         self.log.info("Queue action: %s", func.__name__)
 
@@ -99,34 +156,90 @@ class System():
     async def connect(self):
         """Connect to mavsdk server.
            Raises a TimeoutError if it is not possible to establish connection.
+
+        The connection state and the readiness checks are awaited at the
+        same time, within a single time-out.
         """
-        
-        if self.serial:
-            address = f"serial://{self.serial}"
-        else:
-            address = f"udp://{self.ip if self.ip else ''}:{self.port}"
+        address = self.__get_address()
         self.log.info("Waiting for drone to connect on address " + address)
+        start_time = time.perf_counter()
         await asyncio.wait_for(self.mav.connect(system_address=address), timeout=self.TIMEOUT)
-        
-        await System.wait_for_async_value(self.mav.core.connection_state(), is_connected=True)
-        self.log.info("Connection established!")
-
-        await System.wait_for_async_value(self.mav.telemetry.health(), is_global_position_ok=True)
-        self.log.info("System ready")
+        await asyncio.wait_for(asyncio.gather(self.__wait_connected(), self.__wait_healthy()),
+                               timeout=max(0, self.TIMEOUT - (time.perf_counter() - start_time)))
+        self.log.info(f"System ready in {time.perf_counter() - start_time:.1f} s")
 
         self.is_ready = True
+        self.link_ok = True
 
 
     async def is_connected(self):
-        """Chech if the system is connected through MAVLink."""
+        """Chech if the system is connected through MAVLink.
+        
+        Uses the supervisor state when it is running."""
+        if self.__supervised:
+            return self.link_ok
         return (await System.get_async_generated(self.mav.core.connection_state())).is_connected
 
 
+    def subscribe_to_reconnect(self, func: typing.Callable[[], typing.Awaitable]):
+        """Await func after the link is recovered, to restart telemetry subscriptions."""
+        self.__reconnect_subscribers.append(func)
+
+
+    async def supervise(self, heartbeat_timeout=HEARTBEAT_TIMEOUT):
+        """
+        Watch the link until cancelled and recover it when it is lost.
+
+        The link is lost when no telemetry arrives for heartbeat_timeout
+        seconds. Reconnection is retried with exponential backoff and, once
+        recovered, subscribers are restarted and offboard mode is restored
+        if it was active. Outage durations are kept in outages.
+        """
+        self.__supervised = True
+        self.__last_heartbeat = time.perf_counter()
+        heartbeat = asyncio.create_task(self.__watch_heartbeat())
+        flight_mode = asyncio.create_task(self.__watch_flight_mode())
+        try:
+            while True:
+                await asyncio.sleep(heartbeat_timeout / 4)
+                if not heartbeat.done() and time.perf_counter() - self.__last_heartbeat <= heartbeat_timeout:
+                    continue
+
+                lost_time = self.__last_heartbeat
+                self.link_ok = False
+                self.log.error(f"Link lost, no telemetry for {time.perf_counter() - lost_time:.1f} s")
+                heartbeat.cancel()
+                flight_mode.cancel()
+                await self.__reconnect()
+
+                outage = time.perf_counter() - lost_time
+                self.outages.append(outage)
+                self.__outages.inc()
+                self.__outage_time.inc(outage)
+                self.link_ok = True
+                self.__last_heartbeat = time.perf_counter()
+                heartbeat = asyncio.create_task(self.__watch_heartbeat())
+                flight_mode = asyncio.create_task(self.__watch_flight_mode())
+                self.log.warning(f"Link recovered after {outage:.1f} s")
+                for func in self.__reconnect_subscribers:
+                    await func()
+                if self.__wants_offboard:
+                    await self.__restore_offboard()
+        except asyncio.exceptions.CancelledError:
+            heartbeat.cancel()
+            flight_mode.cancel()
+            self.__supervised = False
+            if self.outages:
+                self.log.info(f"{len(self.outages)} link outages, longest {max(self.outages):.1f} s, "
+                              f"total {sum(self.outages):.1f} s")
+
+
     async def kill_engines(self):
         await self.mav.action.kill()
 
 
     async def hold(self):
+        self.__wants_offboard = False
         try:
             await self.mav.action.hold()
         except Exception as e:
@@ -136,6 +249,7 @@ class System():
 
     async def return_home(self):
         """Return to home position and land."""
+        self.__wants_offboard = False
         try:
             await self.mav.action.return_to_launch()
         except ActionError as error:
@@ -169,6 +283,7 @@ class System():
         """Land.
         
         Finishes when the system is in the ground."""
+        self.__wants_offboard = False
         try:
             await self.mav.action.land()
         except ActionError as error:
@@ -198,11 +313,14 @@ class System():
             await self.return_home()
             return
 
+        self.__wants_offboard = True
+        self.offboard_on = True
         self.log.info("System in offboard mode")
 
     
     async def stop_offboard(self):
         """Exit offboard mode and return to hold."""
+        self.__wants_offboard = False
         await self.mav.offboard.set_velocity_body(self.STOP_VELOCITY)
 
         try:
@@ -211,6 +329,7 @@ class System():
             self.log.error(f"Stopping offboard mode failed with error code: {error._result.result}")
             return
 
+        self.offboard_on = False
         self.log.info("System exited offboard mode")
 
 
@@ -227,8 +346,14 @@ class System():
         if not await self.is_offboard():
             self.log.warning("System is not in offboard move, it cannot move")
         else:
-            await self.mav.offboard.set_velocity_body(
-                VelocityBodyYawspeed(forward, right, -up, yaw))
+            await self.send_velocity(forward, right, up, yaw)
+
+
+    async def send_velocity(self, forward=0.0, right=0.0, up=0.0, yaw=0.0):
+        """Send a velocity setpoint in body coordinates without asking for the mode,
+        for fixed-rate streams that check offboard_on instead."""
+        await self.mav.offboard.set_velocity_body(VelocityBodyYawspeed(forward, right, -up, yaw))
+        self.__setpoints.inc()
 
     
     async def move_body_velocity(self, forward=0.0, right=0.0, up=0.0, yaw=0.0, time=1):
@@ -299,6 +424,85 @@ class System():
         return await self.mav.offboard.is_active()
 
 
+    def __get_address(self):
+        if self.serial:
+            return f"serial://{self.serial}"
+        return f"udp://{self.ip if self.ip else ''}:{self.port}"
+
+
+    async def __wait_connected(self):
+        await System.wait_for_async_value(self.mav.core.connection_state(), is_connected=True)
+        self.log.info("Connection established!")
+
+
+    async def __wait_healthy(self):
+        if not self.ready_checks:
+            return
+        fields = {self.HEALTH_CHECKS[name]: True for name in self.ready_checks}
+        await System.wait_for_async_value(self.mav.telemetry.health(), **fields)
+        self.log.info(f"Health checks passed: {', '.join(self.ready_checks)}")
+
+
+    async def __watch_heartbeat(self):
+        """Record the arrival time of a high-rate telemetry stream."""
+        try:
+            async for _ in self.mav.telemetry.attitude_euler():
+                self.__last_heartbeat = time.perf_counter()
+        except Exception as error:
+            self.log.warning(f"Telemetry stream failed: {error!r}")
+
+
+    async def __watch_flight_mode(self):
+        """Keep offboard_on up to date with the flight mode telemetry."""
+        try:
+            async for mode in self.mav.telemetry.flight_mode():
+                self.offboard_on = mode == FlightMode.OFFBOARD
+        except Exception as error:
+            self.log.warning(f"Flight mode stream failed: {error!r}")
+
+
+    async def __reconnect(self):
+        """Retry until telemetry arrives again, with a new mavsdk_server if the old one failed."""
+        delay = self.RECONNECT_DELAY
+        while True:
+            try:
+                await asyncio.wait_for(System.get_async_generated(self.mav.telemetry.attitude_euler()), timeout=delay)
+                return
+            except asyncio.exceptions.TimeoutError:
+                self.log.warning(f"No telemetry, retrying for {min(2 * delay, self.MAX_RECONNECT_DELAY):.1f} s")
+            except Exception as error:
+                self.log.warning(f"Restarting mavsdk_server after error: {error!r}")
+                try:
+                    self.__stop_server()
+                    self.mav = mavsdk.System(**self.__server)
+                    await asyncio.wait_for(self.mav.connect(system_address=self.__get_address()), timeout=delay)
+                except Exception as error:
+                    self.log.error(f"Could not restart mavsdk_server: {error!r}")
+                    await asyncio.sleep(delay)
+            delay = min(2 * delay, self.MAX_RECONNECT_DELAY)
+
+
+    def __stop_server(self):
+        """Stop the mavsdk_server embedded in the current System, a server given by address is left running."""
+        try:
+            self.mav._stop_mavsdk_server()
+        except Exception as error:
+            self.log.warning(f"Could not stop mavsdk_server: {error!r}")
+
+
+    async def __restore_offboard(self):
+        """Restart offboard mode if it was lost during an outage while flying."""
+        if await self.is_offboard() or await self.get_landed_state() != LandedState.IN_AIR:
+            return
+        self.log.warning("Restoring offboard mode")
+        await self.mav.offboard.set_velocity_body(self.STOP_VELOCITY)
+        try:
+            await self.mav.offboard.start()
+            self.offboard_on = True
+        except OffboardError as error:
+            self.log.error(f"Restoring offboard mode failed with error code: {error._result.result}")
+
+
     async def __landing_finished(self):
         """Runs until the drone has finished landing."""
         await self.__wait_for_landed_state(LandedState.ON_GROUND)
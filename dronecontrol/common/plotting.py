@@ -0,0 +1,248 @@
+"""
+Plot figures in a separate process without blocking the caller
+
+Series are decimated before they are sent, keeping their shape, and
+handed to the plotting process through a temporary NumPy file so only
+its path goes through the queue. The plotting process ends with the
+program, blocking figures keep the caller waiting until they are closed.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import atexit
+import queue
+import shutil
+import tempfile
+import traceback
+import typing
+import multiprocessing
+import numpy as np
+
+from dronecontrol.common import utils
+
+
+MAX_POINTS = 2000 # Points kept in each plotted series
+STOP_TIMEOUT = 1.0 # Seconds the plotting process is given to stop
+
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """Decimate a series with the Largest-Triangle-Three-Buckets algorithm.
+
+    Keeps the first and last points and from each bucket in between the
+    point that makes the largest triangle with the point kept before it
+    and the average of the next bucket, which preserves peaks and slopes."""
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    if points >= len(x) or points < 3:
+        return x, y
+
+    edges = np.linspace(1, len(x) - 1, points - 1).astype(int)
+    indices = np.empty(points, dtype=int)
+    indices[0], indices[-1] = 0, len(x) - 1
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2] if i + 2 < len(edges) else len(x)
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        last_x, last_y = x[indices[i]], y[indices[i]]
+        area = np.abs((last_x - next_x) * (y[start:end] - last_y) - (last_x - x[start:end]) * (next_y - last_y))
+        indices[i + 1] = start + np.argmax(area)
+    return x[indices], y[indices]
+
+
+def run_server(requests: multiprocessing.Queue, responses: multiprocessing.Queue):
+    """Draw the figures received until None is sent.
+
+    Every figure file is removed once read. Errors are sent back as
+    (block, traceback) and blocking figures are answered when all the
+    windows are closed, with (True, None) if they were drawn."""
+    try:
+        import matplotlib.pyplot as plt
+    except Exception:
+        responses.put((True, traceback.format_exc()))
+        return
+
+    while True:
+        try:
+            request = requests.get(timeout=0.1)
+        except queue.Empty:
+            if plt.get_fignums():
+                plt.pause(0.1)
+            continue
+        if request is None:
+            break
+        path, figure, block = request
+        try:
+            with np.load(path) as data:
+                lines = [(data[f"x{i}"], data[f"y{i}"]) for i in range(len(figure["panels"]))]
+            __draw(plt, lines, **figure)
+            if block:
+                plt.show(block=True)
+                responses.put((True, None))
+            else:
+                plt.pause(0.001)
+        except Exception:
+            responses.put((block, traceback.format_exc()))
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def __draw(plt, lines, panels, title, xlabel, ylabels, legend):
+    plt.figure()
+    panel_count = max(panels) + 1
+    if panel_count > 1:
+        plt.suptitle(title)
+    for panel in range(panel_count):
+        plt.subplot(panel_count, 1, panel + 1)
+        if panel_count == 1:
+            plt.title(title)
+        for (x, y), line_panel in zip(lines, panels):
+            if line_panel == panel:
+                plt.plot(x, y)
+        plt.grid(True)
+        plt.ylabel(ylabels[panel])
+    plt.xlabel(xlabel)
+    if legend:
+        plt.legend(legend)
+
+
+class Plotter:
+    """Send figures to a plotting process started on the first one.
+
+    Errors of the plotting process are logged and kept in errors."""
+
+    def __init__(self, max_points=MAX_POINTS):
+        """
+        max_points: points kept in each series after decimation, 0 keeps them all
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.max_points = max_points
+        self.errors = [] # type: typing.List[str]
+        self.__context = multiprocessing.get_context("spawn")
+        self.__requests = None
+        self.__responses = None
+        self.__process = None
+        self.__directory = None
+
+
+    def plot(self, x, y, subplots=None, title="", xlabel="", ylabel="", legend=None, block=False):
+        """Queue a figure and return at once, or with block once all the figure windows are closed.
+
+        x is one series shared by every series in y or one series for each.
+        subplots groups consecutive series of y in panels with one ylabel each.
+        Returns False if the figure is known to have failed."""
+        lines = Plotter.__to_lines(x, y)
+        if not lines:
+            return True
+        if subplots:
+            panels = [i for i, count in enumerate(subplots) for _ in range(count)]
+            ylabels = list(ylabel)
+        else:
+            panels = [0] * len(lines)
+            ylabels = [ylabel]
+
+        arrays = {}
+        for i, (line_x, line_y) in enumerate(lines[:len(panels)]):
+            if self.max_points and len(line_x) > self.max_points:
+                line_x, line_y = lttb(line_x, line_y, self.max_points)
+            arrays[f"x{i}"], arrays[f"y{i}"] = line_x, line_y
+
+        self.__start()
+        handle, path = tempfile.mkstemp(prefix="plot-", suffix=".npz", dir=self.__directory)
+        with os.fdopen(handle, "wb") as file:
+            np.savez(file, **arrays)
+        self.__requests.put((path, dict(panels=panels[:len(lines)], title=title, xlabel=xlabel,
+                                        ylabels=ylabels, legend=legend), block))
+        return self.__wait() if block else self.__check()
+
+
+    def close(self):
+        """Stop the plotting process and remove the figure files it did not read."""
+        if self.__process is None:
+            return
+        self.__requests.put(None)
+        self.__process.join(STOP_TIMEOUT)
+        if self.__process.is_alive():
+            self.__process.terminate()
+            self.__process.join()
+        elif self.__process.exitcode:
+            self.__log_error(f"Plotting process exited with code {self.__process.exitcode}")
+        self.__check()
+        self.__requests.cancel_join_thread()
+        self.__requests.close()
+        self.__responses.close()
+        shutil.rmtree(self.__directory, ignore_errors=True)
+        self.__process = None
+
+
+    def __start(self):
+        if self.__process is not None and self.__process.is_alive():
+            return
+        self.close()
+        self.__directory = tempfile.mkdtemp(prefix="plot-")
+        self.__requests = self.__context.Queue()
+        self.__responses = self.__context.Queue()
+        self.__process = self.__context.Process(target=run_server, args=(self.__requests, self.__responses),
+                                                name="plotter", daemon=True)
+        self.__process.start()
+        self.log.info(f"Plotting process started with pid {self.__process.pid}")
+
+
+    def __wait(self) -> bool:
+        """Wait for the answer to a blocking figure, False if it failed or the process stopped."""
+        while True:
+            try:
+                block, error = self.__responses.get(timeout=0.1)
+            except queue.Empty:
+                if not self.__process.is_alive():
+                    self.close()
+                    return False
+                continue
+            if error:
+                self.__log_error(error)
+            if block:
+                return error is None
+
+
+    def __check(self) -> bool:
+        """Log the errors sent by the plotting process, return False if there were any."""
+        ok = True
+        while True:
+            try:
+                _, error = self.__responses.get_nowait()
+            except queue.Empty:
+                return ok
+            self.__log_error(error)
+            ok = False
+
+
+    def __log_error(self, error):
+        self.errors.append(error)
+        self.log.error(f"Plotting failed: {error}")
+
+
+    @staticmethod
+    def __to_lines(x, y) -> typing.List[typing.Tuple[np.ndarray, np.ndarray]]:
+        """Pair every series in y with its x values."""
+        if len(x) == 0 or len(y) == 0:
+            return []
+        if not np.ndim(y[0]):
+            y = [y]
+        if np.ndim(x[0]):
+            if len(x) != len(y):
+                raise ValueError(f"Unmatched data, {len(x)} x series for {len(y)} y series")
+            return [(np.asarray(line_x, dtype=float), np.asarray(line_y, dtype=float)) for line_x, line_y in zip(x, y)]
+        x = np.asarray(x, dtype=float)
+        return [(x, np.asarray(line_y, dtype=float)) for line_y in y]
+
+
+__plotter = None
+
+
+def get_plotter() -> Plotter:
+    """Return the plotter shared by the whole program."""
+    global __plotter
+    if __plotter is None:
+        __plotter = Plotter()
+        atexit.register(__plotter.close)
+    return __plotter
@@ -0,0 +1,216 @@
+"""
+Record video on a background thread so that encoding never stalls capture
+
+A recording is a directory with the video split in segments,
+an info file with the frame size and format and an index with
+the timestamp of every frame, used to replay it with exact timing.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import json
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+from enum import Enum
+
+from dronecontrol.common import utils, metrics
+from dronecontrol.common.frame_pool import FramePool
+from dronecontrol.common import frame_archive
+
+
+INFO_FILE = "info.json"
+INDEX_FILE = "index.csv"
+
+
+class RecordFormat(Enum):
+    MJPG = 0 # Motion JPEG in AVI, lossy and fast
+    FFV1 = 1 # FFV1 in MKV, lossless
+    RAW = 2  # Uncompressed BGR frames, no encoding cost
+    ARCHIVE = 3 # Frame archive with its own index, memory mapped on replay
+
+
+EXTENSIONS = {RecordFormat.MJPG: "avi", RecordFormat.FFV1: "mkv", RecordFormat.RAW: "raw", RecordFormat.ARCHIVE: frame_archive.EXTENSION}
+FOURCC = {RecordFormat.MJPG: "MJPG", RecordFormat.FFV1: "FFV1"}
+
+
+class RawWriter:
+    """Write frames as raw bytes with the same interface as cv2.VideoWriter."""
+    def __init__(self, filepath):
+        self.file = open(filepath, "wb")
+
+    def isOpened(self):
+        return not self.file.closed
+
+    def write(self, frame):
+        self.file.write(np.ascontiguousarray(frame).data)
+
+    def release(self):
+        self.file.close()
+
+
+class Recorder:
+    """Hand frames to a writer thread through a bounded queue.
+
+    Frames are copied into buffers of its own pool so the caller can
+    reuse its frame right away. When the writer falls behind and the
+    queue is full new frames are dropped and counted instead of blocking."""
+    DEFAULT_FPS = 30
+    QUEUE_SIZE = 64
+    SEGMENT_FRAMES = 1800
+    STOP_TIMEOUT = 5.0 # Seconds to wait for room in the queue to stop the writer
+
+    def __init__(self, size, fps=DEFAULT_FPS, format=RecordFormat.MJPG, directory=None,
+                 segment_frames=SEGMENT_FRAMES, queue_size=QUEUE_SIZE):
+        """
+        size: width and height of the frames
+        fps: nominal frame rate stored in the video containers
+        format: encoding of the segments
+        directory: folder for the recording, defaults to a new folder named by date
+        segment_frames: maximum number of frames in each segment file
+        queue_size: maximum number of frames waiting to be written
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.size = tuple(size)
+        self.fps = fps
+        self.format = format
+        self.directory = directory or os.path.join(utils.IMAGE_FOLDER, utils.get_formatted_date())
+        self.segment_frames = segment_frames
+        self.pool = FramePool((self.size[1], self.size[0], 3))
+        self.written = 0
+        self.dropped = 0
+        self.failed = False # The writer thread stopped on an error
+        self.__dropped_counter = metrics.get_registry().counter("recorder_dropped_frames_total",
+                                                               "Frames dropped because the recorder fell behind")
+
+        self.__frames = queue.Queue(queue_size)
+        self.__thread = None
+        self.__index = None
+        self.__start_time = None
+
+
+    @property
+    def is_recording(self) -> bool:
+        return self.__thread is not None
+
+
+    def start(self):
+        """Create the recording folder and start the writer thread."""
+        if self.is_recording:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, INFO_FILE), "w") as file:
+            json.dump({"width": self.size[0], "height": self.size[1], "fps": self.fps,
+                       "format": self.format.name, "segment_frames": self.segment_frames}, file)
+        self.__index = open(os.path.join(self.directory, INDEX_FILE), "w")
+        self.__index.write("segment,frame,timestamp\n")
+
+        self.written = self.dropped = 0
+        self.failed = False
+        self.__start_time = time.perf_counter()
+        self.__thread = threading.Thread(target=self.__write_frames, name="recorder", daemon=True)
+        self.__thread.start()
+        self.log.info(f"Recording {self.format.name} video to {self.directory}")
+
+
+    def write(self, frame: np.ndarray, timestamp: float=None) -> bool:
+        """Queue a copy of the frame, return False if it was dropped.
+
+        timestamp: time of the frame in seconds, defaults to the time since start"""
+        if not self.is_recording or self.failed:
+            return False
+        if timestamp is None:
+            timestamp = time.perf_counter() - self.__start_time
+
+        copy = self.pool.copy(frame)
+        try:
+            self.__frames.put_nowait((copy, timestamp))
+        except queue.Full:
+            self.pool.release(copy)
+            self.dropped += 1
+            self.__dropped_counter.inc()
+            return False
+        return True
+
+
+    def stop(self):
+        """Write the queued frames and close the recording."""
+        if not self.is_recording:
+            return
+        if self.__thread.is_alive():
+            try:
+                self.__frames.put(None, timeout=self.STOP_TIMEOUT)
+                self.__thread.join()
+            except queue.Full:
+                self.log.error("Recorder writer is not responding, queued frames are lost")
+        self.__thread = None
+        while not self.__frames.empty():
+            item = self.__frames.get_nowait()
+            if item is not None:
+                self.pool.release(item[0])
+        self.__index.close()
+        self.log.info(f"Recorded {self.written} frames to {self.directory}, dropped {self.dropped}")
+
+
+    def __write_frames(self):
+        """Write queued frames, starting a new segment when the current one is full.
+
+        Stops and marks the recorder as failed if a segment cannot be written."""
+        writer, segment, position = None, -1, 0
+        try:
+            while True:
+                item = self.__frames.get()
+                if item is None:
+                    break
+                frame, timestamp = item
+
+                if writer is None or position >= self.segment_frames:
+                    if writer is not None:
+                        writer.release()
+                        writer = None
+                    segment, position = segment + 1, 0
+                    writer = self.__open_segment(segment)
+
+                if self.format == RecordFormat.ARCHIVE:
+                    writer.write(frame, timestamp)
+                else:
+                    writer.write(frame)
+                self.pool.release(frame)
+                self.__index.write(f"{segment},{position},{timestamp:.6f}\n")
+                position += 1
+                self.written += 1
+        except Exception as e:
+            self.failed = True
+            self.log.error(f"Recording stopped after {self.written} frames: {e}")
+        finally:
+            if writer is not None:
+                writer.release()
+
+
+    def __open_segment(self, segment):
+        filepath = os.path.join(self.directory, get_segment_name(segment, self.format))
+        if self.format == RecordFormat.RAW:
+            return RawWriter(filepath)
+        if self.format == RecordFormat.ARCHIVE:
+            return frame_archive.ArchiveWriter(filepath, self.size, self.fps)
+
+        writer = cv2.VideoWriter(filepath, cv2.VideoWriter_fourcc(*FOURCC[self.format]), self.fps, self.size)
+        if not writer.isOpened():
+            raise IOError(f"Could not open {self.format.name} writer for {filepath}")
+        return writer
+
+
+def get_segment_name(segment: int, format: RecordFormat) -> str:
+    return f"segment-{segment:03}.{EXTENSIONS[format]}"
+
+
+def load_recording(directory):
+    """Return the info of a recording and its index as an array
+    with one row of segment, frame and timestamp per frame."""
+    with open(os.path.join(directory, INFO_FILE)) as file:
+        info = json.load(file)
+    index = np.loadtxt(os.path.join(directory, INDEX_FILE), delimiter=",", skiprows=1, ndmin=2)
+    return info, index
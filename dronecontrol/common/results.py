@@ -0,0 +1,113 @@
+"""
+Store test and tuning results while they are produced
+
+A run is a folder with an info file, an index and one NumPy file per
+record, written as soon as the record is complete so a crash loses at
+most the record in progress. Records are named by a key, such as the
+target of a test or the gains of a tuning run, and their arrays are
+only read from disk when they are accessed.
+
+@author: Laura Gonzalez
+"""
+
+import os
+import csv
+import json
+import typing
+import numpy as np
+
+from dronecontrol.common import utils
+
+
+RESULTS_FOLDER = "data"
+INFO_FILE = "info.json"
+INDEX_FILE = "index.csv"
+
+
+class ResultWriter:
+    """Append records of named arrays to a run folder."""
+
+    def __init__(self, name: str, directory: str=None, **info):
+        """
+        name: kind of run, prefix of the folder name
+        directory: folder of the run, a new one in the results folder by default
+        info: values describing the run, saved with it when the run is new
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.directory = directory or os.path.join(RESULTS_FOLDER, f"{name}-{utils.get_formatted_date()}")
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = os.path.join(self.directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            # Resume the run, keeping the info it was started with
+            self.count = len(Results(self.directory))
+        else:
+            with open(os.path.join(self.directory, INFO_FILE), "w") as file:
+                json.dump({"name": name, **info}, file)
+            self.count = 0
+        self.__index = open(index_path, "a", newline="")
+        self.__writer = csv.writer(self.__index)
+        if self.count == 0:
+            self.__writer.writerow(("record", "key", "file"))
+
+
+    def append(self, key, **arrays):
+        """Save a record of arrays under a key, keys can repeat."""
+        file_name = f"record-{self.count:04}.npz"
+        path = os.path.join(self.directory, file_name)
+        with open(path + ".tmp", "wb") as file:
+            np.savez_compressed(file, **{name: np.asarray(value) for name, value in arrays.items()})
+        os.replace(path + ".tmp", path)
+
+        self.__writer.writerow((self.count, key, file_name))
+        self.__index.flush()
+        self.count += 1
+
+
+    def close(self):
+        if not self.__index.closed:
+            self.__index.close()
+            self.log.info(f"{self.count} records saved in {self.directory}")
+
+
+class Results:
+    """Read the records of a run by key, loading their arrays on access."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INFO_FILE)) as file:
+            self.info = json.load(file)
+        with open(os.path.join(directory, INDEX_FILE), newline="") as file:
+            self.__index = [(key, file_name) for _, key, file_name in list(csv.reader(file))[1:]]
+
+
+    def __len__(self):
+        return len(self.__index)
+
+
+    def __contains__(self, key):
+        return any(str(key) == record_key for record_key, _ in self.__index)
+
+
+    def __getitem__(self, key) -> typing.Dict[str, np.ndarray]:
+        """Return the arrays of the last record with a key."""
+        for record_key, file_name in reversed(self.__index):
+            if record_key == str(key):
+                return self.__load(file_name)
+        raise KeyError(key)
+
+
+    def keys(self) -> typing.List[str]:
+        """Return the keys in the order they were first written."""
+        return list(dict.fromkeys(key for key, _ in self.__index))
+
+
+    def records(self, key=None) -> typing.Iterator[typing.Tuple[str, typing.Dict[str, np.ndarray]]]:
+        """Yield the key and arrays of every record in order, or only of those with a key."""
+        for record_key, file_name in self.__index:
+            if key is None or record_key == str(key):
+                yield record_key, self.__load(file_name)
+
+
+    def __load(self, file_name):
+        with np.load(os.path.join(self.directory, file_name)) as data:
+            return {name: data[name] for name in data.files}
@@ -0,0 +1,140 @@
+"""
+Run a loop at a fixed rate on absolute deadlines
+
+@author: Laura Gonzalez
+"""
+
+import time
+import asyncio
+import numpy as np
+from enum import Enum
+from collections import deque
+
+from dronecontrol.common import utils, metrics
+
+
+class LatePolicy(Enum):
+    SKIP_RENDER = 0 # Do not show the image in a cycle that starts late
+    SKIP_FRAME = 1  # Drop the missed cycles and wait for the next deadline
+    DEGRADE = 2     # Run the heavy processing less often after several late cycles
+
+
+class RateScheduler:
+    """Wait for the next deadline of a fixed-rate loop and account for overruns.
+
+    Deadlines are absolute so the sleep time of each cycle makes up for
+    the time its work took and errors do not accumulate. When a cycle
+    overruns its deadline the next one starts right away and the policy
+    decides what to leave out. A rate of 0 runs the loop as fast as possible."""
+    DEGRADE_AFTER = 3    # Consecutive late cycles before degrading
+    RECOVER_AFTER = 30   # Consecutive cycles on time before recovering
+    DEGRADE_INTERVAL = 2 # Heavy processing runs once every this many cycles when degraded
+    HISTORY = 10000      # Overruns kept for the lateness statistics
+
+    def __init__(self, rate, policy=LatePolicy.SKIP_RENDER, time_fn=time.perf_counter, sleep_fn=asyncio.sleep, name="loop"):
+        """
+        rate: target cycles per second
+        policy: what to leave out when a cycle is late
+        time_fn: clock the deadlines are measured with
+        sleep_fn: coroutine function to wait a number of seconds
+        name: loop label of the metrics
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.period = 1 / rate if rate > 0 else 0
+        self.policy = policy
+        self.time_fn = time_fn
+        self.sleep_fn = sleep_fn
+        self.cycles = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.late = False
+        self.degraded = False
+        self.lateness = deque(maxlen=self.HISTORY)
+        self.__deadline = None
+        self.__late_streak = 0
+        self.__on_time_streak = 0
+        registry = metrics.get_registry()
+        name = registry.instance(name)
+        self.__cycle_counter = registry.counter("loop_cycles_total", "Cycles run by the fixed-rate loop", loop=name)
+        self.__overrun_counter = registry.counter("loop_overruns_total", "Cycles that started after their deadline", loop=name)
+        self.__skipped_counter = registry.counter("loop_skipped_cycles_total", "Cycles dropped to catch up with the deadlines", loop=name)
+        self.__lateness = registry.histogram("loop_lateness_seconds", "How late overrunning cycles started", loop=name)
+        registry.gauge("loop_degraded", "Whether the heavy processing runs less often",
+                       loop=name).set_function(lambda scheduler: int(scheduler.degraded), self)
+
+
+    @property
+    def should_render(self) -> bool:
+        """Whether the current cycle has time to show its image."""
+        return not (self.late and self.policy == LatePolicy.SKIP_RENDER)
+
+
+    @property
+    def should_process(self) -> bool:
+        """Whether the current cycle should run the heavy processing."""
+        return not self.degraded or self.cycles % self.DEGRADE_INTERVAL == 0
+
+
+    def start(self):
+        """Set the first deadline one period from now."""
+        self.__deadline = self.time_fn() + self.period
+
+
+    async def wait(self):
+        """Sleep until the next deadline, or yield if it has passed."""
+        if self.__deadline is None:
+            self.start()
+        self.cycles += 1
+        self.__cycle_counter.inc()
+        now = self.time_fn()
+        if self.period == 0 or now <= self.__deadline:
+            self.__on_time()
+            await self.sleep_fn(max(0, self.__deadline - now))
+            self.__deadline += self.period
+            return
+
+        lateness = now - self.__deadline
+        self.overruns += 1
+        self.lateness.append(lateness)
+        self.__overrun_counter.inc()
+        self.__lateness.observe(lateness)
+        self.late = True
+        self.__on_time_streak = 0
+        self.__late_streak += 1
+
+        if self.policy == LatePolicy.SKIP_FRAME:
+            missed = int(lateness // self.period) + 1
+            self.skipped += missed
+            self.__skipped_counter.inc(missed)
+            self.__deadline += missed * self.period
+            await self.sleep_fn(self.__deadline - now)
+            self.__deadline += self.period
+            return
+
+        if self.policy == LatePolicy.DEGRADE and self.__late_streak >= self.DEGRADE_AFTER and not self.degraded:
+            self.degraded = True
+            self.log.warning(f"Loop late for {self.__late_streak} cycles, processing degraded")
+        self.__deadline = now + self.period
+        await self.sleep_fn(0)
+
+
+    def log_stats(self):
+        """Log the number of overruns and how late they were."""
+        if self.cycles == 0:
+            return
+        message = f"{self.overruns} of {self.cycles} cycles overran the {self.period * 1000:.1f} ms period"
+        if self.lateness:
+            lateness = np.array(self.lateness) * 1000
+            message += f", late by mean {lateness.mean():.1f} ms max {lateness.max():.1f} ms"
+        if self.skipped:
+            message += f", {self.skipped} cycles skipped"
+        self.log.info(message)
+
+
+    def __on_time(self):
+        self.late = False
+        self.__late_streak = 0
+        self.__on_time_streak += 1
+        if self.degraded and self.__on_time_streak >= self.RECOVER_AFTER:
+            self.degraded = False
+            self.log.info(f"Loop on time for {self.__on_time_streak} cycles, processing restored")
@@ -0,0 +1,106 @@
+"""
+Lightweight tracing of the pipeline stages of each frame
+
+Spans are kept in a bounded in-memory buffer and can be
+dumped in the Chrome trace format, which can be opened
+in chrome://tracing or https://ui.perfetto.dev
+
+@author: Laura Gonzalez
+"""
+
+import os
+import time
+import json
+import asyncio
+import functools
+import threading
+import contextlib
+from collections import deque
+
+from dronecontrol.common import utils
+
+
+class Tracer:
+    """Record begin and end times of named spans tagged with a frame ID.
+
+    Only the last `capacity` spans are kept, so it can be left on
+    for long runs. A disabled tracer only costs a flag check per span."""
+    DEFAULT_CAPACITY = 100000
+    CATEGORY = "dronecontrol"
+
+    def __init__(self, filepath=None, capacity=DEFAULT_CAPACITY, enabled=True):
+        """
+        filepath: default file to dump the trace to
+        capacity: maximum number of spans kept in memory
+        enabled: record spans, if False tracing does nothing
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.filepath = filepath
+        self.enabled = enabled
+        self.frame = 0
+        self.events = deque(maxlen=capacity)
+
+
+    def next_frame(self) -> int:
+        """Start a new frame, following spans are tagged with its ID."""
+        self.frame += 1
+        return self.frame
+
+
+    @contextlib.contextmanager
+    def span(self, name: str):
+        """Record the time spent inside the context as a span."""
+        if not self.enabled:
+            yield
+            return
+
+        frame = self.frame
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.events.append((name, start, time.perf_counter_ns() - start, threading.get_ident(), frame))
+
+
+    def traced(self, func):
+        """Decorator to record every call to a function or coroutine as a span."""
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with self.span(func.__name__):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with self.span(func.__name__):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+    def dump(self, filepath=None):
+        """Write the recorded spans to a Chrome trace JSON file.
+
+        Return the path of the file, or None if tracing is disabled."""
+        if not self.enabled:
+            self.log.warning("Tracing is disabled, no trace saved")
+            return None
+
+        filepath = filepath or self.filepath or f"trace-{utils.get_formatted_date()}.json"
+        pid = os.getpid()
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = [{
+            "name": name, "cat": self.CATEGORY, "ph": "X",
+            "ts": start / 1000, "dur": duration / 1000,
+            "pid": pid, "tid": tid, "args": {"frame": frame}
+        } for name, start, duration, tid, frame in list(self.events)]
+        events += [{
+            "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+            "args": {"name": thread_names.get(tid, str(tid))}
+        } for tid in {event["tid"] for event in events}]
+
+        with open(filepath, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+        self.log.info(f"Saved {len(self.events)} spans to {filepath}")
+        return filepath
+
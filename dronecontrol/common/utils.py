@@ -2,15 +2,12 @@ import os
 import logging
 import typing
 import cv2
-import numpy
 import time
-import matplotlib.pyplot as plt
 from datetime import datetime
 from enum import Enum
 from mediapipe.python.solution_base import SolutionBase
 
-from dronecontrol.tools import tools
-from dronecontrol.common import pilot
+from dronecontrol.common import pilot, plotting
 
 
 LOGGING_FORMAT = '%(levelname)s:%(name)s: %(message)s'
@@ -77,7 +74,7 @@ def close_file_logger(logger: logging.Logger):
         handler.close()
 
 
-async def log_system_info(log: logging.Logger, pilot: pilot.System, tracking_info: str):
+async def log_system_info(log: logging.Logger, pilot: "pilot.System", tracking_info: str):
     """Log useful information about a pilot system to a dedicated logger."""
     if log is None:
         return
@@ -131,39 +128,11 @@ def get_wsl_host_ip():
 
 
 def plot(x, y, subplots=None, block=True, title="TEST PID", xlabel="time [s]", ylabel="PID (PV)", legend=None):
-    """Helper function to plot data with different styles."""
-    if len(x) == 0:
-        return
+    """Helper function to plot data with different styles.
     
-    x = numpy.array(x, dtype=object)
-    y = numpy.array(y, dtype=object)
-    plt.figure()
-    plt.xlabel(xlabel)
-    plt.grid(True)
-    plt.title(title)
-
-    if subplots:
-        count = 0
-        for i, subplot in enumerate(subplots):
-            plt.subplot(len(subplots), 1, i+1)
-            plt.plot(x[:], numpy.transpose(y[count:count+subplot]))
-            plt.grid(True)
-            plt.ylabel(ylabel[i])
-            count += subplot
-    else:
-        if x.shape[0] != y.shape[0]:
-            for y_data in y:
-                plt.plot(x, y_data)
-        elif x.shape == y.shape:
-            for i in range(x.shape[0]):
-                plt.plot(x[i], y[i])
-        else:
-            raise Exception("Unmatched data")
-        plt.ylabel(ylabel)
-
-    if legend:
-        plt.legend(legend)
-    plt.show(block=block)
+    Figures are drawn by a separate process, with block the call
+    returns once all the figure windows are closed."""
+    plotting.get_plotter().plot(x, y, subplots, title, xlabel, ylabel, legend, block)
 
 
 async def measure(func, time_list: list, is_async: bool, *args):
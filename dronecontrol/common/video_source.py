@@ -1,3 +1,7 @@
+import os
+import time
+import queue
+import threading
 import numpy
 import cv2
 import airsim
@@ -7,6 +11,9 @@ from math import tan, pi
 from msgpackrpc.error import TimeoutError, TransportError
 
 from dronecontrol.common import utils
+from dronecontrol.common.frame_pool import FramePool
+from dronecontrol.common import recorder
+from dronecontrol.common.frame_archive import FrameArchive
 
 WIDTH = 640
 HEIGHT = 480
@@ -17,22 +24,55 @@ class VideoSourceEmpty(Exception):
 
 
 class VideoSource(ABC):
+    """Base class for video sources.
+    
+    Frames are taken from a pool of buffers of the source size. A frame
+    returned by get_frame is only reused once the caller gives it back
+    with release, frames that are never released are not reused."""
     def __init__(self) -> None:
         self.__source = None
         self.log = utils.make_stdout_logger(__name__)
+        self.pool = FramePool((self.get_size()[1], self.get_size()[0], 3))
+        self.blank = self.pool.blank # Shared read-only blank frame
         self.img = self.get_blank()
-
-    def get_delay(self):
-        return 1
+        self.__start_time = None
 
     def get_frame(self):
-        return self.get_blank()
+        return self._set_frame(self.get_blank())
 
     def get_size(self):
         return WIDTH, HEIGHT
 
     def get_blank(self):
-        return numpy.zeros((self.get_size()[1], self.get_size()[0], 3), numpy.uint8)
+        """Return a writable blank frame from the pool."""
+        frame = self.pool.acquire()
+        frame.fill(0)
+        return frame
+
+    def release(self, frame):
+        """Give back a frame returned by get_frame once it is not needed anymore."""
+        self.pool.release(frame)
+
+    def _set_frame(self, frame):
+        """Replace the current frame, which the source holds a reference of its own to."""
+        if frame is not self.img:
+            self.pool.release(self.img)
+            self.pool.retain(frame)
+        self.img = frame
+        return frame
+
+    def _wait_until(self, timestamp):
+        """Sleep until the frame with this timestamp is due, counted from the first frame waited for."""
+        now = time.perf_counter()
+        if self.__start_time is None:
+            self.__start_time = now - timestamp
+        delay = self.__start_time + timestamp - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def _reset_time(self):
+        """Count the timestamps of the following frames from the next one waited for."""
+        self.__start_time = None
 
     @abstractmethod
     def close(self):
@@ -40,25 +80,74 @@ class VideoSource(ABC):
 
 
 class CameraSource(VideoSource):
-    """Video source to retrieve images from a connected camera."""
-    def __init__(self, camera=0):
+    """Video source to retrieve images from a connected camera.
+    
+    Capture options are requested from the driver, which may not honour
+    them. With drain, frames waiting in the driver buffer are grabbed and
+    discarded until one has to be waited for, so the frame returned is
+    the newest one. The age of the last frame is measured when the
+    backend reports frame timestamps, as V4L2 does."""
+    MAX_DRAIN = 8           # Most buffered frames discarded in one read
+    DRAIN_WAIT_FRACTION = 0.3 # A grab that takes this fraction of the period waited for a new frame
+    MAX_AGE = 5.0           # Older timestamps are taken as not comparable with the clock
+
+    def __init__(self, camera=0, fourcc: str=None, fps: float=None, buffer_size: int=None, drain=False):
+        """
+        camera: index of the camera device
+        fourcc: pixel format to request, e.g. 'MJPG' for higher frame rates on USB cameras
+        fps: frame rate to request
+        buffer_size: frames the driver keeps in its buffer, 1 for the lowest latency
+        drain: discard buffered frames on every read to always return the newest one
+        """
         self.__source = cv2.VideoCapture(camera)
-        super().__init__()
-        
         if self.__source.isOpened():
+            # The pixel format has to be set before the size for V4L2 to apply it
+            if fourcc:
+                self.__source.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
             self.__source.set(cv2.CAP_PROP_FRAME_WIDTH, WIDTH)
             self.__source.set(cv2.CAP_PROP_FRAME_HEIGHT, HEIGHT)
-        else:
+            if fps:
+                self.__source.set(cv2.CAP_PROP_FPS, fps)
+            if buffer_size:
+                self.__source.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        super().__init__()
+        self.drain = drain
+        self.drained = 0
+        self.age = None
+        self.fps = FileSource.DEFAULT_FPS
+        self.fourcc = ""
+        
+        if not self.__source.isOpened():
             self.log.error("Camera video capture failed")
-            
+            return
+        self.fps = self.__source.get(cv2.CAP_PROP_FPS) or self.fps
+        code = int(self.__source.get(cv2.CAP_PROP_FOURCC))
+        self.fourcc = "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\x00 ") or "unknown"
+        self.log.info(f"Camera capture {self.get_size()[0]}x{self.get_size()[1]} {self.fourcc} at {self.fps:g} FPS" +
+                      (f", buffer {int(self.__source.get(cv2.CAP_PROP_BUFFERSIZE))}" if buffer_size else ""))
+
+
+    @property
+    def is_opened(self) -> bool:
+        return self.__source.isOpened()
+
 
     def get_frame(self):
-        success, self.img = self.__source.read()
-        if not success:
-            self.img = self.get_blank()
+        frame = self.pool.acquire()
+        if self.drain:
+            success = self.__drain()
+            img = self.__source.retrieve(frame)[1] if success else None
         else:
-            self.img = cv2.flip(self.img, 1)
-        return self.img
+            success, img = self.__source.read(frame)
+        if not success or img is None:
+            self.pool.release(frame)
+            return self._set_frame(self.get_blank())
+        
+        self.__measure_age()
+        if img is not frame:
+            self.pool.release(frame)
+        cv2.flip(img, 1, dst=img)
+        return self._set_frame(img)
 
     def get_size(self):
         if not self.__source.isOpened():
@@ -70,39 +159,228 @@ class CameraSource(VideoSource):
         cv2.destroyAllWindows()
 
 
+    def __drain(self) -> bool:
+        """Grab frames until one has to be waited for, return whether the last grab succeeded."""
+        wait_time = self.DRAIN_WAIT_FRACTION / self.fps
+        for i in range(self.MAX_DRAIN):
+            start_time = time.perf_counter()
+            if not self.__source.grab():
+                return False
+            if i > 0:
+                self.drained += 1 # The previous grab was discarded
+            if time.perf_counter() - start_time > wait_time:
+                break
+        return True
+
+
+    def __measure_age(self):
+        """Compare the driver timestamp of the frame with the monotonic clock."""
+        age = time.monotonic() - self.__source.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        self.age = age if 0 <= age < self.MAX_AGE else None
+
+
 class FileSource(VideoSource):
     """Video source to retrieve images from a video file.
     
+    Frames are paced to the timestamps of the file, or returned as
+    fast as they can be decoded when real_time is False.
     Raises VideoSourceEmpty when the end of the file is reached."""
-    def __init__(self, file):
+    DEFAULT_FPS = 30
+    PREFETCH_SIZE = 8
+
+    def __init__(self, file, real_time=True, skip=0, flip=True, prefetch=False):
+        """
+        file: path to the video file
+        real_time: wait until each frame is due according to its timestamp
+        skip: number of frames dropped after each one returned, to simulate slower cameras
+        flip: mirror the frames horizontally like the camera source
+        prefetch: decode frames ahead on a background thread
+        """
         self.__source = cv2.VideoCapture(file)
+        # Read before prefetching, the capture is then only used by the prefetch thread
+        self.__size = int(self.__source.get(3)), int(self.__source.get(4))
         super().__init__()
         if not self.__source.isOpened():
             self.log.error("Could not open video file")
 
+        fps = self.__source.get(cv2.CAP_PROP_FPS)
+        self.fps = fps if fps > 0 else self.DEFAULT_FPS
+        self.real_time = real_time
+        self.skip = skip
+        self.flip = flip
+        self.__frame_count = 0
+        self.__frames = None
+        if prefetch:
+            self.__frames = queue.Queue(self.PREFETCH_SIZE)
+            self.__stop = threading.Event()
+            self.__thread = threading.Thread(target=self.__prefetch, name="prefetch", daemon=True)
+            self.__thread.start()
+
     def get_frame(self):
-        if not self.__source.isOpened():
+        if self.__frames is not None:
+            frame = self.__frames.get()
+        elif self.__source.isOpened():
+            frame = self.__read()
+        else:
             self.close()
             raise VideoSourceEmpty("Cannot access video file")
 
-        success, self.img = self.__source.read()
-        if not success:
-            self.img = self.get_blank()
+        if frame is None:
+            self.release(self._set_frame(self.get_blank()))
             self.close()
             raise VideoSourceEmpty("Video file finished")
 
-        return cv2.flip(self.img, 1)
+        img, timestamp = frame
+        if self.real_time:
+            self._wait_until(timestamp)
+        return self._set_frame(img)
 
     def get_size(self):
-        return int(self.__source.get(3)), int(self.__source.get(4))
-
-    def get_delay(self):
-        return int(1000 / 60) # 30 frames per second
+        return self.__size
 
     def close(self):
+        if self.__frames is not None and threading.current_thread() is not self.__thread:
+            self.__stop.set()
+            while self.__thread.is_alive():
+                try:
+                    self.__frames.get_nowait()
+                except queue.Empty:
+                    self.__thread.join(0.01)
+            self.__frames = None
         self.__source.release()
         cv2.destroyAllWindows()
 
+    def __read(self):
+        """Decode the next frame and return it with its timestamp in seconds,
+        or None at the end of the file."""
+        frame = self.pool.acquire()
+        success, img = self.__source.read(frame)
+        if not success:
+            self.pool.release(frame)
+            return None
+        if img is not frame:
+            self.pool.release(frame)
+
+        timestamp = self.__source.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        if timestamp <= 0:
+            timestamp = self.__frame_count / self.fps
+        self.__frame_count += 1
+        for _ in range(self.skip):
+            if self.__source.grab():
+                self.__frame_count += 1
+
+        if self.flip:
+            cv2.flip(img, 1, dst=img)
+        return img, timestamp
+
+    def __prefetch(self):
+        """Decode frames ahead of time until the file ends or the source is closed."""
+        while not self.__stop.is_set():
+            frame = self.__read() if self.__source.isOpened() else None
+            self.__frames.put(frame)
+            if frame is None:
+                return
+
+
+class RecordingSource(VideoSource):
+    """Video source to replay a recording made with the recorder.
+    
+    Frames are paced to the recorded timestamps, or returned as
+    fast as they can be read when real_time is False.
+    Raises VideoSourceEmpty when the end of the recording is reached."""
+    def __init__(self, directory, real_time=True):
+        self.directory = directory
+        self.info, self.index = recorder.load_recording(directory)
+        self.format = recorder.RecordFormat[self.info["format"]]
+        self.fps = self.info["fps"]
+        super().__init__()
+
+        self.real_time = real_time
+        self.__position = 0
+        self.__segment = None
+        self.__reader = None
+
+    def get_frame(self):
+        if self.__position >= len(self.index):
+            self.close()
+            raise VideoSourceEmpty("Recording finished")
+
+        segment, frame, timestamp = self.index[self.__position]
+        self.__position += 1
+        if segment != self.__segment:
+            self.__open_segment(int(segment))
+
+        img = self.pool.acquire()
+        if self.format in (recorder.RecordFormat.RAW, recorder.RecordFormat.ARCHIVE):
+            numpy.copyto(img, self.__reader[int(frame)])
+        elif not self.__reader.read(img)[0]:
+            self.pool.release(img)
+            self.close()
+            raise VideoSourceEmpty(f"Could not read frame {int(frame)} of segment {int(segment)}")
+
+        if self.real_time:
+            self._wait_until(timestamp)
+        return self._set_frame(img)
+
+    def get_size(self):
+        return self.info["width"], self.info["height"]
+
+    def close(self):
+        if isinstance(self.__reader, cv2.VideoCapture):
+            self.__reader.release()
+        self.__reader = None
+        cv2.destroyAllWindows()
+
+    def __open_segment(self, segment):
+        """Open a segment for reading, raw segments are memory mapped."""
+        self.close()
+        filepath = os.path.join(self.directory, recorder.get_segment_name(segment, self.format))
+        if self.format == recorder.RecordFormat.RAW:
+            width, height = self.get_size()
+            self.__reader = numpy.memmap(filepath, numpy.uint8, "r").reshape(-1, height, width, 3)
+        elif self.format == recorder.RecordFormat.ARCHIVE:
+            self.__reader = FrameArchive(filepath)
+        else:
+            self.__reader = cv2.VideoCapture(filepath)
+        self.__segment = segment
+
+
+class ArchiveSource(VideoSource):
+    """Video source to replay a frame archive without decoding.
+    
+    Frames are views into the memory-mapped file, copy-on-write so
+    they can be drawn on, or copies into pool frames if copy is True.
+    Raises VideoSourceEmpty when the end of the archive is reached."""
+    def __init__(self, file, real_time=True, copy=False):
+        self.archive = FrameArchive(file, writable=True)
+        self.fps = self.archive.fps
+        super().__init__()
+        self.real_time = real_time
+        self.copy = copy
+        self.position = 0
+
+    def get_frame(self):
+        if self.position >= len(self.archive):
+            self.close()
+            raise VideoSourceEmpty("Archive finished")
+
+        frame = self.archive[self.position]
+        if self.real_time:
+            self._wait_until(self.archive.timestamps[self.position])
+        self.position += 1
+        return self._set_frame(self.pool.copy(frame) if self.copy else frame)
+
+    def seek(self, position):
+        """Continue the replay from a frame number."""
+        self.position = max(0, min(position, len(self.archive)))
+        self._reset_time()
+
+    def get_size(self):
+        return self.archive.width, self.archive.height
+
+    def close(self):
+        cv2.destroyAllWindows()
+
 
 class SimulatorSource(VideoSource):
     """Video source to retrieve images from an AirSim simulator."""
@@ -124,19 +402,220 @@ class SimulatorSource(VideoSource):
 
     def get_frame(self):
         if self.__source is None:
-            return self.get_blank()
+            return self._set_frame(self.get_blank())
         image = self.__source.simGetImages([
             airsim.ImageRequest("front_center", airsim.ImageType.Scene, False, False)
         ])[0]
-        image_bytes = numpy.fromstring(image.image_data_uint8, dtype=numpy.uint8)
-        self.img = image_bytes.reshape(image.height, image.width, 3)
-        return self.img
+        image_bytes = numpy.frombuffer(image.image_data_uint8, dtype=numpy.uint8)
+        view = image_bytes.reshape(image.height, image.width, 3)
+        if view.shape != self.pool.shape:
+            self.pool = FramePool(view.shape)
+            self.blank = self.pool.blank
+        return self._set_frame(self.pool.copy(view))
 
     def get_size(self):
         return (self.width, self.height)
 
-    def get_delay(self):
-        return 1
+    def close(self):
+        cv2.destroyAllWindows()
+
+
+class SyntheticSource(VideoSource):
+    """Video source that renders a person walking along a scripted path.
+
+    The person is a sprite over a background that pans with the heading
+    of the camera. The sprite can be an image, cut out by its alpha
+    channel, or a clip whose frames are cut out from their plain
+    background, and a drawn figure is used by default. The camera starts
+    at the origin looking along +y and moves with the velocities given to
+    command, which closes the loop with the follow controller. Frames are
+    mirrored like the camera source and the normalized box of the person
+    in the last frame is kept in subject_box, None when out of view.
+    More people can walk in the scene, the boxes of everyone starting
+    with the person are kept in people_boxes."""
+    FOV = 90.0              # Horizontal field of view in degrees, as the AirSim camera
+    PERSON_HEIGHT = 1.7     # m
+    CAMERA_HEIGHT = 1.5     # m above the ground
+    MIN_DEPTH = 0.5         # m, closer people are not drawn
+    CUT_OUT_THRESHOLD = 40  # Colour difference from the clip background that is part of the person
+    TRAJECTORIES = ("still", "sideways", "circle", "away")
+
+    def __init__(self, trajectory="sideways", sprite=None, background=None, fps=FileSource.DEFAULT_FPS,
+                 real_time=False, distance=4.0, speed=1.0, others=()):
+        """
+        trajectory: one of TRAJECTORIES or a function of the time in seconds
+                    returning the (x, y) position of the person in metres
+        sprite: image or video file of the person, a drawn figure by default
+        background: image file of the background, a generated one by default
+        fps: frames per second, each frame advances the scene by 1 / fps seconds
+        real_time: wait until each frame is due instead of returning it at once
+        distance: metres from the camera to the start of the trajectory
+        speed: walking speed of the person in m/s
+        others: trajectory functions of more people walking in the scene
+        """
+        super().__init__()
+        if not callable(trajectory) and trajectory not in self.TRAJECTORIES:
+            raise ValueError(f"Unknown trajectory {trajectory}, choose among {', '.join(self.TRAJECTORIES)}")
+        self.trajectory = trajectory if callable(trajectory) else SyntheticSource.__get_trajectory(trajectory, distance, speed)
+        self.others = list(others)
+        self.fps = fps
+        self.real_time = real_time
+        self.time = 0.0
+        self.position = numpy.zeros(2) # Camera position in metres
+        self.heading = 0.0             # Camera heading in degrees, clockwise from +y
+        self.subject_box = None
+        self.people_boxes = []
+        self.__yaw_rate = 0.0
+        self.__forward = 0.0
+        self.__frame_count = 0
+
+        width, height = self.get_size()
+        self.__focal = width / 2 / tan(self.FOV / 2 * pi / 180)
+        self.__background = self.__load_background(background)
+        self.__sprites, self.__sprite_fps = self.__load_sprites(sprite)
+        self.log.info(f"Synthetic person on a {trajectory if isinstance(trajectory, str) else 'custom'} trajectory " +
+                      f"with {len(self.__sprites)} sprite frames")
+
+    def command(self, yaw=0.0, forward=0.0):
+        """Set the velocity of the camera, yaw in degrees per second and forward in metres per second."""
+        self.__yaw_rate = yaw
+        self.__forward = forward
+
+    def get_frame(self):
+        dt = 1 / self.fps
+        heading = self.heading * pi / 180
+        self.position += self.__forward * dt * numpy.array((numpy.sin(heading), numpy.cos(heading)))
+        self.heading = (self.heading + self.__yaw_rate * dt) % 360
+        self.time = self.__frame_count / self.fps
+        self.__frame_count += 1
+        if self.real_time:
+            self._wait_until(self.time)
+
+        frame = self.pool.acquire()
+        self.__draw_background(frame)
+        self.people_boxes = self.__draw_people(frame)
+        self.subject_box = self.people_boxes[0]
+        cv2.flip(frame, 1, dst=frame)
+        return self._set_frame(frame)
 
     def close(self):
         cv2.destroyAllWindows()
+
+    def __draw_background(self, frame):
+        """Copy the background panned by the heading, a turn of FOV degrees pans one image width."""
+        width = frame.shape[1]
+        shift = int(round(self.heading / self.FOV * width)) % width
+        frame[:, :width - shift] = self.__background[:, shift:]
+        frame[:, width - shift:] = self.__background[:, :shift]
+
+    def __draw_people(self, frame):
+        """Draw everyone from the farthest to the closest and return their boxes in trajectory order."""
+        heading = self.heading * pi / 180
+        offsets = numpy.array([trajectory(self.time) for trajectory in [self.trajectory] + self.others], dtype=float) - self.position
+        depths = offsets @ (numpy.sin(heading), numpy.cos(heading))
+        laterals = offsets @ (numpy.cos(heading), -numpy.sin(heading))
+        boxes = [None] * len(offsets)
+        for i in numpy.argsort(-depths):
+            if depths[i] >= self.MIN_DEPTH:
+                boxes[i] = self.__draw_person(frame, depths[i], laterals[i])
+        return boxes
+
+    def __draw_person(self, frame, depth, lateral):
+        """Draw a person with a pinhole camera model and return its mirrored normalized box."""
+
+        frame_height, frame_width = frame.shape[:2]
+        image, mask = self.__sprites[int(self.time * self.__sprite_fps) % len(self.__sprites)]
+        height = self.__focal * self.PERSON_HEIGHT / depth
+        width = height * image.shape[1] / image.shape[0]
+        left = int(round(frame_width / 2 + self.__focal * lateral / depth - width / 2))
+        top = int(round(frame_height / 2 + self.__focal * (self.CAMERA_HEIGHT - self.PERSON_HEIGHT) / depth))
+        width, height = max(int(round(width)), 1), max(int(round(height)), 1)
+        x1, y1 = max(left, 0), max(top, 0)
+        x2, y2 = min(left + width, frame_width), min(top + height, frame_height)
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        scaled = cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+        scaled_mask = cv2.resize(mask, (width, height), interpolation=cv2.INTER_NEAREST)
+        crop = (slice(y1 - top, y2 - top), slice(x1 - left, x2 - left))
+        numpy.copyto(frame[y1:y2, x1:x2], scaled[crop], where=scaled_mask[crop][..., numpy.newaxis] > 0)
+        return (numpy.array((1 - x2 / frame_width, y1 / frame_height)),
+                numpy.array((1 - x1 / frame_width, y2 / frame_height)))
+
+    def __load_background(self, filepath):
+        width, height = self.get_size()
+        if filepath:
+            image = cv2.imread(filepath)
+            if image is not None:
+                return cv2.resize(image, (width, height))
+            self.log.error(f"Could not read background {filepath}, using the default one")
+
+        # Sky over a floor, with columns of different shades so panning shows
+        background = numpy.empty((height, width, 3), numpy.uint8)
+        background[:height // 2] = numpy.linspace(230, 150, height // 2, dtype=numpy.uint8)[:, None, None]
+        background[height // 2:] = (90, 110, 120)
+        shades = numpy.random.default_rng(0).integers(-30, 30, width // 20 + 1)
+        background[:height // 2] = numpy.clip(background[:height // 2] + numpy.repeat(shades, 20)[:width, None], 0, 255)
+        return background
+
+    def __load_sprites(self, filepath):
+        """Return the (image, mask) of each sprite frame and their frame rate."""
+        if not filepath:
+            return [SyntheticSource.__draw_figure()], 1
+        if filepath.lower().endswith((".mp4", ".avi", ".mov", ".mkv")):
+            clip = cv2.VideoCapture(filepath)
+            fps = clip.get(cv2.CAP_PROP_FPS) or FileSource.DEFAULT_FPS
+            sprites = []
+            while True:
+                success, image = clip.read()
+                if not success:
+                    break
+                sprites.append(SyntheticSource.__cut_out(image))
+            clip.release()
+            if sprites:
+                return sprites, fps
+        else:
+            image = cv2.imread(filepath, cv2.IMREAD_UNCHANGED)
+            if image is not None:
+                return [SyntheticSource.__cut_out(image)], 1
+        self.log.error(f"Could not read sprite {filepath}, using a drawn figure")
+        return [SyntheticSource.__draw_figure()], 1
+
+    @staticmethod
+    def __cut_out(image):
+        """Split an image in its colours and a mask of the person, from the alpha
+        channel or else from the difference with the colour of the top left corner."""
+        if image.ndim == 3 and image.shape[2] == 4:
+            return numpy.ascontiguousarray(image[..., :3]), image[..., 3]
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        difference = numpy.abs(image.astype(numpy.int16) - image[0, 0].astype(numpy.int16)).max(axis=2)
+        return image, (difference > SyntheticSource.CUT_OUT_THRESHOLD).astype(numpy.uint8) * 255
+
+    @staticmethod
+    def __draw_figure():
+        """Draw a standing person facing the camera, 340 pixels tall."""
+        image = numpy.zeros((340, 120, 3), numpy.uint8)
+        mask = numpy.zeros((340, 120), numpy.uint8)
+        for canvas, skin, shirt, trousers in ((image, (150, 180, 225), (160, 70, 40), (60, 50, 40)), (mask, 255, 255, 255)):
+            cv2.line(canvas, (45, 190), (40, 330), trousers, 20)
+            cv2.line(canvas, (75, 190), (80, 330), trousers, 20)
+            cv2.rectangle(canvas, (35, 60), (85, 195), shirt, -1)
+            cv2.line(canvas, (35, 70), (15, 185), shirt, 14)
+            cv2.line(canvas, (85, 70), (105, 185), shirt, 14)
+            cv2.circle(canvas, (60, 32), 26, skin, -1)
+        return image, mask
+
+    @staticmethod
+    def __get_trajectory(name, distance, speed):
+        """Return the position of the person over time for a named trajectory,
+        all start in front of the camera and walk at the given speed."""
+        radius = 1.5
+        rate = speed / radius
+        if name == "still":
+            return lambda t: (0.0, distance)
+        if name == "sideways":
+            return lambda t: (radius * numpy.sin(rate * t), distance)
+        if name == "circle":
+            return lambda t: (radius * numpy.sin(rate * t), distance + radius - radius * numpy.cos(rate * t))
+        return lambda t: (0.0, distance + radius - radius * numpy.cos(rate * t))
@@ -1,14 +1,15 @@
-from simple_pid import PID
 from dronecontrol.common import utils
+from dronecontrol.follow.pid import VectorPID, PIDAxis
 
 import numpy as np
 import time
 
 class Controller:
-    """Wrapper class for the simple_pid library.
+    """Wrapper class for a vectorized PID engine.
     
     Implements two PID controllers for obtaining yaw and forward 
-    velocity outputs from a detected bounding box."""
+    velocity outputs from a detected bounding box, updated together.
+    More axes can be added to the engine at no extra cost per axis."""
 
     MAX_FWD_VEL = 0.4
     MAX_YAW_VEL = 5
@@ -21,19 +22,18 @@ class Controller:
     DEFAULT_YAW_TUNINGS = (100, 40, 0)
     DEFAULT_FWD_TUNINGS = (4, 1, 0)
 
-    def __init__(self, target_x, target_height, invert_yaw=False) -> None:
+    def __init__(self, target_x, target_height, invert_yaw=False, time_fn=time.monotonic) -> None:
+        """time_fn: clock of the PID updates and recorded times, a simulated one makes runs repeatable"""
         self.log = utils.make_stdout_logger(__name__)
+        self.time_fn = time_fn
         
-        self.yaw_pid = PID()
-        self.yaw_pid.tunings = self.DEFAULT_YAW_TUNINGS
-        self.yaw_pid.setpoint = target_x
-        self.yaw_pid.output_limits = (-self.MAX_YAW_VEL, self.MAX_YAW_VEL)
+        self.pid = VectorPID(2, tunings=(self.DEFAULT_YAW_TUNINGS, self.DEFAULT_FWD_TUNINGS),
+                             setpoint=(target_x, target_height),
+                             output_limits=((-self.MAX_YAW_VEL, -self.MAX_FWD_VEL), (self.MAX_YAW_VEL, self.MAX_FWD_VEL)),
+                             time_fn=time_fn)
+        self.yaw_pid = self.pid.axis(0)
+        self.fwd_pid = self.pid.axis(1)
         self.invert_yaw = invert_yaw
-
-        self.fwd_pid = PID()
-        self.fwd_pid.tunings = self.DEFAULT_FWD_TUNINGS
-        self.fwd_pid.setpoint = target_height
-        self.fwd_pid.output_limits = (-self.MAX_FWD_VEL, self.MAX_FWD_VEL)
         
         self.reset()
 
@@ -43,13 +43,11 @@ class Controller:
             return 0, 0
 
         yaw_input = self.__get_yaw_point_from_box(p1, p2)
-        yaw_vel = self.yaw_pid(yaw_input)
+        fwd_input = self.__get_fwd_point_from_box(p1, p2)
+        yaw_vel, fwd_vel = (float(vel) for vel in self.pid((yaw_input, fwd_input)))
         if self.invert_yaw:
             yaw_vel = yaw_vel * -1
 
-        fwd_input = self.__get_fwd_point_from_box(p1, p2)
-        fwd_vel = self.fwd_pid(fwd_input)
-
         # Save detailed measures for visualizing data
         self._yaw_setpoint_list.append(self.yaw_pid.setpoint)
         self._yaw_feedback_list.append(yaw_input)
@@ -59,7 +57,7 @@ class Controller:
         self._fwd_feedback_list.append(fwd_input)
         self._fwd_output_list.append(fwd_vel)
         self._fwd_output_detail_list.append(self.fwd_pid.components)
-        self._time_list.append(time.time() - self._start_time)
+        self._time_list.append(self.time_fn() - self._start_time)
 
         self.last_yaw_vel = (float)(yaw_vel)
         self.last_fwd_vel = (float)(fwd_vel)
@@ -76,16 +74,15 @@ class Controller:
         self._fwd_output_list = []
         self._fwd_output_detail_list = []
         self._time_list = []
-        self._start_time = time.time()
+        self._start_time = self.time_fn()
 
         self.last_yaw_vel = 0.0
         self.last_fwd_vel = 0.0
-        self.yaw_pid.reset()
-        self.fwd_pid.reset()
+        self.pid.reset()
 
 
     @staticmethod
-    def is_pid_on(pid: PID):
+    def is_pid_on(pid: PIDAxis):
         return pid.tunings != (0, 0, 0)
 
 
@@ -5,23 +5,36 @@ import cv2
 import mediapipe as mp
 import numpy as np
 
-from mediapipe.python.solution_base import SolutionBase
 from mavsdk.action import ActionError
 
-from dronecontrol.common import utils, input
+from dronecontrol.common import utils, input, metrics
+from dronecontrol.common.metrics import MetricsExporter
 from dronecontrol.common.video_source import CameraSource, SimulatorSource
 from dronecontrol.common.pilot import System
-from dronecontrol.follow import image_processing
+from dronecontrol.common.landmark_cache import LandmarkCache, PoseResults, process_pose, pose_to_array, array_to_pose
+from dronecontrol.common.executor import VisionExecutor, ExecutorMode
+from dronecontrol.common.monitor import LoopMonitor
+from dronecontrol.common.tracing import Tracer
+from dronecontrol.common.scheduler import RateScheduler, LatePolicy
+from dronecontrol.common.governor import InferenceGovernor
+from dronecontrol.follow import image_processing, tracking
 from dronecontrol.follow.controller import Controller
 
 mp_pose = mp.solutions.pose
 
 YAW_POINT = 0.5 # Target mid-point of screen
 FWD_POINT = 0.5 # Target 50% of screen height 
+LOOP_RATE = 30  # Target loop cycles per second
+
+TRACED_PILOT_CALLS = ("set_velocity", "is_offboard", "get_position_ned_yaw", "get_ground_velocity_mag", "get_yaw_velocity") # Recorded as spans
+worker_pose = None # Pose model of a worker process of the vision executor
 
 
 class Follow():
-    def __init__(self, ip="", port=None, serial=None, simulator_ip=None, log=None):
+    def __init__(self, ip="", port=None, serial=None, simulator_ip=None, log=None, cache_dir=None,
+                 read_terminal=False, executor_mode=ExecutorMode.THREAD, monitor_file=None, trace_file=None,
+                 multi_person=False, rate=LOOP_RATE, late_policy=LatePolicy.SKIP_RENDER,
+                 ready_checks=System.READY_CHECKS, adaptive_inference=False):
         """
         Follow-person control solution.
 
@@ -32,9 +45,19 @@ class Follow():
                       None defaults to a camera source.
                       Empty string connects to a simulator on localhost.
         log: use an already created logger, makes a new one if None is provided 
+        cache_dir: folder to store the pose landmarks for reuse on the same images
+        read_terminal: accept keyboard commands typed in the terminal as well as in the image window
+        executor_mode: where to run the blocking vision calls, a worker thread by default
+        monitor_file: record event loop and action timings and save them to this JSON file on close
+        trace_file: record spans for each frame and save them to this Chrome trace file on close
+        multi_person: track every person in view and follow only the one locked as target
+        rate: target loop cycles per second, 0 runs as fast as possible
+        late_policy: what to leave out of a loop cycle when the previous one was late
+        ready_checks: pilot health checks required before flying, see System.HEALTH_CHECKS
+        adaptive_inference: run pose detection less often while the image and the controller error are not changing
         """
         self.log = utils.make_stdout_logger(__name__) if log is None else log
-        self.input_handler = input.InputHandler()
+        self.input_handler = input.InputHandler(read_terminal)
         self.last_run_time = time.time()
         self.image_events = []
         use_simulator = simulator_ip is not None
@@ -48,11 +71,32 @@ class Follow():
             simulator_ip = utils.get_wsl_host_ip()
         self.source = self.__get_source(simulator_ip, use_simulator)
 
-        self.pilot = System(ip, port, serial is not None, serial)
+        self.pilot = System(ip, port, serial is not None, serial, ready_checks=ready_checks)
         self.controller = Controller(YAW_POINT, FWD_POINT, use_simulator)
+        self.p1, self.p2 = Controller.ZEROES, Controller.ONES # No person detected
         self.is_follow_on = True
         self.is_keyboard_control_on = True
         self.measures = {}
+        self.cache = LandmarkCache(cache_dir, "pose:1") if cache_dir else None
+        self.executor = VisionExecutor(executor_mode)
+        self.loop_monitor = LoopMonitor() if monitor_file else None
+        self.monitor_file = monitor_file
+        self.pilot.monitor = self.loop_monitor
+        self.tracer = Tracer(trace_file, enabled=trace_file is not None)
+        self.controller.control = self.tracer.traced(self.controller.control)
+        for name in TRACED_PILOT_CALLS:
+            setattr(self.pilot, name, self.tracer.traced(getattr(self.pilot, name)))
+        self.tracker = tracking.PersonTracker() if multi_person else None
+        self.scheduler = RateScheduler(rate, late_policy, name="follow")
+        self.governor = InferenceGovernor(name="follow") if adaptive_inference else None
+        self.__frame_counter = metrics.get_registry().counter("frames_total", "Frames read from the video source", app="follow")
+        self.__stage_metrics = {}
+
+        self.input_handler.bind_pilot(self.__run_pilot_key)
+        self.input_handler.bind('r', lambda: self.pose.process(self.source.blank)) # Reset image processing
+        self.input_handler.bind('p', self.tracer.dump)                              # Save trace of the last frames
+        if self.tracker:
+            self.input_handler.bind('n', self.tracker.switch_target)                # Follow next person
 
 
     async def run(self):
@@ -64,21 +108,36 @@ class Follow():
                 self.log.error("Connection time-out")
                 return
 
+        if self.loop_monitor:
+            self.loop_monitor.start(LoopMonitor.SLOW_CALLBACK_TIME)
+        supervisor_task = asyncio.create_task(self.pilot.supervise())
+        try:
+            await self.__run_loop()
+        finally:
+            supervisor_task.cancel()
+            await supervisor_task
+            if self.loop_monitor:
+                await self.loop_monitor.stop()
+
+
+    async def __run_loop(self):
         # Option: model_complexity=0
         with mp_pose.Pose() as pose:
             self.pose = pose
+            self.scheduler.start()
             while True:
+                self.tracer.next_frame()
                 await self.measure(self.__process_image, pose)
                 await self.measure(self.__offboard_control, self.p1, self.p2)
                 await self.measure(self.__on_new_image)
 
                 if self.is_keyboard_control_on:
                     try:
-                        await self.measure(self.__manual_input_control, pose)
+                        await self.measure(self.__manual_input_control)
                     except KeyboardInterrupt:
                         break
                 
-                await self.measure(asyncio.sleep, 0.001)
+                await self.measure(self.scheduler.wait)
 
 
     def subscribe_to_image(self, func):
@@ -87,12 +146,26 @@ class Follow():
         self.image_events.append(func)
 
     
-    async def measure(self, func, *args, is_async=True):
-        """Call a function and log the execution time to the measures dictionary."""
+    async def measure(self, func, *args, is_async=True, offload=False):
+        """Call a function and log the execution time to the measures dictionary,
+        the stage metrics and as a span of the current frame.
+        
+        Blocking functions can be offloaded to the vision executor."""
         func_name = func.__name__
         if func_name not in self.measures:
             self.measures[func_name] = []
-        return await utils.measure(func, self.measures[func_name], is_async, *args)
+            self.__stage_metrics[func_name] = metrics.get_registry().histogram(
+                "stage_seconds", "Time taken by each stage of the loop", app="follow", stage=func_name)
+        times = self.measures[func_name]
+        count = len(times)
+        try:
+            with self.tracer.span(func_name):
+                if offload:
+                    return await utils.measure(self.executor.run, times, True, func, *args)
+                return await utils.measure(func, times, is_async, *args)
+        finally:
+            if len(times) > count:
+                self.__stage_metrics[func_name].observe(times[-1])
 
 
     def log_measures(self):
@@ -116,33 +189,92 @@ class Follow():
 
     def close(self):
         """Close external modules and tools."""
+        self.input_handler.close()
         self.pilot.close()
         self.source.close()
         while cv2.waitKey(200) == 0:
             continue
 
+        self.executor.close()
+        if self.loop_monitor:
+            self.loop_monitor.export(self.monitor_file, self.measures)
+        if self.tracer.enabled:
+            self.tracer.dump()
         self.log_measures()
-                
+        if self.loop_monitor:
+            self.loop_monitor.log_stats()
+        self.scheduler.log_stats()
+        if self.governor:
+            self.governor.log_stats()
+
 
     async def __process_image(self, pose):
         """Run pose detection algorithm on a new frame and store bounding box."""
-        image = await self.measure(self.source.get_frame, is_async=False)
+        image = await self.measure(self.source.get_frame, offload=True)
+        self.__frame_counter.inc()
+        if not self.scheduler.should_process or (self.governor and not self.governor.should_infer(image, self.__get_error())):
+            self.__render(image)
+            return
+
         try:
-            self.results = await self.measure(pose.process, image, is_async=False)
+            if self.tracker:
+                self.results = await self.measure(self.__process_target, pose, image, offload=True)
+            elif self.executor.mode == ExecutorMode.PROCESS:
+                self.results = await self.measure(self.__process_pose_in_worker, image)
+            else:
+                self.results = await self.measure(process_pose, pose, image, self.cache, offload=True)
         except Exception as e:
             self.log.error("Image error: " + str(e))
             self.results.pose_landmarks = None
             try:
-                pose.process(self.source.get_blank())
+                pose.process(self.source.blank)
             except:
                 pose = mp_pose.Pose()
 
-        self.p1, self.p2 = await self.measure(image_processing.detect, self.results, image, is_async=False)
-        self.__show_image(image)
+        self.p1, self.p2 = await self.measure(image_processing.detect, self.results, image, offload=True)
+        self.__render(image)
+
+
+    def __render(self, image):
+        """Show the image unless the loop is late and rendering can be skipped,
+        then give it back to the source."""
+        if self.scheduler.should_render:
+            self.__show_image(image)
+        self.source.release(image)
+
+
+    async def __process_pose_in_worker(self, image):
+        """Run pose detection in the process pool of the executor.
+
+        Models cannot be sent to other processes, each worker has its own
+        and only the image and the packed landmarks are copied."""
+        key = self.cache.get_key(image) if self.cache else None
+        array = self.cache.get(key) if self.cache else None
+        if array is None:
+            array = await self.executor.run_cpu(detect_pose, image)
+            if self.cache:
+                self.cache.put(key, array)
+        return array_to_pose(array)
+
+
+    def __process_target(self, pose, image):
+        """Run pose detection only on the person locked as target."""
+        box = self.tracker.process(image)
+        if box is None:
+            return PoseResults(None)
+
+        cropped, box = tracking.crop(image, box)
+        results = process_pose(pose, np.ascontiguousarray(cropped), self.cache)
+        if results.pose_landmarks:
+            tracking.remap_landmarks(results.pose_landmarks, box)
+            self.tracker.update_target(np.concatenate(image_processing.get_bounding_box(results.pose_landmarks.landmark)))
+        return results
 
 
     def __show_image(self, image):
         """Annotate image and show in a window."""
+        if self.tracker:
+            tracking.draw_tracks(image, self.tracker.tracks, self.tracker.target_id)
         inputs = Controller.get_input(self.p1, self.p2)
         utils.write_text_to_image(image, f"Yaw input: {inputs[0]:.3} - fwd input: {inputs[1]:.3}")
         utils.write_text_to_image(image, f"Yaw output: {self.controller.last_yaw_vel:.3} - fwd output: {self.controller.last_fwd_vel:.3}", 2)
@@ -162,7 +294,8 @@ class Follow():
 
     async def __offboard_control(self, p1, p2):
         """Check offboard control for driving the vehicle."""
-        if await self.pilot.is_offboard() and self.is_follow_on:
+        is_offboard = await self.pilot.is_offboard()
+        if is_offboard and self.is_follow_on:
             yaw, fwd = self.controller.control(p1, p2)
             await self.__fly(yaw, fwd)
             
@@ -178,19 +311,25 @@ class Follow():
             self._pilot_vel_list.append([await self.pilot.get_ground_velocity_mag(), await self.pilot.get_yaw_velocity()])
 
 
-    async def __manual_input_control(self, pose):
+    async def __manual_input_control(self):
         """Handle manual input to the pilot through the keyboard."""
-        key = cv2.waitKey(self.source.get_delay())
-        key_action = self.input_handler.handle(key)
-        if key_action:
-            if System.__name__ in key_action.__qualname__:
-                try:
-                    await key_action(self.pilot)
-                except ActionError as e:
-                    self.log.error(e)
-                    await self.pilot.abort()
-            elif SolutionBase.__name__ in key_action.__qualname__:
-                key_action(pose, self.source.get_blank())
+        await self.input_handler.handle(self.input_handler.poll())
+
+
+    async def __run_pilot_key(self, action):
+        """Run the pilot action of a key, aborting if it fails."""
+        try:
+            await action(self.pilot)
+        except ActionError as e:
+            self.log.error(e)
+            await self.pilot.abort()
+
+
+    def __get_error(self):
+        """Return the controller error of each axis, zero without a detected person."""
+        if np.array_equal(self.p1, Controller.ZEROES) and np.array_equal(self.p2, Controller.ONES):
+            return 0.0
+        return (self.controller.get_yaw_error(self.p1, self.p2), self.controller.get_fwd_error(self.p1, self.p2))
 
 
     def __get_source(self, ip, use_simulator):
@@ -211,9 +350,30 @@ class Follow():
                 traceback.print_exc()
 
 
-def main(ip="", simulator=None, serial=None, port=None):
+def detect_pose(image) -> np.ndarray:
+    """Run the pose model of the current process on an image and return the packed results.
+
+    The model is created on the first call and kept for the next frames,
+    it is created again after an error like the main loop does."""
+    global worker_pose
+    if worker_pose is None:
+        worker_pose = mp_pose.Pose()
+    try:
+        return pose_to_array(worker_pose.process(image))
+    except Exception:
+        worker_pose = None
+        raise
+
+
+def main(ip="", simulator=None, serial=None, port=None, read_terminal=False, executor_mode=ExecutorMode.THREAD,
+         monitor_file=None, trace_file=None, multi_person=False, rate=LOOP_RATE, late_policy=LatePolicy.SKIP_RENDER,
+         ready_checks=System.READY_CHECKS, metrics_port=None, metrics_file=None, adaptive_inference=False):
     log = utils.make_stdout_logger(__name__)
-    follow = Follow(ip, port, serial, simulator, log)
+    exporter = MetricsExporter(metrics_port, metrics_file) if metrics_port is not None or metrics_file else None
+    follow = Follow(ip, port, serial, simulator, log, read_terminal=read_terminal, executor_mode=executor_mode,
+                    monitor_file=monitor_file, trace_file=trace_file, multi_person=multi_person,
+                    rate=rate, late_policy=late_policy, ready_checks=ready_checks,
+                    adaptive_inference=adaptive_inference)
 
     try:
         asyncio.run(follow.run())
@@ -224,4 +384,6 @@ def main(ip="", simulator=None, serial=None, port=None):
     except:
         traceback.print_exc()
         
-    follow.close()
\ No newline at end of file
+    follow.close()
+    if exporter:
+        exporter.close()
\ No newline at end of file
@@ -0,0 +1,193 @@
+"""
+PID controllers for several axes updated in one vectorized step
+
+Follows the semantics of simple_pid.PID with the proportional term on
+the error and the derivative on the measurement. The integral term is
+clamped to the output limits to avoid windup and so is the output.
+One engine can run one controller per axis or one per candidate gain
+set, and each of them can be used like a simple_pid.PID through a view.
+
+@author: Laura Gonzalez
+"""
+
+import time
+import typing
+import numpy as np
+
+
+class VectorPID:
+    """A number of PID controllers that share a clock and are updated together."""
+    SAMPLE_TIME = 0.01
+
+    def __init__(self, count=1, tunings=(1.0, 0.0, 0.0), setpoint=0.0, output_limits=(None, None),
+                 sample_time=SAMPLE_TIME, time_fn=time.monotonic):
+        """
+        count: number of controllers
+        tunings: (Kp, Ki, Kd) for all the controllers or one tuple for each
+        setpoint: value for all the controllers or one for each
+        output_limits: (lower, upper) for all the controllers or two sequences with one for each, None for no limit
+        sample_time: minimum seconds between updates, None computes a new output on every call
+        time_fn: clock used when no time step is given
+        """
+        self.count = count
+        self.gains = np.empty((count, 3))
+        self.gains[:] = tunings
+        self.setpoint = np.empty(count)
+        self.setpoint[:] = setpoint
+        self.lower = np.full(count, -np.inf)
+        self.upper = np.full(count, np.inf)
+        self.sample_time = sample_time
+        self.time_fn = time_fn
+        self.reset()
+        self.set_output_limits(output_limits)
+
+
+    def __len__(self):
+        return self.count
+
+
+    def __call__(self, input_, dt=None) -> np.ndarray:
+        """Update every controller with its input and return the outputs.
+
+        If less than sample_time has passed since the last update the last
+        outputs are returned. dt overrides the time since the last update."""
+        now = self.time_fn()
+        if dt is None:
+            dt = now - self.__last_time if now - self.__last_time else 1e-16
+        elif dt <= 0:
+            raise ValueError(f"dt has negative value {dt}, must be positive")
+        if self.sample_time is not None and dt < self.sample_time and self.last_output is not None:
+            return self.last_output
+
+        input_ = np.broadcast_to(np.asarray(input_, dtype=float), (self.count,))
+        error = self.setpoint - input_
+        d_input = np.where(np.isnan(self.__last_input), 0, input_ - self.__last_input)
+
+        self.proportional = self.gains[:, 0] * error
+        self.integral = np.clip(self.integral + self.gains[:, 1] * error * dt, self.lower, self.upper)
+        self.derivative = -self.gains[:, 2] * d_input / dt
+        output = np.clip(self.proportional + self.integral + self.derivative, self.lower, self.upper)
+
+        self.last_output = output
+        self.__last_input = input_.copy()
+        self.__last_time = now
+        return output
+
+
+    @property
+    def components(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """The P, I and D terms of every controller from the last update."""
+        return self.proportional, self.integral, self.derivative
+
+
+    def set_output_limits(self, limits, index=slice(None)):
+        """Set the (lower, upper) limits of some controllers, all by default."""
+        lower, upper = (None, None) if limits is None else limits
+        lower = np.where(np.equal(lower, None), -np.inf, lower).astype(float)
+        upper = np.where(np.equal(upper, None), np.inf, upper).astype(float)
+        if np.any(upper < lower):
+            raise ValueError("lower limit must be less than upper limit")
+        self.lower[index] = lower
+        self.upper[index] = upper
+        self.integral = np.clip(self.integral, self.lower, self.upper)
+        if self.last_output is not None:
+            self.last_output = np.clip(self.last_output, self.lower, self.upper)
+
+
+    def reset(self, index=slice(None)):
+        """Clear the terms and last input of some controllers, all by default.
+        Resetting all of them also restarts the clock."""
+        if isinstance(index, slice) and index == slice(None):
+            self.proportional = np.zeros(self.count)
+            self.integral = np.zeros(self.count)
+            self.derivative = np.zeros(self.count)
+            self.last_output = None
+            self.__last_input = np.full(self.count, np.nan)
+            self.__last_time = self.time_fn()
+            return
+        self.proportional[index] = 0
+        self.integral[index] = 0
+        self.derivative[index] = 0
+        self.__last_input[index] = np.nan
+        if self.last_output is not None:
+            self.last_output[index] = 0
+
+
+    def axis(self, index: int) -> "PIDAxis":
+        """Return a view to use one controller like a simple_pid.PID."""
+        return PIDAxis(self, index)
+
+
+    def evaluate(self, inputs: np.ndarray, dt: float) -> np.ndarray:
+        """Run every controller over a series of inputs taken every dt seconds.
+
+        inputs has one row per time step, with one value for each controller or
+        a single value shared by all. Return the outputs with the same layout."""
+        inputs = np.asarray(inputs, dtype=float)
+        outputs = np.empty((len(inputs), self.count))
+        for i, row in enumerate(inputs):
+            outputs[i] = self(row, dt)
+        return outputs
+
+
+class PIDAxis:
+    """One controller of a VectorPID with the attributes of simple_pid.PID.
+
+    Changes are made on the engine, which updates all controllers at once."""
+
+    def __init__(self, engine: VectorPID, index: int):
+        self.engine = engine
+        self.index = index
+
+
+    @property
+    def tunings(self) -> typing.Tuple[float, float, float]:
+        return tuple(float(k) for k in self.engine.gains[self.index])
+
+    @tunings.setter
+    def tunings(self, tunings):
+        self.engine.gains[self.index] = tunings
+
+
+    @property
+    def Kp(self): return float(self.engine.gains[self.index, 0])
+
+    @property
+    def Ki(self): return float(self.engine.gains[self.index, 1])
+
+    @property
+    def Kd(self): return float(self.engine.gains[self.index, 2])
+
+
+    @property
+    def setpoint(self) -> float:
+        return float(self.engine.setpoint[self.index])
+
+    @setpoint.setter
+    def setpoint(self, setpoint):
+        self.engine.setpoint[self.index] = setpoint
+
+
+    @property
+    def output_limits(self):
+        limits = (self.engine.lower[self.index], self.engine.upper[self.index])
+        return tuple(None if np.isinf(limit) else float(limit) for limit in limits)
+
+    @output_limits.setter
+    def output_limits(self, limits):
+        self.engine.set_output_limits(limits, self.index)
+
+
+    @property
+    def components(self) -> typing.Tuple[float, float, float]:
+        return tuple(float(term[self.index]) for term in self.engine.components)
+
+
+    @property
+    def last_output(self) -> typing.Optional[float]:
+        output = self.engine.last_output
+        return None if output is None else float(output[self.index])
+
+
+    def reset(self):
+        self.engine.reset(self.index)
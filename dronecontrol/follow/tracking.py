@@ -0,0 +1,200 @@
+"""
+Multi-person detection and tracking to keep following the same person
+
+People are detected with the OpenCV HOG person detector on a
+downscaled frame every few frames, associated with existing tracks
+by box overlap and one track is locked as the follow target.
+
+@author: Laura Gonzalez
+"""
+
+import typing
+import cv2
+import numpy as np
+
+from dronecontrol.common import utils
+
+
+class Track:
+    """A person followed across frames, with its box in normalized coordinates."""
+    def __init__(self, track_id: int, box: np.ndarray):
+        self.id = track_id
+        self.box = box
+        self.hits = 1
+        self.misses = 0
+
+
+class PersonDetector:
+    """Detect people in an image with the default OpenCV HOG people detector."""
+    DEFAULT_SCALE = 0.5
+
+    def __init__(self, scale=DEFAULT_SCALE, min_score=0.3):
+        """
+        scale: resize factor applied to the image before detection
+        min_score: minimum SVM score to accept a detection
+        """
+        self.scale = scale
+        self.min_score = min_score
+        self.hog = cv2.HOGDescriptor()
+        self.hog.setSVMDetector(cv2.HOGDescriptor_getDefaultPeopleDetector())
+
+
+    def detect(self, image) -> np.ndarray:
+        """Return the detected boxes as an array of normalized (x1, y1, x2, y2) rows."""
+        height, width = image.shape[:2]
+        small = cv2.resize(image, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        rects, scores = self.hog.detectMultiScale(small, winStride=(8, 8), padding=(8, 8), scale=1.05)
+        if len(rects) == 0:
+            return np.empty((0, 4))
+
+        rects = np.asarray(rects, dtype=float)[np.ravel(scores) >= self.min_score]
+        boxes = np.column_stack((rects[:, 0], rects[:, 1], rects[:, 0] + rects[:, 2], rects[:, 1] + rects[:, 3]))
+        return boxes / (np.array([width, height, width, height]) * self.scale)
+
+
+class PersonTracker:
+    """Keep track of several people across frames and lock onto one of them.
+
+    Detections are matched to tracks greedily by highest IoU.
+    The locked target is kept until it is lost for max_misses
+    detection rounds, then the track closest to the centre is chosen."""
+    IOU_THRESHOLD = 0.3
+    MAX_MISSES = 5
+    DETECT_INTERVAL = 5
+
+    def __init__(self, detector: PersonDetector=None, iou_threshold=IOU_THRESHOLD,
+                 max_misses=MAX_MISSES, detect_interval=DETECT_INTERVAL):
+        """
+        detector: person detector to use, defaults to the HOG detector
+        iou_threshold: minimum overlap to match a detection to a track
+        max_misses: detection rounds a track survives without a match
+        detect_interval: run the detector once every this many frames
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.detector = detector
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.detect_interval = detect_interval
+        self.tracks = [] # type: typing.List[Track]
+        self.target_id = None
+        self.__next_id = 0
+        self.__frame_count = 0
+
+
+    @property
+    def target(self) -> typing.Optional[Track]:
+        """The locked track or None if nobody is being followed."""
+        return next((track for track in self.tracks if track.id == self.target_id), None)
+
+
+    def process(self, image) -> typing.Optional[np.ndarray]:
+        """Detect people on the image if it is time to and return the box of the target."""
+        if self.detector is None:
+            self.detector = PersonDetector()
+        if self.__frame_count % self.detect_interval == 0:
+            self.update(self.detector.detect(image))
+        self.__frame_count += 1
+
+        target = self.target
+        return target.box if target else None
+
+
+    def update(self, boxes: np.ndarray) -> typing.List[Track]:
+        """Match new detections to the current tracks and return the updated tracks."""
+        boxes = np.asarray(boxes, dtype=float).reshape(-1, 4)
+        matched_tracks, matched_boxes = set(), set()
+
+        if self.tracks and len(boxes):
+            ious = iou(np.array([track.box for track in self.tracks]), boxes)
+            for index in np.argsort(ious, axis=None)[::-1]:
+                t, b = np.unravel_index(index, ious.shape)
+                if ious[t, b] < self.iou_threshold:
+                    break
+                if t in matched_tracks or b in matched_boxes:
+                    continue
+                matched_tracks.add(t)
+                matched_boxes.add(b)
+                self.tracks[t].box = boxes[b]
+                self.tracks[t].hits += 1
+                self.tracks[t].misses = 0
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.misses += 1
+        self.tracks = [track for track in self.tracks if track.misses <= self.max_misses]
+
+        for b, box in enumerate(boxes):
+            if b not in matched_boxes:
+                self.tracks.append(Track(self.__next_id, box))
+                self.__next_id += 1
+
+        if self.target is None:
+            self.lock()
+        return self.tracks
+
+
+    def update_target(self, box: np.ndarray):
+        """Refine the box of the target between detections, e.g. with the detected pose."""
+        target = self.target
+        if target is not None:
+            target.box = np.asarray(box, dtype=float)
+
+
+    def lock(self, track_id: int=None):
+        """Lock onto a track, by default the one closest to the centre of the image."""
+        if track_id is None and self.tracks:
+            centres = np.array([(track.box[:2] + track.box[2:]) / 2 for track in self.tracks])
+            track_id = self.tracks[int(np.argmin(np.linalg.norm(centres - 0.5, axis=1)))].id
+        if track_id != self.target_id:
+            self.target_id = track_id
+            if track_id is not None:
+                self.log.info(f"Locked onto person {track_id}")
+
+
+    def switch_target(self):
+        """Lock onto the next track in order of ID."""
+        if not self.tracks:
+            return
+        ids = sorted(track.id for track in self.tracks)
+        later = [i for i in ids if self.target_id is None or i > self.target_id]
+        self.lock(later[0] if later else ids[0])
+
+
+def iou(boxes_a: np.ndarray, boxes_b: np.ndarray) -> np.ndarray:
+    """Return the intersection over union of every pair of boxes from two arrays."""
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.prod(np.clip(bottom_right - top_left, 0, None), axis=2)
+    area_a = np.prod(boxes_a[:, 2:] - boxes_a[:, :2], axis=1)
+    area_b = np.prod(boxes_b[:, 2:] - boxes_b[:, :2], axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def crop(image, box, margin=0.1):
+    """Return the part of the image inside a normalized box, enlarged by a margin,
+    and the normalized box that was actually cropped."""
+    height, width = image.shape[:2]
+    size = box[2:] - box[:2]
+    box = np.clip(np.concatenate((box[:2] - size * margin, box[2:] + size * margin)), 0, 1)
+    x1, y1, x2, y2 = (box * [width, height, width, height]).astype(int)
+    x2, y2 = max(x2, x1 + 1), max(y2, y1 + 1)
+    return image[y1:y2, x1:x2], np.array([x1 / width, y1 / height, x2 / width, y2 / height])
+
+
+def remap_landmarks(landmarks, box):
+    """Convert landmarks detected on a crop to coordinates of the full image, in place."""
+    size = box[2:] - box[:2]
+    for landmark in landmarks.landmark:
+        landmark.x = box[0] + landmark.x * size[0]
+        landmark.y = box[1] + landmark.y * size[1]
+
+
+def draw_tracks(image, tracks: typing.List[Track], target_id=None):
+    """Draw the boxes and IDs of the tracked people who are not the target."""
+    size = np.array([image.shape[1], image.shape[0]])
+    for track in tracks:
+        if track.id == target_id:
+            continue
+        p1, p2 = (track.box[:2] * size).astype(int), (track.box[2:] * size).astype(int)
+        cv2.rectangle(image, p1, p2, utils.Color.PINK, 1)
+        cv2.putText(image, str(track.id), p1, utils.FONT, utils.FONT_SCALE, utils.Color.PINK)
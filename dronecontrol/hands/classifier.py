@@ -0,0 +1,166 @@
+"""
+Learned gesture classifier as an alternative to the rule-based detector
+
+A small neural network over the normalized hand landmarks, trained
+from labelled captures with `tools train-gestures` and saved to a
+NumPy file. All hands of a frame are classified with two matrix
+products, and new gestures only need labelled captures instead of
+new angle thresholds.
+
+@author: Laura Gonzalez
+"""
+
+import typing
+import numpy as np
+
+from dronecontrol.common import utils
+from dronecontrol.hands.gestures import Gesture, Detector
+
+
+FEATURE_COUNT = 21 * 3 + 1
+MIN_CONFIDENCE = 0.6
+HIDDEN_UNITS = 32
+EPOCHS = 300
+LEARNING_RATE = 0.01
+BATCH_SIZE = 64
+
+
+def hand_features(hands, labels) -> np.ndarray:
+    """Return an array of shape (hands, FEATURE_COUNT) from hands of shape (hands, 21, 3).
+
+    Points are taken relative to the wrist and scaled by the size of the
+    hand, so the features do not depend on where the hand is or how far
+    it is from the camera. The last feature is the handedness."""
+    hands = np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3)
+    points = hands - hands[:, :1]
+    scale = np.linalg.norm(points, axis=-1).mean(axis=-1)
+    points /= np.maximum(scale, 1e-6)[:, np.newaxis, np.newaxis]
+    handedness = np.array([1.0 if label == "Right" else -1.0 for label in labels], dtype=np.float32)
+    return np.hstack((points.reshape(len(hands), -1), handedness[:, np.newaxis]))
+
+
+class GestureClassifier(Detector):
+    """Detect hand gestures with a network of one hidden layer.
+
+    Works as a drop-in replacement of the rule-based detector.
+    Hands whose most likely gesture has a probability under
+    min_confidence are not recognised, like hands no rule matches."""
+
+    def __init__(self, weights: typing.Dict[str, np.ndarray], gestures: typing.List[Gesture],
+                 min_confidence=MIN_CONFIDENCE):
+        """
+        weights: feature mean and std and the weights w1, b1, w2, b2 of the network
+        gestures: gesture of each output of the network
+        min_confidence: probability under which a hand is not recognised
+        """
+        super().__init__()
+        self.weights = {name: np.asarray(value, dtype=np.float32) for name, value in weights.items()}
+        self.gestures = list(gestures)
+        self.min_confidence = min_confidence
+        if self.weights["w2"].shape[1] != len(self.gestures):
+            raise ValueError(f"Model has {self.weights['w2'].shape[1]} outputs for {len(self.gestures)} gestures")
+
+
+    def classify_batch(self, hands, labels) -> typing.List[typing.Optional[Gesture]]:
+        return self.predict(hands, labels)[0]
+
+
+    def predict(self, hands, labels) -> typing.Tuple[typing.List[typing.Optional[Gesture]], np.ndarray]:
+        """Return the gesture of each hand, None if not recognised, and its probability."""
+        if len(hands) == 0:
+            return [], np.empty(0, dtype=np.float32)
+        probabilities = self.probabilities(hand_features(hands, labels))
+        best = probabilities.argmax(axis=1)
+        confidence = probabilities[np.arange(len(best)), best]
+        return ([self.gestures[i] if c >= self.min_confidence else None for i, c in zip(best, confidence)],
+                confidence)
+
+
+    def probabilities(self, features: np.ndarray) -> np.ndarray:
+        """Return the probability of each gesture for every row of features."""
+        w = self.weights
+        hidden = np.maximum((features - w["mean"]) / w["std"] @ w["w1"] + w["b1"], 0)
+        return GestureClassifier.__softmax(hidden @ w["w2"] + w["b2"])
+
+
+    def save(self, filepath: str):
+        np.savez(filepath, gestures=np.array([gesture.name for gesture in self.gestures]), **self.weights)
+        self.log.info(f"Gesture model saved to {filepath}")
+
+
+    @staticmethod
+    def load(filepath: str, min_confidence=MIN_CONFIDENCE) -> "GestureClassifier":
+        """Load a model saved with save, raises ValueError if it has unknown gestures."""
+        with np.load(filepath) as data:
+            names = [str(name) for name in data["gestures"]]
+            weights = {name: data[name] for name in data.files if name != "gestures"}
+        unknown = [name for name in names if name not in Gesture.__members__]
+        if unknown:
+            raise ValueError(f"Model {filepath} has unknown gestures {', '.join(unknown)}")
+        return GestureClassifier(weights, [Gesture[name] for name in names], min_confidence)
+
+
+    @staticmethod
+    def train(hands, labels, gestures: typing.List[Gesture], hidden_units=HIDDEN_UNITS, epochs=EPOCHS,
+              learning_rate=LEARNING_RATE, batch_size=BATCH_SIZE, seed=0) -> "GestureClassifier":
+        """Fit a new model to hands of shape (hands, 21, 3), with their handedness
+        labels and expected gestures, using Adam on the cross entropy."""
+        log = utils.make_stdout_logger(__name__)
+        features = hand_features(hands, labels)
+        classes = list(dict.fromkeys(sorted(gestures, key=lambda gesture: gesture.value)))
+        targets = np.array([classes.index(gesture) for gesture in gestures])
+        if len(classes) < 2:
+            raise ValueError("Training needs samples of at least two gestures")
+
+        rng = np.random.default_rng(seed)
+        mean, std = features.mean(axis=0), features.std(axis=0) + 1e-6
+        inputs = (features - mean) / std
+        params = {
+            "w1": rng.normal(0, np.sqrt(2 / FEATURE_COUNT), (FEATURE_COUNT, hidden_units)).astype(np.float32),
+            "b1": np.zeros(hidden_units, dtype=np.float32),
+            "w2": rng.normal(0, np.sqrt(1 / hidden_units), (hidden_units, len(classes))).astype(np.float32),
+            "b2": np.zeros(len(classes), dtype=np.float32),
+        }
+        moments = {name: (np.zeros_like(value), np.zeros_like(value)) for name, value in params.items()}
+        one_hot = np.eye(len(classes), dtype=np.float32)[targets]
+
+        step = 0
+        for epoch in range(epochs):
+            order = rng.permutation(len(inputs))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                step += 1
+                grads = GestureClassifier.__gradients(params, inputs[batch], one_hot[batch])
+                for name, grad in grads.items():
+                    m, v = moments[name]
+                    m[:] = 0.9 * m + 0.1 * grad
+                    v[:] = 0.999 * v + 0.001 * grad ** 2
+                    params[name] -= learning_rate * (m / (1 - 0.9 ** step)) / (np.sqrt(v / (1 - 0.999 ** step)) + 1e-8)
+            if (epoch + 1) % max(epochs // 5, 1) == 0:
+                log.debug(f"Epoch {epoch + 1}: loss {GestureClassifier.__loss(params, inputs, one_hot):.4f}")
+
+        log.info(f"Trained on {len(inputs)} hands of {len(classes)} gestures, " +
+                 f"loss {GestureClassifier.__loss(params, inputs, one_hot):.4f}")
+        return GestureClassifier(dict(mean=mean, std=std, **params), classes)
+
+
+    @staticmethod
+    def __gradients(params, inputs, one_hot):
+        hidden = np.maximum(inputs @ params["w1"] + params["b1"], 0)
+        error = (GestureClassifier.__softmax(hidden @ params["w2"] + params["b2"]) - one_hot) / len(inputs)
+        hidden_error = (error @ params["w2"].T) * (hidden > 0)
+        return {"w1": inputs.T @ hidden_error, "b1": hidden_error.sum(axis=0),
+                "w2": hidden.T @ error, "b2": error.sum(axis=0)}
+
+
+    @staticmethod
+    def __loss(params, inputs, one_hot):
+        hidden = np.maximum(inputs @ params["w1"] + params["b1"], 0)
+        probabilities = GestureClassifier.__softmax(hidden @ params["w2"] + params["b2"])
+        return -np.mean(np.log(np.sum(probabilities * one_hot, axis=1) + 1e-12))
+
+
+    @staticmethod
+    def __softmax(logits):
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
@@ -0,0 +1,139 @@
+"""
+Continuous hand control with velocities proportional to the hand position
+
+While an open hand is shown its position relative to where it was
+opened sets the velocity: sideways displacement moves right and left,
+vertical displacement climbs and descends, moving the hand closer to
+or further from the camera moves forward and backward and tilting it
+turns. Setpoints are smoothed and sent at a fixed rate.
+
+@author: Laura Gonzalez
+"""
+
+import asyncio
+import typing
+import numpy as np
+import mediapipe.python.solutions.hands as mediapipe
+
+from dronecontrol.common import utils
+from dronecontrol.hands.gestures import Gesture
+
+
+PALM_POINTS = [mediapipe.HandLandmark.WRIST, mediapipe.HandLandmark.INDEX_FINGER_MCP,
+               mediapipe.HandLandmark.MIDDLE_FINGER_MCP, mediapipe.HandLandmark.RING_FINGER_MCP,
+               mediapipe.HandLandmark.PINKY_MCP]
+
+
+class Velocity(typing.NamedTuple):
+    forward: float = 0.0
+    right: float = 0.0
+    up: float = 0.0
+    yaw: float = 0.0
+
+
+class ProportionalControl:
+    """Convert the pose of an open hand into a velocity.
+
+    The neutral position is taken when the hand opens, so closing the
+    hand or taking it out of view works as a clutch. Displacements
+    smaller than the deadzone are ignored and the velocity reaches its
+    maximum at the full scale displacement."""
+    ENGAGE_GESTURE = Gesture.STOP
+    DEADZONE = 0.1        # Fraction of the full scale
+    FULL_SCALE = Velocity(forward=0.5, right=0.25, up=0.25, yaw=45)
+    MAX_VELOCITY = Velocity(forward=1.0, right=1.0, up=0.5, yaw=30)
+
+    def __init__(self, max_velocity=MAX_VELOCITY, full_scale=FULL_SCALE, deadzone=DEADZONE):
+        """
+        max_velocity: velocity at full scale in m/s and deg/s
+        full_scale: displacement for maximum velocity, relative hand size change for
+                    forward, fraction of the image for right and up, degrees for yaw
+        deadzone: fraction of the full scale ignored around the neutral position
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.max_velocity = np.array(max_velocity, dtype=float)
+        self.full_scale = np.array(full_scale, dtype=float)
+        self.deadzone = deadzone
+        self.neutral = None
+
+
+    def update(self, hand: typing.Optional[np.ndarray], gesture: Gesture) -> Velocity:
+        """Return the velocity for a hand given as an array of 21 (x, y, z) points.
+
+        The velocity is zero unless the hand shows the engage gesture."""
+        if hand is None or gesture != self.ENGAGE_GESTURE:
+            if self.neutral is not None:
+                self.log.info("Continuous control released")
+            self.neutral = None
+            return Velocity()
+
+        pose = ProportionalControl.get_hand_pose(hand)
+        if self.neutral is None:
+            self.neutral = pose
+            self.log.info("Continuous control engaged")
+            return Velocity()
+
+        displacement = (pose - self.neutral) / self.full_scale
+        magnitude = np.clip((np.abs(displacement) - self.deadzone) / (1 - self.deadzone), 0, 1)
+        return Velocity(*(np.sign(displacement) * magnitude * self.max_velocity))
+
+
+    @staticmethod
+    def get_hand_pose(hand: np.ndarray) -> np.ndarray:
+        """Return the hand pose as the values that map to forward, right, up and yaw:
+        relative hand size, horizontal and vertical position and tilt angle."""
+        palm = hand[PALM_POINTS, :2]
+        centre = palm.mean(axis=0)
+        axis = hand[mediapipe.HandLandmark.MIDDLE_FINGER_MCP, :2] - hand[mediapipe.HandLandmark.WRIST, :2]
+        size = np.linalg.norm(axis)
+        tilt = np.rad2deg(np.arctan2(axis[0], -axis[1]))
+        return np.array([np.log(size), centre[0], -centre[1], tilt])
+
+
+class SetpointStream:
+    """Send the latest velocity setpoint to the pilot at a fixed rate.
+
+    The target velocity is smoothed with an exponential filter with
+    the given time constant. Nothing is sent while the pilot is
+    running queued actions or is not in offboard mode, as tracked by
+    its supervisor so that each setpoint is a single command."""
+    RATE = 20
+    TIME_CONSTANT = 0.2
+
+    def __init__(self, pilot, rate=RATE, time_constant=TIME_CONSTANT):
+        """
+        pilot: system to send the velocity to
+        rate: setpoints sent per second
+        time_constant: seconds for the setpoint to cover 63% of a step in the target
+        """
+        self.pilot = pilot
+        self.period = 1 / rate
+        self.alpha = 1 - np.exp(-self.period / time_constant) if time_constant > 0 else 1
+        self.target = np.zeros(4)
+        self.setpoint = np.zeros(4)
+        self.sent = 0
+
+
+    def set_target(self, velocity: Velocity):
+        """Set the velocity the stream moves towards. A zero target
+        stops at once instead of slowing down, for safety."""
+        self.target = np.array(velocity, dtype=float)
+        if not self.target.any():
+            self.setpoint[:] = 0
+
+
+    async def run(self):
+        """Send setpoints until cancelled."""
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        try:
+            while True:
+                self.setpoint += self.alpha * (self.target - self.setpoint)
+                if not self.pilot.actions and not self.pilot.current_action_name and self.pilot.offboard_on:
+                    await self.pilot.send_velocity(*self.setpoint)
+                    self.sent += 1
+
+                next_time = max(next_time + self.period, loop.time())
+                await asyncio.sleep(next_time - loop.time())
+        except asyncio.CancelledError:
+            pass
@@ -1,4 +1,7 @@
+import time
+import typing
 from enum import Enum, IntEnum
+from collections import deque, Counter
 import numpy as np
 import mediapipe.python.solutions.hands as mediapipe
 
@@ -50,6 +53,41 @@ POINT_RIGHT_THRESHOLD = 60
 POINT_LEFT_THRESHOLD = 120
 
 
+class GestureRule(typing.NamedTuple):
+    """Debouncing settings for one gesture.
+
+    hold_frames: consecutive frames the gesture must win the vote
+    hold_time: seconds the gesture must win the vote
+    cooldown: seconds before the same gesture can be accepted again"""
+    hold_frames: int = 3
+    hold_time: float = 0.0
+    cooldown: float = 0.0
+
+
+HAND_LABELS = ("Left", "Right")
+
+# Gestures that trigger toggles or long manoeuvres need to be held longer
+DEFAULT_RULES = {
+    Gesture.FIST: GestureRule(hold_frames=5, cooldown=2.0),
+    Gesture.BACKHAND: GestureRule(hold_frames=5, hold_time=0.3),
+}
+
+
+def landmarks_to_array(hands_landmarks) -> np.ndarray:
+    """Convert the hand landmarks given by MediaPipe
+    to an array of shape (hands, 21, 3)."""
+    if not hands_landmarks:
+        return np.empty((0, 21, 3))
+    return np.array([[(p.x, p.y, p.z) for p in hand.landmark] for hand in hands_landmarks])
+
+
+def get_labels(hand_label) -> list:
+    """Return the handedness label of each hand detected by MediaPipe."""
+    if not hand_label:
+        return []
+    return [hand.classification[0].label for hand in hand_label]
+
+
 class Detector():
     """Detect hand gestures from joint landmarks."""
 
@@ -59,61 +97,80 @@ class Detector():
 
     def get_gesture(self, hands_landmarks, hand_label) -> Gesture:
         """Identify the gesture given by the hand landmarks."""
-        self.hands = hands_landmarks
-        if self.hands is None:
+        if hands_landmarks is None:
             return Gesture.NO_HAND
-        else:
-            self.__process_hand()
+        return self.classify(landmarks_to_array(hands_landmarks)[0], get_labels(hand_label)[0])
 
-        self.label = hand_label[0].classification[0].label
-        is_finger_up = self.__get_finger_up_state()
-        if not any(is_finger_up[Finger.INDEX:]):
-            return Gesture.FIST
-        if is_finger_up[Finger.INDEX] and not any(is_finger_up[Finger.MIDDLE:]):
-            return self.__get_thumb_index_combination()
-        if sum(is_finger_up) == 5:
-            if self.__is_backhand():
-                return Gesture.BACKHAND
-            return Gesture.STOP
 
+    def get_gestures(self, hands_landmarks, hand_label) -> typing.Dict[str, Gesture]:
+        """Identify the gesture of every detected hand, by handedness label.
 
-    def __process_hand(self):
-        """Process landmark array to numpy vector matrices"""
-        data = [np.array([p.x, p.y, p.z]) for p in self.hands[0].landmark]
-        self.wrist = data[mediapipe.HandLandmark.WRIST]
-        self.fingers = np.array(data[1:]).reshape(5, 4, 3)
+        Hands that are not in view are missing from the result,
+        if both hands get the same label the first one is kept."""
+        if hands_landmarks is None:
+            return {}
+        labels = get_labels(hand_label)
+        gestures = self.classify_batch(landmarks_to_array(hands_landmarks), labels)
+        result = {}
+        for label, gesture in zip(labels, gestures):
+            result.setdefault(label, gesture)
+        return result
 
 
-    def __get_finger_up_state(self):
-        """Return a list with the status of each finger
-        of whether it is extended or not.
+    def classify(self, hand, label) -> Gesture:
+        """Identify the gesture of a single hand.
         
-        Checks that the angle between a vector drawn from 
-        the wrist to the first point and one from 
-        the first point to the tip is small enough."""
-        is_open = []
-        for finger in self.fingers:
-            base = finger[Joint.FIRST] - self.wrist
-            tip = finger[Joint.TIP] - finger[Joint.FIRST]
-            angle = Detector.__angle(base, tip)
-            is_open.append(angle < EXTENDED_FINGER_THRESHOLD)
-        return is_open
+        Takes the hand as an array of 21 (x, y, z) points
+        and the handedness label, 'Right' or 'Left'."""
+        return self.classify_batch(hand[np.newaxis], [label])[0]
+
+
+    def classify_batch(self, hands, labels) -> typing.List[Gesture]:
+        """Identify the gestures of several hands at once.
+
+        Takes an array of shape (hands, 21, 3) and the handedness
+        label of each hand. The angles of all fingers of all hands
+        are computed together, only the final decision is per hand."""
+        hands = np.asarray(hands, dtype=float)
+        wrists = hands[:, mediapipe.HandLandmark.WRIST]
+        fingers = hands[:, 1:].reshape(-1, 5, 4, 3)
+        vectors = fingers[:, :, Joint.TIP] - fingers[:, :, Joint.FIRST]
+        bases = fingers[:, :, Joint.FIRST] - wrists[:, np.newaxis]
+
+        is_finger_up = Detector.__angle(bases, vectors) < EXTENDED_FINGER_THRESHOLD
+        right_angles = Detector.__angle(vectors, VECTOR_RIGHT)
+        thumb_up_angles = Detector.__angle(vectors[:, Finger.THUMB], VECTOR_UP)
+
+        return [self.__get_hand_gesture(*hand) for hand in
+                zip(is_finger_up, right_angles, thumb_up_angles, labels)]
+
+
+    def __get_hand_gesture(self, is_finger_up, right_angles, thumb_up_angle, label):
+        """Decide the gesture of one hand from the state of its fingers.
+
+        right_angles: angle of each finger with the horizontal
+        thumb_up_angle: angle of the thumb with the vertical"""
+        if not any(is_finger_up[Finger.INDEX:]):
+            return Gesture.FIST
+        if is_finger_up[Finger.INDEX] and not any(is_finger_up[Finger.MIDDLE:]):
+            return self.__get_thumb_index_combination(right_angles, label)
+        if all(is_finger_up):
+            if Detector.__is_backhand(right_angles, thumb_up_angle):
+                return Gesture.BACKHAND
+            return Gesture.STOP
 
     
-    def __get_thumb_index_combination(self):
-        point_gesture = self.__get_point_gesture()
+    def __get_thumb_index_combination(self, right_angles, label):
+        point_gesture = self.__get_point_gesture(right_angles[Finger.INDEX])
         if point_gesture == Gesture.POINT_UP:
-            thumb_gesture = self.__get_thumb_gesture()
+            thumb_gesture = Detector.__get_thumb_gesture(right_angles[Finger.THUMB], label)
             if thumb_gesture:
                 return thumb_gesture
         
         return point_gesture
 
 
-    def __get_point_gesture(self):
-        index_vector = self.__get_finger_vector(Finger.INDEX)
-        angle = Detector.__angle(index_vector, VECTOR_RIGHT)
-
+    def __get_point_gesture(self, angle):
         if angle > ZERO_ANGLE and angle < POINT_RIGHT_THRESHOLD:
             return Gesture.POINT_RIGHT
         elif angle > POINT_RIGHT_THRESHOLD and angle < POINT_LEFT_THRESHOLD:
@@ -124,35 +181,110 @@ class Detector():
             self.log.error("Could not detect point gesture")
 
 
-    def __get_thumb_gesture(self):
-        thumb_vector = self.__get_finger_vector(Finger.THUMB)
-        angle = Detector.__angle(thumb_vector, VECTOR_RIGHT)
-        
-        if angle > ZERO_ANGLE and angle < THUMB_THRESHOLDS[self.label][0]:
+    @staticmethod
+    def __get_thumb_gesture(angle, label):
+        if angle > ZERO_ANGLE and angle < THUMB_THRESHOLDS[label][0]:
             return Gesture.THUMB_RIGHT
-        elif angle > THUMB_THRESHOLDS[self.label][1] and angle < STRAIGHT_ANGLE:
+        elif angle > THUMB_THRESHOLDS[label][1] and angle < STRAIGHT_ANGLE:
             return Gesture.THUMB_LEFT
 
 
-    def __is_backhand(self):
-        vectors = [self.__get_finger_vector(f) for f in Finger]
-        thumb = Detector.__angle(vectors.pop(0), VECTOR_UP)
-        others = [Detector.__angle(v, VECTOR_RIGHT) for v in vectors]
-        return (thumb < BACKHAND_THRESHOLD and 
-            all((x < BACKHAND_THRESHOLD or 
-                STRAIGHT_ANGLE - x < BACKHAND_THRESHOLD 
-                for x in others)))
-
-    
-    def __get_finger_vector(self, finger_name: Finger):
-        finger = self.fingers[finger_name]
-        return finger[Joint.TIP] - finger[Joint.FIRST]
+    @staticmethod
+    def __is_backhand(right_angles, thumb_up_angle):
+        others = right_angles[Finger.INDEX:]
+        return (thumb_up_angle < BACKHAND_THRESHOLD and 
+            all((others < BACKHAND_THRESHOLD) | (STRAIGHT_ANGLE - others < BACKHAND_THRESHOLD)))
 
 
     @staticmethod
     def __angle(v1, v2):
-        """Calculate angle between two vectors."""
-        unit_v1 = v1 / np.linalg.norm(v1)
-        unit_v2 = v2 / np.linalg.norm(v2)
-        rad = np.arccos(np.dot(unit_v1, unit_v2))
+        """Calculate angle in degrees between vectors along the last axis."""
+        unit_v1 = v1 / np.linalg.norm(v1, axis=-1, keepdims=True)
+        unit_v2 = v2 / np.linalg.norm(v2, axis=-1, keepdims=True)
+        rad = np.arccos(np.clip(np.sum(unit_v1 * unit_v2, axis=-1), -1, 1))
         return np.rad2deg(rad)
+
+
+class GestureFilter:
+    """Debounce the gestures detected on every frame.
+
+    Each frame votes for its gesture in a sliding window and the
+    winner must have a share of at least min_votes. A new gesture
+    is only accepted after winning for the hold frames and time of its
+    rule, and not during the cooldown since it was last accepted."""
+    WINDOW = 5
+    MIN_VOTES = 0.6
+
+    def __init__(self, window=WINDOW, min_votes=MIN_VOTES, hold_frames=None, hold_time=None,
+                 rules: typing.Dict[Gesture, GestureRule]=None):
+        """
+        window: number of frames that vote
+        min_votes: fraction of the window the winner needs
+        hold_frames: override the hold frames of every rule
+        hold_time: override the hold time of every rule
+        rules: settings for each gesture, the default rule is used for the rest
+        """
+        self.min_votes = min_votes
+        self.rules = dict(DEFAULT_RULES if rules is None else rules)
+        self.default_rule = GestureRule()
+        if hold_frames is not None or hold_time is not None:
+            overrides = {k: v for k, v in (("hold_frames", hold_frames), ("hold_time", hold_time)) if v is not None}
+            self.default_rule = self.default_rule._replace(**overrides)
+            self.rules = {gesture: rule._replace(**overrides) for gesture, rule in self.rules.items()}
+
+        self.current = None
+        self.raw_changes = 0
+        self.events = 0
+        self.__votes = deque(maxlen=window)
+        self.__last_raw = None
+        self.__winner = None
+        self.__winner_frames = 0
+        self.__winner_start = 0
+        self.__accepted_at = {}
+
+
+    def update(self, gesture: typing.Optional[Gesture], timestamp: float=None) -> typing.Optional[Gesture]:
+        """Add the gesture detected on a new frame, None if unrecognised.
+
+        Return the gesture if it has just been accepted or None."""
+        timestamp = time.perf_counter() if timestamp is None else timestamp
+        if gesture != self.__last_raw:
+            self.raw_changes += 1
+            self.__last_raw = gesture
+        self.__votes.append(gesture)
+
+        winner = self.__get_winner()
+        if winner != self.__winner:
+            self.__winner = winner
+            self.__winner_frames = 0
+            self.__winner_start = timestamp
+        self.__winner_frames += 1
+
+        if winner is None or winner == self.current:
+            return None
+        rule = self.rules.get(winner, self.default_rule)
+        if self.__winner_frames < rule.hold_frames or timestamp - self.__winner_start < rule.hold_time:
+            return None
+        if timestamp - self.__accepted_at.get(winner, -np.inf) < rule.cooldown:
+            return None
+
+        self.current = winner
+        self.__accepted_at[winner] = timestamp
+        self.events += 1
+        return winner
+
+
+    def reset(self):
+        """Forget the votes and the accepted gesture."""
+        self.__votes.clear()
+        self.__winner = None
+        self.__winner_frames = 0
+        self.current = None
+
+
+    def __get_winner(self) -> typing.Optional[Gesture]:
+        """Return the most voted gesture if it has enough votes."""
+        gesture, votes = Counter(self.__votes).most_common(1)[0]
+        if gesture is None or votes < self.min_votes * self.__votes.maxlen:
+            return None
+        return gesture
@@ -1,13 +1,17 @@
 import time
+import copy
 import typing
 import cv2
 import os
+import numpy
 from datetime import datetime
 import mediapipe.python.solutions.hands as mp_hands
 import mediapipe.python.solutions.drawing_utils as mp_drawing
 import mediapipe.python.solutions.hands_connections as mp_connections
 
-from dronecontrol.common import utils
+from dronecontrol.common import utils, metrics
+from dronecontrol.common.governor import InferenceGovernor
+from dronecontrol.common.landmark_cache import LandmarkCache, process_hands, array_to_hands, hands_to_array
 from dronecontrol.hands import gestures
 from dronecontrol.common.video_source import *
 
@@ -22,39 +26,84 @@ class HandGui():
     HEIGHT = 480
     
 
-    def __init__(self, file=None, max_num_hands=1, source=None):
+    def __init__(self, file=None, max_num_hands=1, source=None, cache_dir=None,
+                 gesture_filter: gestures.GestureFilter=None, governor: InferenceGovernor=None,
+                 detector: gestures.Detector=None):
 
         self.log = utils.make_stdout_logger(__name__)
         self.__gesture_event_handler = []
+        self.__hands_event_handler = []
         self.__current_time = 0
         self.__past_time = 0
         self.__last_gesture = None
 
         self.fps = 0
         self.hand_landmarks = None
+        self.handedness = None
+        self.max_num_hands = max_num_hands
+        self.hand_gestures = {} # Accepted gesture of each hand by label when tracking several hands
         self.hand_model = mp_hands.Hands(max_num_hands=max_num_hands)
-        self.detector = gestures.Detector()
+        self.detector = detector if detector else gestures.Detector() # A GestureClassifier uses a trained model
+        self.gesture_filter = gesture_filter if gesture_filter else gestures.GestureFilter()
+        self.hand_filters = {label: copy.deepcopy(self.gesture_filter) for label in gestures.HAND_LABELS}
+        self.cache = LandmarkCache(cache_dir, f"hands:{max_num_hands}") if cache_dir else None
+        self.governor = governor # Optional, reuses the last landmarks while the image does not change
+        self.__last_results = None
+
+        registry = metrics.get_registry()
+        self.__frame_counter = registry.counter("frames_total", "Frames read from the video source", app="hands")
+        self.__fps_gauge = registry.gauge("fps", "Frames shown per second", app="hands")
 
         self.__source = source if source else HandGui.__get_source(file)
         self.img = self.__source.get_blank()
+        self.__rgb_img = None
 
 
     def close(self):
         """Close the current video source"""
+        filters = list(self.hand_filters.values()) if self.max_num_hands > 1 else [self.gesture_filter]
+        self.log.info(f"{sum(f.events for f in filters)} gesture events from " +
+                      f"{sum(f.raw_changes for f in filters)} detected gesture changes")
+        if self.governor:
+            self.governor.log_stats()
         cv2.waitKey(1)
         self.__source.close()
 
 
     def capture(self):
         """Capture image from webcam and extract hand gesture."""
+        self.update(self.read())
+
+
+    def read(self) -> typing.NamedTuple:
+        """Capture image from webcam and return its hand landmarks.
+        
+        Only blocking work is done here so it can run outside the event loop.
+        With a governor the last landmarks are returned while the image does not change."""
+        self.__source.release(self.img)
         self.img = self.__source.get_frame()
+        if self.governor and not self.governor.should_infer(self.img):
+            return self.__last_results
+        self.__last_results = self.get_landmarks()
+        return self.__last_results
+
 
-        results = self.get_landmarks()
+    def update(self, results: typing.NamedTuple):
+        """Extract hand gesture from the landmarks of the last captured image
+        and notify subscribers when the filter accepts a new one.
+        
+        When tracking several hands each hand is filtered on its own."""
+        self.__frame_counter.inc()
         self.hand_landmarks = results.multi_hand_landmarks
         self.hand_landmarks_world = results.multi_hand_world_landmarks
+        self.handedness = results.multi_handedness
+
+        if self.max_num_hands > 1:
+            self.__update_hands()
+            return
 
-        gesture = self.detector.get_gesture(self.hand_landmarks, results.multi_handedness)
-        if gesture is not None and gesture != self.__last_gesture:
+        gesture = self.gesture_filter.update(self.detector.get_gesture(self.hand_landmarks, self.handedness))
+        if gesture is not None:
             self.__last_gesture = gesture
             self.__invoke_gesture(gesture)
 
@@ -62,17 +111,24 @@ class HandGui():
     def render(self, show_fps=True, show_hands=True) -> int:
         """Show captured image in a new window.
         
-        Returns a keycode if a key was pressed during rendering
-        or -1 if not. 
+        Returns a keycode if a key was pressed since the last render
+        or -1 if not, without waiting for input.
         """
         self.fps = self.__calculate_fps()
+        self.__fps_gauge.set(self.fps)
 
         if show_hands:
             self.draw_hands()
         if show_fps:
             utils.write_text_to_image(self.img, f"FPS: {self.fps}", utils.ImageLocation.TOP_LEFT)
         cv2.imshow("Dronecontrol: hand-gesture control", self.img)
-        return cv2.waitKey(self.__source.get_delay())
+        return cv2.pollKey()
+
+
+    def subscribe_to_hands(self, func: typing.Callable[[typing.Dict[str, gestures.Gesture]], None]):
+        """Subscribe function to the event of a new gesture on any hand,
+        called with the gesture of every hand by handedness label."""
+        self.__hands_event_handler.append(func)
 
 
     def subscribe_to_gesture(self, func: typing.Callable[[gestures.Gesture], None]):
@@ -89,13 +145,18 @@ class HandGui():
         """Return landmark solution from image.
         
         Reads the image from a file if given or from the
-        last captured image if not."""
+        last captured image if not.
+        Results are reused from the landmark cache when enabled."""
         if filepath:
+            if self.cache:
+                return self.__get_file_landmarks(filepath)
             img = cv2.imread(filepath)
         else:
             img = self.img
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        return self.hand_model.process(rgb_img)
+        if self.__rgb_img is None or self.__rgb_img.shape != img.shape:
+            self.__rgb_img = numpy.empty_like(img)
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self.__rgb_img)
+        return process_hands(self.hand_model, self.__rgb_img, self.cache)
 
 
     def draw_hands(self, img=None):
@@ -116,9 +177,41 @@ class HandGui():
         return self.__last_gesture
 
 
+    def __get_file_landmarks(self, filepath):
+        """Return landmarks for an image file from the cache,
+        keyed by file contents so the image is only decoded on a miss."""
+        key = self.cache.get_file_key(filepath)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return array_to_hands(cached)
+
+        rgb_img = cv2.cvtColor(cv2.imread(filepath), cv2.COLOR_BGR2RGB)
+        results = self.hand_model.process(rgb_img)
+        self.cache.put(key, hands_to_array(results))
+        return results
+
+
+    def __update_hands(self):
+        """Filter the gesture of each hand and notify if any of them changed."""
+        detected = self.detector.get_gestures(self.hand_landmarks, self.handedness)
+        changed = False
+        for label, gesture_filter in self.hand_filters.items():
+            gesture = gesture_filter.update(detected.get(label, gestures.Gesture.NO_HAND))
+            if gesture is not None:
+                self.hand_gestures[label] = gesture
+                HandGui.__count_gesture(gesture, label)
+                changed = True
+
+        if changed:
+            self.log.info("New gestures: %s", ", ".join(f"{label} {gesture.name}" for label, gesture in self.hand_gestures.items()))
+            for func in self.__hands_event_handler:
+                func(dict(self.hand_gestures))
+
+
     def __invoke_gesture(self, gesture):
         """Trigger all functions subscribed to new gesture"""
         self.log.info("New gesture: %s", gesture)
+        HandGui.__count_gesture(gesture)
         for func in self.__gesture_event_handler:
             func(gesture)
 
@@ -131,6 +224,12 @@ class HandGui():
         return int(fps)
     
 
+    @staticmethod
+    def __count_gesture(gesture, hand=""):
+        metrics.get_registry().counter("gesture_events_total", "Gestures accepted by the filter",
+                                       gesture=gesture.name, hand=hand).inc()
+
+
     @staticmethod
     def __get_source(file):
         if file:
@@ -2,8 +2,36 @@ import asyncio
 import traceback
 
 from dronecontrol.common import utils, pilot, input
+from dronecontrol.common.pilot import System
+from dronecontrol.common.executor import VisionExecutor, ExecutorMode
+from dronecontrol.common.monitor import LoopMonitor
+from dronecontrol.common.metrics import MetricsExporter
+from dronecontrol.common.governor import InferenceGovernor
 from dronecontrol.hands import graphics
-from .gestures import Gesture
+from dronecontrol.hands.classifier import GestureClassifier
+from dronecontrol.hands.continuous import ProportionalControl, SetpointStream
+from .gestures import Gesture, GestureFilter, HAND_LABELS, landmarks_to_array
+
+
+MOVE_SPEED = 1.0  # m/s
+CLIMB_SPEED = 0.5 # m/s
+YAW_SPEED = 15.0  # deg/s
+
+# Velocity given by each gesture in two-handed mode
+YAW_HAND_VELOCITY = {
+    Gesture.POINT_RIGHT: dict(yaw=YAW_SPEED),
+    Gesture.POINT_LEFT: dict(yaw=-YAW_SPEED),
+    Gesture.POINT_UP: dict(up=CLIMB_SPEED),
+    Gesture.FIST: dict(up=-CLIMB_SPEED),
+}
+# Gestures still acted on in continuous mode, the rest are used for velocity
+CONTINUOUS_MODE_GESTURES = (Gesture.FIST, Gesture.BACKHAND, Gesture.POINT_UP)
+MOVE_HAND_VELOCITY = {
+    Gesture.POINT_RIGHT: dict(right=MOVE_SPEED),
+    Gesture.POINT_LEFT: dict(right=-MOVE_SPEED),
+    Gesture.THUMB_RIGHT: dict(forward=MOVE_SPEED),
+    Gesture.THUMB_LEFT: dict(forward=-MOVE_SPEED),
+}
 
 
 def map_gesture_to_action(pilot, gesture):
@@ -26,7 +54,34 @@ def map_gesture_to_action(pilot, gesture):
         return pilot.queue_action(System.set_velocity, forward=1.0)
     if gesture == Gesture.THUMB_LEFT:
         return pilot.queue_action(System.set_velocity, forward=-1.0)
+
+
+
+def map_hands_to_action(pilot, hand_gestures, yaw_hand=HAND_LABELS[0]):
+    """Map the gestures of both hands to a drone action.
     
+    One hand controls yaw and altitude and the other forward and
+    sideways movement, combined in a single velocity command.
+    Without hands the drone holds, a backhand returns home and
+    with the yaw hand resting the move hand can toggle take-off
+    and landing with a fist or start offboard pointing up."""
+    move_hand = next(label for label in HAND_LABELS if label != yaw_hand)
+    yaw_gesture = hand_gestures.get(yaw_hand, Gesture.NO_HAND)
+    move_gesture = hand_gestures.get(move_hand, Gesture.NO_HAND)
+
+    if yaw_gesture == Gesture.NO_HAND and move_gesture == Gesture.NO_HAND:
+        return pilot.queue_action(System.hold, interrupt=True)
+    if Gesture.BACKHAND in (yaw_gesture, move_gesture):
+        return pilot.queue_action(System.return_home)
+    if yaw_gesture in (Gesture.NO_HAND, Gesture.STOP):
+        if move_gesture == Gesture.FIST and pilot.current_action_name != System.toggle_takeoff_land.__name__:
+            return pilot.queue_action(System.toggle_takeoff_land, interrupt=True)
+        if move_gesture == Gesture.POINT_UP:
+            return pilot.queue_action(System.start_offboard)
+
+    velocity = {**YAW_HAND_VELOCITY.get(yaw_gesture, {}), **MOVE_HAND_VELOCITY.get(move_gesture, {})}
+    return pilot.queue_action(System.set_velocity, interrupt=True, **velocity)
+
 
 async def run_gui(gui: graphics.HandGui):
     """Run loop for the interface to capture
@@ -34,11 +89,14 @@ async def run_gui(gui: graphics.HandGui):
     
     Return whether the loop should continue."""
     try:
-        gui.capture()
+        gui.update(await executor.run(gui.read))
+        if stream:
+            hands = landmarks_to_array(gui.hand_landmarks)
+            stream.set_target(control.update(hands[0] if len(hands) else None, gui.get_current_gesture()))
         key = gui.render()
-        key_action = input_handler.handle(key)
-        if key_action:
-            pilot.queue_action(key_action, interrupt=True)  
+        if key < 0:
+            key = input_handler.poll()
+        await input_handler.handle(key)
     except Exception as e:
         log.error(e)
         traceback.print_exc()
@@ -67,7 +125,16 @@ async def run():
             return
 
     pilot_task = asyncio.create_task(pilot.start_queue())
-    gui.subscribe_to_gesture(lambda g: map_gesture_to_action(pilot, g))
+    supervisor_task = asyncio.create_task(pilot.supervise())
+    stream_task = asyncio.create_task(stream.run()) if stream else None
+    if stream:
+        gui.subscribe_to_gesture(lambda g: map_gesture_to_action(pilot, g) if g in CONTINUOUS_MODE_GESTURES else None)
+    elif yaw_hand:
+        gui.subscribe_to_hands(lambda g: map_hands_to_action(pilot, g, yaw_hand))
+    else:
+        gui.subscribe_to_gesture(lambda g: map_gesture_to_action(pilot, g))
+    if loop_monitor:
+        loop_monitor.start(LoopMonitor.SLOW_CALLBACK_TIME)
 
     while True:
         if not await run_gui(gui):
@@ -76,15 +143,27 @@ async def run():
             break
 
     log.warning("System stop")
-    await cancel_pending(pilot_task)
+    if loop_monitor:
+        await loop_monitor.stop()
+    await cancel_pending(*filter(None, (stream_task, supervisor_task, pilot_task)))
 
 
 def close_handlers():
+    input_handler.close()
+    executor.close()
     gui.close()
     pilot.close()
+    if loop_monitor:
+        loop_monitor.export(monitor_file)
+        loop_monitor.log_stats()
+    if exporter:
+        exporter.close()
 
 
-def main(ip=None, port=None, serial=None, video_file=None):
+def main(ip=None, port=None, serial=None, video_file=None, read_terminal=False,
+         executor_mode=ExecutorMode.THREAD, monitor=None, hold_frames=None, hold_time=None,
+         two_hands=None, continuous=False, ready_checks=System.READY_CHECKS, metrics_port=None, metrics_file=None,
+         adaptive_inference=False, gesture_model=None):
     """
     Hand-gesture control solution.
 
@@ -92,13 +171,39 @@ def main(ip=None, port=None, serial=None, video_file=None):
     port: port to connect to a pilot system through UDP, defaults to 14540
     serial: address to connect to a pilot system through serial
     video_file: file to use as a source for the computer vision algorithm
+    read_terminal: accept keyboard commands typed in the terminal as well as in the image window
+    executor_mode: where to run the blocking vision calls, a worker thread by default
+    monitor: record event loop and action timings and save them to this JSON file on close
+    hold_frames: frames a gesture must be detected before it is acted on, overrides the per-gesture defaults
+    hold_time: seconds a gesture must be detected before it is acted on, overrides the per-gesture defaults
+    two_hands: use both hands, this one ('Left' or 'Right') for yaw and altitude and the other for movement
+    continuous: set velocities proportional to the open hand position, streamed at a fixed rate
+    ready_checks: pilot health checks required before flying, see System.HEALTH_CHECKS
+    metrics_port: serve performance metrics on this local port in the Prometheus format
+    metrics_file: write performance metrics to this file periodically in the Prometheus format
+    adaptive_inference: run hand detection less often while the image is not changing
+    gesture_model: file of a trained gesture classifier to use instead of the rule-based detector
     """
-    global log, pilot, gui, input_handler
+    global log, pilot, gui, input_handler, executor, loop_monitor, monitor_file, yaw_hand, control, stream, exporter
     log = utils.make_stdout_logger(__name__)
-    input_handler = input.InputHandler()
-
-    pilot = pilot.System(ip=ip, port=port, use_serial=serial is not None, serial_address=serial)
-    gui = graphics.HandGui(video_file)
+    exporter = MetricsExporter(metrics_port, metrics_file) if metrics_port is not None or metrics_file else None
+    input_handler = input.InputHandler(read_terminal)
+    executor = VisionExecutor(executor_mode)
+    loop_monitor = LoopMonitor() if monitor else None
+    monitor_file = monitor
+    yaw_hand = two_hands
+    if continuous and yaw_hand:
+        log.warning("Two-handed mode is not available with continuous control, using one hand")
+        yaw_hand = None
+
+    pilot = pilot.System(ip=ip, port=port, use_serial=serial is not None, serial_address=serial, ready_checks=ready_checks)
+    pilot.monitor = loop_monitor
+    input_handler.bind_pilot(lambda action: pilot.queue_action(action, interrupt=True))
+    control = ProportionalControl() if continuous else None
+    stream = SetpointStream(pilot) if continuous else None
+    gui = graphics.HandGui(video_file, max_num_hands=2 if yaw_hand else 1, gesture_filter=GestureFilter(hold_frames=hold_frames, hold_time=hold_time),
+                           governor=InferenceGovernor(name="hands") if adaptive_inference else None,
+                           detector=GestureClassifier.load(gesture_model) if gesture_model else None)
 
     try:
         asyncio.run(run())
@@ -0,0 +1,181 @@
+"""
+Offline benchmark for the hand-gesture recognition pipeline
+
+Runs the hand landmark model and the gesture detector over a
+directory of labelled images and videos. Files must be grouped
+in subdirectories named after the expected gesture, e.g.:
+
+    corpus/stop/open-hand.jpg
+    corpus/fist/closed-hand.mp4
+    corpus/no_hand/empty.jpg
+
+@author: Laura Gonzalez
+"""
+
+import os
+import time
+import cv2
+import numpy as np
+import mediapipe.python.solutions.hands as mp_hands
+from concurrent.futures import ProcessPoolExecutor
+
+from dronecontrol.common import utils
+from dronecontrol.common.video_source import FileSource, VideoSourceEmpty
+from dronecontrol.common.landmark_cache import LandmarkCache, process_hands
+from dronecontrol.hands.gestures import Gesture, Detector, landmarks_to_array, get_labels
+from dronecontrol.hands.classifier import GestureClassifier
+
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+CACHE_FOLDER = ".landmarks"
+NO_LABEL = ""
+
+
+class GestureBenchmark:
+    """Measure accuracy and throughput of the gesture detection over a labelled corpus."""
+
+    def __init__(self, directory, jobs=None, use_cache=True, model=None):
+        """
+        directory: corpus with a subdirectory of files for each gesture
+        jobs: number of worker processes, the number of CPUs by default
+        use_cache: reuse the landmarks stored in previous runs
+        model: file of a trained gesture classifier to use instead of the rule-based detector
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.directory = directory
+        self.jobs = jobs
+        self.cache_dir = os.path.join(directory, CACHE_FOLDER) if use_cache else None
+        self.detector = GestureClassifier.load(model) if model else Detector()
+        self.log.info(f"Using {type(self.detector).__name__}" + (f" from {model}" if model else ""))
+
+
+    def run(self):
+        """Process every file in the corpus and log the results."""
+        files, samples, wall_time = self.extract()
+        if not files:
+            return
+
+        expected, detected = [], []
+        detection_time = 0
+        for (_, gesture), (landmarks, labels, _) in zip(files, samples):
+            start = time.perf_counter()
+            for hand, label in zip(landmarks, labels):
+                detected.append(self.detector.classify(hand, label) if label != NO_LABEL else Gesture.NO_HAND)
+                expected.append(gesture)
+            detection_time += time.perf_counter() - start
+
+        inference_time = sum(sample[2] for sample in samples)
+        self.__log_results(expected, detected, wall_time, inference_time, detection_time)
+        return expected, detected
+
+
+    def extract(self):
+        """Get the landmarks of every file in the corpus.
+
+        Returns the (filepath, gesture) pairs, the landmarks, labels and
+        inference time of each file as given by extract_landmarks and the total time."""
+        files = self.__get_labelled_files()
+        if not files:
+            self.log.error(f"No labelled images or videos found in {self.directory}")
+            return [], [], 0.0
+
+        self.log.info(f"Processing {len(files)} files with {self.jobs or os.cpu_count()} workers")
+        start_time = time.perf_counter()
+        with ProcessPoolExecutor(self.jobs) as pool:
+            samples = list(pool.map(extract_landmarks, [f for f, _ in files],
+                                    [self.cache_dir] * len(files)))
+        return files, samples, time.perf_counter() - start_time
+
+
+    def __get_labelled_files(self):
+        """Return (filepath, gesture) pairs found in the labelled subdirectories."""
+        files = []
+        for folder in sorted(os.listdir(self.directory)):
+            path = os.path.join(self.directory, folder)
+            if not os.path.isdir(path) or folder == CACHE_FOLDER:
+                continue
+            try:
+                gesture = Gesture[folder.upper().replace("-", "_")]
+            except KeyError:
+                self.log.warning(f"Folder {folder} does not match any gesture, skipping")
+                continue
+
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+                    files.append((os.path.join(path, name), gesture))
+        return files
+
+
+    def __log_results(self, expected, detected, wall_time, inference_time, detection_time):
+        """Output precision and recall for each gesture and the measured frame rates."""
+        frames = len(expected)
+        correct = sum(e == d for e, d in zip(expected, detected))
+        self.log.info(f"Accuracy: {correct}/{frames} frames ({correct / max(frames, 1):.1%})")
+
+        for gesture in Gesture:
+            true_pos = sum(e == gesture and d == gesture for e, d in zip(expected, detected))
+            false_pos = sum(e != gesture and d == gesture for e, d in zip(expected, detected))
+            false_neg = sum(e == gesture and d != gesture for e, d in zip(expected, detected))
+            if true_pos + false_pos + false_neg == 0:
+                continue
+            precision = true_pos / (true_pos + false_pos) if true_pos + false_pos else 0
+            recall = true_pos / (true_pos + false_neg) if true_pos + false_neg else 0
+            self.log.info(f"{gesture.name:<12} precision {precision:.3f} recall {recall:.3f} " +
+                          f"({true_pos + false_neg} frames)")
+
+        unknown = sum(d is None for d in detected)
+        if unknown:
+            self.log.warning(f"{unknown} frames did not match any gesture")
+
+        self.log.info(f"Total time {wall_time:.2f} s ({frames / wall_time:.1f} FPS)")
+        if inference_time > 0:
+            self.log.info(f"Landmark stage: {frames / inference_time:.1f} FPS per worker")
+        if detection_time > 0:
+            self.log.info(f"Gesture detector: {frames / detection_time:.1f} FPS")
+
+
+def extract_landmarks(filepath, cache_dir=None):
+    """Run the hand landmark model over every frame of an image or video file.
+
+    Returns an array of hand points per frame, the handedness label
+    of each frame and the time spent getting the landmarks.
+    Frames with no hand have an empty label. Images are mirrored like
+    the video frames so both give the same handedness. When a cache
+    directory is provided, landmarks computed in previous runs are reused."""
+    model, cache = get_hand_model(cache_dir)
+    landmarks, labels = [], []
+    inference_time = 0.0
+
+    def process(image):
+        start = time.perf_counter()
+        results = process_hands(model, cv2.cvtColor(image, cv2.COLOR_BGR2RGB), cache)
+        elapsed = time.perf_counter() - start
+        hands = landmarks_to_array(results.multi_hand_landmarks)
+        landmarks.append(hands[0] if len(hands) else np.zeros((21, 3)))
+        labels.append(get_labels(results.multi_handedness)[0] if len(hands) else NO_LABEL)
+        return elapsed
+
+    if filepath.lower().endswith(IMAGE_EXTENSIONS):
+        inference_time += process(cv2.flip(cv2.imread(filepath), 1))
+    else:
+        source = FileSource(filepath, real_time=False)
+        while True:
+            try:
+                inference_time += process(source.get_frame())
+            except VideoSourceEmpty:
+                break
+
+    return np.array(landmarks, dtype=np.float32).reshape(-1, 21, 3), labels, inference_time
+
+
+def get_hand_model(cache_dir=None):
+    """Return the hand model and landmark cache of this process, created on first use
+    so a worker reuses them for every file it processes."""
+    if cache_dir not in __hand_models:
+        __hand_models[cache_dir] = (mp_hands.Hands(max_num_hands=1),
+                                    LandmarkCache(cache_dir, "hands:1") if cache_dir else None)
+    return __hand_models[cache_dir]
+
+
+__hand_models = {} # Hand model and landmark cache of this process by cache folder
@@ -0,0 +1,358 @@
+"""
+Throughput benchmarks for parts of the pipeline that can run without a camera
+
+@author: Laura Gonzalez
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+import tracemalloc
+import cv2
+import numpy as np
+import mediapipe as mp
+from simple_pid import PID
+
+from dronecontrol.common import utils
+from dronecontrol.common.video_source import (WIDTH, HEIGHT, CameraSource, FileSource, ArchiveSource,
+                                               SyntheticSource, VideoSourceEmpty)
+from dronecontrol.common.frame_archive import ArchiveWriter
+from dronecontrol.common.fleet import Fleet
+from dronecontrol.common.pilot import System
+from dronecontrol.common.landmark_cache import process_pose
+from dronecontrol.follow.tracking import PersonTracker, PersonDetector, iou
+from dronecontrol.follow.pid import VectorPID
+from dronecontrol.follow.controller import Controller
+from dronecontrol.follow import image_processing
+from dronecontrol.follow.follow import YAW_POINT, FWD_POINT
+
+
+log = utils.make_stdout_logger(__name__)
+
+
+def tracking(frames=100, people_counts=(1, 3, 10), sprite=None, background=None, seed=0):
+    """Measure person detection and tracking on synthetic frames with crowds of several sizes.
+
+    People walk sideways at random places in front of the camera and the
+    first one is the person to follow. Each frame goes through the HOG
+    detector and the tracker used by Follow. Reports the time of both
+    stages, the detections per person in view and how often the locked
+    target changed to a different person."""
+    rng = np.random.default_rng(seed)
+    for count in people_counts:
+        places = rng.uniform((-2.5, 3.0), (2.5, 9.0), (count, 2))
+        phases = rng.uniform(0, 2 * np.pi, count)
+        walks = [lambda t, x=x, y=y, phase=phase: (x + 0.5 * np.sin(0.5 * t + phase), y)
+                 for (x, y), phase in zip(places, phases)]
+        source = SyntheticSource(walks[0], sprite, background, others=walks[1:])
+        detector = PersonDetector()
+        tracker = PersonTracker(detector, detect_interval=1)
+        detect_time, track_time = 0.0, 0.0
+        detections, visible, switches = 0, 0, 0
+        target_person = None
+
+        for _ in range(frames):
+            image = source.get_frame()
+            start = time.perf_counter()
+            boxes = detector.detect(image)
+            detect_end = time.perf_counter()
+            tracker.update(boxes)
+            track_time += time.perf_counter() - detect_end
+            detect_time += detect_end - start
+
+            people = [(i, np.concatenate(box)) for i, box in enumerate(source.people_boxes) if box is not None]
+            detections += len(boxes)
+            visible += len(people)
+            target = tracker.target
+            if target is not None and people:
+                person = min(people, key=lambda person: np.linalg.norm(person[1] - target.box))[0]
+                if target_person is not None and person != target_person:
+                    switches += 1
+                target_person = person
+
+        log.info(f"{count:>3} people: detect {detect_time / frames * 1000:.1f} ms, " +
+                 f"track {track_time / frames * 1e6:.1f} us per frame, " +
+                 f"{detections / max(visible, 1):.2f} detections per person in view, " +
+                 f"{len(tracker.tracks)} tracks, {switches} target switches")
+
+
+def frames(frames=300):
+    """Compare the memory allocated per frame by the image handling steps
+    of the pipeline when the frames of the source are released and reused
+    and when they are dropped.
+
+    Frames are decoded from a temporary video by FileSource, which mirrors
+    them, then converted to RGB and copied for annotation. Reports the
+    largest transient allocation measured by tracemalloc in steady state."""
+    shape = (HEIGHT, WIDTH, 3)
+    gradient = np.tile(np.linspace(0, 255, WIDTH, dtype=np.uint8)[None, :, None], (HEIGHT, 1, 3))
+    rgb = np.empty(shape, np.uint8)
+
+    def allocating(source):
+        frame = source.get_frame()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        frame.copy()
+
+    def pooled(source):
+        frame = source.get_frame()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        source.release(source.pool.copy(frame))
+        source.release(frame)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "frames.avi")
+        video = cv2.VideoWriter(path, utils.VIDEO_CODE, 30, (WIDTH, HEIGHT))
+        for i in range(frames + 10):
+            video.write(np.roll(gradient, i * 4, axis=1))
+        video.release()
+
+        for name, step in (("allocating", allocating), ("pooled", pooled)):
+            source = FileSource(path, real_time=False)
+            for _ in range(10):
+                step(source)
+
+            tracemalloc.start()
+            baseline = tracemalloc.get_traced_memory()[0]
+            start = time.perf_counter()
+            for _ in range(frames):
+                step(source)
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            source.close()
+
+            log.info(f"{name:<10}: {elapsed / frames * 1000:.3f} ms per frame, " +
+                     f"peak allocation {(peak - baseline) / 1024:.1f} KiB, " +
+                     f"retained {(current - baseline) / 1024:.1f} KiB (frame is {gradient.nbytes / 1024:.0f} KiB)")
+
+
+def archive(frames=300, seed=0):
+    """Compare sequential replay and random access of the same frames
+    stored as MJPG video and as a memory-mapped frame archive."""
+    rng = np.random.default_rng(seed)
+    size = (WIDTH, HEIGHT)
+    gradient = np.tile(np.linspace(0, 255, WIDTH, dtype=np.uint8)[None, :, None], (HEIGHT, 1, 3))
+
+    with tempfile.TemporaryDirectory() as directory:
+        video_path = os.path.join(directory, "frames.avi")
+        archive_path = os.path.join(directory, "frames.dcfa")
+        video = cv2.VideoWriter(video_path, utils.VIDEO_CODE, 30, size)
+        writer = ArchiveWriter(archive_path, size)
+        for i in range(frames):
+            frame = np.roll(gradient, i * 4, axis=1)
+            video.write(frame)
+            writer.write(frame)
+        video.release()
+        writer.release()
+        log.info(f"{frames} frames: video {os.path.getsize(video_path) / 2**20:.1f} MiB, " +
+                 f"archive {os.path.getsize(archive_path) / 2**20:.1f} MiB")
+
+        sources = {
+            "video": lambda: FileSource(video_path, real_time=False, flip=False),
+            "archive": lambda: ArchiveSource(archive_path, real_time=False),
+            "archive copy": lambda: ArchiveSource(archive_path, real_time=False, copy=True),
+        }
+        for name, make_source in sources.items():
+            source = make_source()
+            count, start = 0, time.perf_counter()
+            try:
+                while True:
+                    source.get_frame().sum(dtype=np.uint64) # Touch every byte
+                    count += 1
+            except VideoSourceEmpty:
+                pass
+            elapsed = time.perf_counter() - start
+            source.close()
+            log.info(f"{name:<12}: {count / elapsed:8.1f} FPS sequential, " +
+                     f"{count * gradient.nbytes / elapsed / 2**20:7.1f} MiB/s")
+
+        positions = rng.integers(0, frames, 50)
+        capture = cv2.VideoCapture(video_path)
+        start = time.perf_counter()
+        for position in positions:
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(position))
+            capture.read()
+        video_seek = (time.perf_counter() - start) / len(positions)
+        capture.release()
+
+        source = ArchiveSource(archive_path, real_time=False)
+        start = time.perf_counter()
+        for position in positions:
+            source.seek(int(position))
+            source.get_frame().sum(dtype=np.uint64)
+        archive_seek = (time.perf_counter() - start) / len(positions)
+        source.close()
+        log.info(f"Random access: video {video_seek * 1000:.2f} ms, archive {archive_seek * 1000:.2f} ms per frame")
+
+
+def camera(frames=300, camera=0, fourcc=None, fps=None, buffer_size=None, drain=False, work=0.0):
+    """Measure the frame rate delivered by a camera and how old its frames are when read.
+
+    work simulates that many seconds of processing after each frame,
+    which shows how old buffered frames get when the loop is slower
+    than the camera. The age needs frame timestamps from the backend."""
+    source = CameraSource(camera, fourcc, fps, buffer_size, drain)
+    if not source.is_opened:
+        source.close()
+        return
+
+    read_times, ages = [], []
+    try:
+        for _ in range(frames):
+            source.get_frame()
+            read_times.append(time.perf_counter())
+            if source.age is not None:
+                ages.append(source.age)
+            if work:
+                time.sleep(work)
+    finally:
+        source.close()
+
+    intervals = np.diff(read_times) * 1000
+    log.info(f"{source.fourcc} requested {fps or 'default'} FPS: delivered {1000 / intervals.mean():.1f} FPS, " +
+             f"interval p95 {np.percentile(intervals, 95):.1f} ms max {intervals.max():.1f} ms, " +
+             f"{source.drained} buffered frames drained")
+    if ages:
+        ages = np.array(ages) * 1000
+        log.info(f"Frame age at read: mean {ages.mean():.1f} ms p95 {np.percentile(ages, 95):.1f} ms max {ages.max():.1f} ms")
+    else:
+        log.warning("The capture backend does not report frame timestamps, frame age unknown")
+
+
+def follow(frames=600, trajectory="sideways", sprite=None, background=None, closed_loop=True, speed=0.5):
+    """Run the stages of the follow loop on a synthetic person and measure
+    their speed and how well the person is detected and kept in place.
+
+    The pose model, box detection and controller are the ones used by
+    Follow, with the controller velocities fed back to the source instead
+    of a vehicle when closed_loop is set. The scene and the controller
+    clock advance one camera period per frame however long the stages
+    take, so runs are repeatable."""
+    source = SyntheticSource(trajectory, sprite, background, speed=speed)
+    controller = Controller(YAW_POINT, FWD_POINT, time_fn=lambda: source.time)
+    stages = {"render": [], "pose": [], "detect": [], "control": []}
+    visible, detected, overlaps, offsets, yaw_errors, fwd_errors = 0, 0, [], [], [], []
+
+    with mp.solutions.pose.Pose() as pose:
+        for _ in range(frames):
+            start = time.perf_counter()
+            image = source.get_frame()
+            truth = source.subject_box
+            render_time = time.perf_counter()
+            results = process_pose(pose, image)
+            pose_time = time.perf_counter()
+            p1, p2 = image_processing.detect(results, image)
+            detect_time = time.perf_counter()
+            yaw, fwd = controller.control(p1, p2)
+            if closed_loop:
+                source.command(yaw, fwd)
+            end = time.perf_counter()
+            for stage, elapsed in zip(stages, (render_time - start, pose_time - render_time,
+                                               detect_time - pose_time, end - detect_time)):
+                stages[stage].append(elapsed)
+
+            if truth is None:
+                continue
+            visible += 1
+            yaw_errors.append(abs((truth[0][0] + truth[1][0]) / 2 - YAW_POINT))
+            fwd_errors.append(abs(truth[1][1] - truth[0][1] - FWD_POINT))
+            if not np.array_equal(p1, Controller.ZEROES) or not np.array_equal(p2, Controller.ONES):
+                detected += 1
+                overlaps.append(iou(np.concatenate(truth)[np.newaxis], np.concatenate((p1, p2))[np.newaxis])[0, 0])
+                offsets.append(np.linalg.norm((p1 + p2) / 2 - (truth[0] + truth[1]) / 2))
+    source.close()
+
+    total = sum(sum(times) for times in stages.values())
+    log.info(f"{trajectory} trajectory at {speed:g} m/s, {'closed' if closed_loop else 'open'} loop: {frames / total:.1f} FPS, " +
+             ", ".join(f"{stage} {np.mean(times) * 1000:.2f} ms" for stage, times in stages.items()))
+    log.info(f"Person in view in {visible}/{frames} frames, detected in {detected} " +
+             f"({detected / max(visible, 1):.1%})")
+    if detected:
+        log.info(f"Detected box: mean IoU {np.mean(overlaps):.2f}, centre offset {np.mean(offsets):.3f} of the image")
+    if visible:
+        log.info(f"Tracking error: yaw mean {np.mean(yaw_errors):.3f} max {np.max(yaw_errors):.3f}, " +
+                 f"height mean {np.mean(fwd_errors):.3f} max {np.max(fwd_errors):.3f}")
+
+
+def pid(gain_sets=100, steps=1000, dt=1/30, seed=0):
+    """Simulate a step response of an integrating plant for many random
+    gain sets, one simple_pid.PID at a time and all at once with VectorPID.
+
+    Reports the time per gain set and the largest output difference."""
+    rng = np.random.default_rng(seed)
+    tunings = rng.uniform((0, 0, 0), (200, 50, 5), (gain_sets, 3))
+    limit = 5
+
+    start = time.perf_counter()
+    scalar_outputs = np.empty((steps, gain_sets))
+    for k, gains in enumerate(tunings):
+        controller = PID(*gains, setpoint=1.0, output_limits=(-limit, limit))
+        value = 0.0
+        for i in range(steps):
+            scalar_outputs[i, k] = controller(value, dt)
+            value += scalar_outputs[i, k] * dt * 0.01
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vector_outputs = np.empty((steps, gain_sets))
+    controllers = VectorPID(gain_sets, tunings, setpoint=1.0, output_limits=(-limit, limit))
+    values = np.zeros(gain_sets)
+    for i in range(steps):
+        vector_outputs[i] = controllers(values, dt)
+        values += vector_outputs[i] * dt * 0.01
+    vector_time = time.perf_counter() - start
+
+    log.info(f"{gain_sets} gain sets x {steps} steps: simple_pid {scalar_time / gain_sets * 1000:.3f} ms, " +
+             f"VectorPID {vector_time / gain_sets * 1000:.3f} ms per gain set ({scalar_time / vector_time:.1f}x)")
+    log.info(f"Largest output difference {np.abs(scalar_outputs - vector_outputs).max():.2e}")
+
+
+def fleet(count=2, ip=None, rate=20, duration=10):
+    """Measure how many vehicles can be supervised at a command rate.
+
+    Connects to the vehicles, usually simulator instances on consecutive
+    ports, and for growing subsets sends one request-response command to
+    every vehicle per period. Reports the achieved rate, command latency
+    and the CPU used by this process."""
+    asyncio.run(__run_fleet(Fleet(count, ip), rate, duration))
+
+
+async def __run_fleet(vehicles: Fleet, rate, duration):
+    try:
+        connected = await vehicles.connect()
+        sizes = sorted({min(2 ** i, len(connected)) for i in range(len(connected).bit_length() + 1)} - {0})
+        for size in sizes:
+            await __supervise(vehicles, connected[:size], rate, duration)
+    finally:
+        await vehicles.stop()
+        vehicles.close()
+
+
+async def __supervise(vehicles: Fleet, indices, rate, duration):
+    """Send commands to some vehicles at a fixed rate and log the results."""
+    loop = asyncio.get_running_loop()
+    period = 1 / rate
+    latencies, errors, ticks, late = [], 0, 0, 0
+    cpu_start, start = time.process_time(), time.perf_counter()
+    next_time = loop.time()
+
+    while time.perf_counter() - start < duration:
+        sent = time.perf_counter()
+        results = await vehicles.send(System.is_offboard, indices)
+        latencies.append(time.perf_counter() - sent)
+        errors += sum(isinstance(result, BaseException) for result in results)
+        ticks += 1
+
+        next_time += period
+        if next_time < loop.time():
+            late += 1
+            next_time = loop.time()
+        await asyncio.sleep(next_time - loop.time())
+
+    elapsed = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000
+    log.info(f"{len(indices):>3} vehicles: {ticks * len(indices) / elapsed:8.1f} commands/s " +
+             f"({ticks / elapsed:.1f} of {rate} Hz, {late} late), " +
+             f"latency p50 {np.percentile(latencies, 50):.2f} ms p95 {np.percentile(latencies, 95):.2f} ms, " +
+             f"CPU {100 * (time.process_time() - cpu_start) / elapsed:.0f}%, {errors} errors")
@@ -4,10 +4,16 @@ import time
 import cv2
 import asyncio
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 import mediapipe as mp
 
 from dronecontrol.common import utils, pilot, input
-from dronecontrol.common.video_source import CameraSource, SimulatorSource, FileSource
+from dronecontrol.common.video_source import CameraSource, SimulatorSource, FileSource, RecordingSource, ArchiveSource
+from dronecontrol.common.recorder import Recorder, RecordFormat
+from dronecontrol.common import frame_archive
+from dronecontrol.common.landmark_cache import LandmarkCache, process_pose
+from dronecontrol.common.executor import VisionExecutor, ExecutorMode
+from dronecontrol.common.monitor import LoopMonitor
 from dronecontrol.follow.controller import Controller
 from dronecontrol.hands.graphics import HandGui
 from dronecontrol.follow.image_processing import detect
@@ -29,7 +35,8 @@ class VideoCamera:
 
     def __init__(self, use_simulator, use_hardware, use_wsl, use_camera, 
                  image_detection, hardware_address=None, simulator_ip=None,
-                 file=None):
+                 file=None, cache_dir=None, executor_mode=ExecutorMode.THREAD, real_time=True, skip=0,
+                 record_format=RecordFormat.MJPG, monitor_file=None):
         self.log = utils.make_stdout_logger(__name__)
         self.input_handler = input.InputHandler()
         self.pilot = None
@@ -39,21 +46,36 @@ class VideoCamera:
 
         if use_camera:
             self.source = CameraSource()
+        elif file and os.path.isdir(file):
+            self.source = RecordingSource(file, real_time)
+        elif file and file.endswith(f".{frame_archive.EXTENSION}"):
+            self.source = ArchiveSource(file, real_time)
         elif file:
-            self.source = FileSource(file)
+            self.source = FileSource(file, real_time, skip, prefetch=True)
         elif use_simulator:
             self.source = SimulatorSource(utils.get_wsl_host_ip() if use_wsl else simulator_ip if simulator_ip else "")
         else:
             self.source = CameraSource()
         self.img = self.source.get_blank()
+        self.input_handler.bind(' ', self.trigger)     # Take picture / start video
+        self.input_handler.bind('<', self.change_mode) # Picture <> video
+        if self.pilot:
+            self.input_handler.bind_pilot(self.pilot.queue_action)
 
         self.mode = CameraMode.PICTURE
-        self.is_recording = False
-        self.out = None
+        self.record_format = record_format
+        self.recorder = None
+        self.image_writer = ThreadPoolExecutor(1, thread_name_prefix="writer")
         self.last_run_time = time.time()
 
-        self.hand_detection = HandGui(source = self.source) if image_detection == ImageDetection.HAND else None
+        self.hand_detection = HandGui(source = self.source, cache_dir=cache_dir) if image_detection == ImageDetection.HAND else None
+        self.cache = LandmarkCache(cache_dir, "pose:1") if cache_dir and image_detection == ImageDetection.POSE else None
         self.pose_detection = mp_pose.Pose(model_complexity=1, min_detection_confidence=0.5, min_tracking_confidence=0.5) if image_detection == ImageDetection.POSE else None
+        self.executor = VisionExecutor(executor_mode)
+        self.loop_monitor = LoopMonitor() if monitor_file else None
+        self.monitor_file = monitor_file
+        if self.pilot:
+            self.pilot.monitor = self.loop_monitor
         
 
     async def run(self):
@@ -64,43 +86,50 @@ class VideoCamera:
                 self.log.error("Connection time-out")
                 return
         pilot_task = asyncio.create_task(self.pilot.start_queue()) if self.pilot else None
+        if self.loop_monitor:
+            self.loop_monitor.start(LoopMonitor.SLOW_CALLBACK_TIME)
         
         while True:
             if self.hand_detection:
-                self.hand_detection.capture()
+                self.hand_detection.update(await self.executor.run(self.hand_detection.read))
                 raw_img = self.hand_detection.img
-                self.img = raw_img.copy()
+                self.__copy_frame(raw_img)
                 self.hand_detection.draw_hands()
             else:
-                raw_img = self.source.get_frame()
-                self.img = raw_img.copy()
+                raw_img = await self.executor.run(self.source.get_frame)
+                self.__copy_frame(raw_img)
 
                 if self.pose_detection:
-                    self.results = self.pose_detection.process(self.img)
-                    p1, p2 = detect(self.results, raw_img)
+                    self.results = await self.executor.run(process_pose, self.pose_detection, self.img, self.cache)
+                    p1, p2 = await self.executor.run(detect, self.results, raw_img)
                     input = Controller.get_input(p1, p2) if self.results.pose_landmarks else (0, 0)
                     utils.write_text_to_image(raw_img, f"Yaw input: {input[0]:.3f}, fwd input {input[1]:.3f}", 
                                               utils.ImageLocation.BOTTOM_LEFT_LINE_TWO)
 
-            utils.write_text_to_image(raw_img, f"Mode {self.mode.name}: {'' if self.is_recording else 'not '} recording",
+            utils.write_text_to_image(raw_img, f"Mode {self.mode.name}: {'' if self.is_recording else 'not '} recording" +
+                                      (f" ({self.recorder.dropped} dropped)" if self.is_recording else ""),
                                       utils.ImageLocation.TOP_LEFT)
             utils.write_text_to_image(raw_img, f"FPS: {1.0 / (time.time() - self.last_run_time):.3f}")
             self.last_run_time = time.time()
             cv2.imshow("Dronecontrol: test camera", raw_img)
+            if not self.hand_detection:
+                self.source.release(raw_img)
 
             try:
-                self.__handle_key_input()
+                await self.__handle_key_input()
             except KeyboardInterrupt:
                 break
 
             if self.is_recording:
-                self.out.write(self.img)
+                self.recorder.write(self.img)
             
             if pilot_task and pilot_task.done():
                 break
             
             await asyncio.sleep(1 / 10)
 
+        if self.loop_monitor:
+            await self.loop_monitor.stop()
         if pilot_task:
             if not pilot_task.done():
                 pilot_task.cancel()
@@ -112,8 +141,14 @@ class VideoCamera:
         
     def close(self):
         cv2.waitKey(1)
-        if self.out:
-            self.out.release()
+        self.input_handler.close()
+        self.executor.close()
+        if self.loop_monitor:
+            self.loop_monitor.export(self.monitor_file)
+            self.loop_monitor.log_stats()
+        if self.recorder:
+            self.recorder.stop()
+        self.image_writer.shutdown()
         self.source.close()
         if self.pilot:
             self.pilot.close()
@@ -122,6 +157,11 @@ class VideoCamera:
             self.pose_detection.close()
 
 
+    @property
+    def is_recording(self):
+        return self.recorder is not None and self.recorder.is_recording
+
+
     def change_mode(self):
         if self.mode == CameraMode.VIDEO and self.is_recording:
             self.trigger()
@@ -133,23 +173,21 @@ class VideoCamera:
         if self.mode == CameraMode.PICTURE:
             img = self.img.copy()
             detect(self.results, img)
-            utils.write_image(img)
+            self.image_writer.submit(utils.write_image, img)
         elif self.mode == CameraMode.VIDEO:
             if self.is_recording:
-                self.out.release()
-                self.out = None
+                self.recorder.stop()
             else:
-                self.out = utils.write_video(self.source.get_size())
-            self.is_recording = not self.is_recording
+                fps = getattr(self.source, "fps", Recorder.DEFAULT_FPS)
+                self.recorder = Recorder(self.source.get_size(), fps, self.record_format)
+                self.recorder.start()
 
 
-    def __handle_key_input(self):
-        key_action = self.input_handler.handle(cv2.waitKey(self.source.get_delay()))
-        if key_action is None:
-            pass
-        elif self.pilot and pilot.System.__name__ in key_action.__qualname__:
-            self.pilot.queue_action(key_action)
-        elif VideoCamera.__name__ in key_action.__qualname__:
-            key_action(self)
+    def __copy_frame(self, raw_img):
+        """Keep a clean copy of the frame in a buffer from the source pool."""
+        self.source.pool.release(self.img)
+        self.img = self.source.pool.copy(raw_img)
 
-    
+
+    async def __handle_key_input(self):
+        await self.input_handler.handle(self.input_handler.poll())
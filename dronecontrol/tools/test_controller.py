@@ -1,11 +1,12 @@
 import asyncio
-from datetime import datetime
 from enum import Enum
+import os
 import time
 import json
 from mavsdk.offboard import PositionNedYaw
 
 from dronecontrol.common import utils
+from dronecontrol.common.results import ResultWriter, Results
 from dronecontrol.follow.follow import Follow
 
 ROTATION_TARGETS = [-150, -100, -50, 50, 100, 150]
@@ -29,7 +30,7 @@ class ControlTest:
         # Maybe is because AirSim already starts mavsdk server in default port?
         self.follow = Follow(port=14550, simulator_ip="") 
 
-        self.data = {}
+        self.results = None
         self.target_index = 0
         self.current_state = State.RESET
         self.log.info(f"Set state to {self.current_state}")
@@ -40,14 +41,19 @@ class ControlTest:
 
         if data_file:
             try:
-                with open(data_file, "r") as outfile:
-                    self.data = json.load(outfile)
-                    self.plot_data()
+                if os.path.isdir(data_file):
+                    self.plot_data(Results(data_file))
+                else:
+                    # Results saved as a single JSON document by older versions
+                    with open(data_file, "r") as outfile:
+                        self.plot_data(json.load(outfile))
             except FileNotFoundError as e:
                 self.log.error(e)
             finally:
                 raise KeyboardInterrupt
 
+        self.results = ResultWriter("test-pid", test_yaw=test_yaw, targets=self.targets)
+
 
     async def run(self):
         await self.follow.pilot.connect()
@@ -61,11 +67,6 @@ class ControlTest:
             await self.follow.run()
         except Exception as e:
             self.log.error(e)
-        finally:
-            # Save data in case of plotting errors
-            if self.data.keys():
-                with open(f"data/test-pid-{datetime.now().strftime('%Y%m%d%H%M%S')}.json", "w") as outfile:
-                    json.dump(self.data, outfile)
 
 
     async def on_new_image(self, p1, p2):
@@ -113,11 +114,10 @@ class ControlTest:
 
     
     async def save_data(self):
-        self.data[self.targets[self.target_index]] = {
-            "yaw": self.follow.controller.get_yaw_data(),
-            "fwd": self.follow.controller.get_fwd_data(),
-            "time": self.follow.controller.get_time_data(True)
-        }
+        self.results.append(self.targets[self.target_index],
+                            yaw=self.follow.controller.get_yaw_data(),
+                            fwd=self.follow.controller.get_fwd_data(),
+                            time=self.follow.controller.get_time_data(True))
         self.log.info(f"Set position velocity to origin")
         await self.follow.pilot.set_position_ned_yaw(self.START_POS)
         await asyncio.sleep(5)
@@ -125,7 +125,8 @@ class ControlTest:
         self.target_index += 1
         if self.target_index == len(self.targets):
             self.finished = True
-            self.plot_data()
+            self.results.close()
+            self.plot_data(Results(self.results.directory))
             raise KeyboardInterrupt
         else:
             self.current_state = State.RESET
@@ -133,16 +134,20 @@ class ControlTest:
             self.log.info(f"Wait for person in center")
 
     
-    def plot_data(self):
-        time = [self.data[target]["time"] for target in self.data]
-        yaw_input = [self.data[target]["yaw"][1] for target in self.data]
-        fwd_input = [self.data[target]["fwd"][1] for target in self.data]
-        utils.plot(time, yaw_input, block=False, title="Yaw input", ylabel="Horizontal distance", legend=self.targets)
-        utils.plot(time, fwd_input, title="Fwd input", ylabel="Height", legend=self.targets)
+    def plot_data(self, data):
+        """Plot the inputs of each target from a mapping of target to its yaw, fwd and time data."""
+        targets = list(data.keys())
+        time = [data[target]["time"] for target in targets]
+        yaw_input = [data[target]["yaw"][1] for target in targets]
+        fwd_input = [data[target]["fwd"][1] for target in targets]
+        utils.plot(time, yaw_input, block=False, title="Yaw input", ylabel="Horizontal distance", legend=targets)
+        utils.plot(time, fwd_input, title="Fwd input", ylabel="Height", legend=targets)
 
 
     def close(self):
         self.log.info("All tasks finished")
+        if self.results:
+            self.results.close()
         self.follow.close()
 
     def has_pose(self):
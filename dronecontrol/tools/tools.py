@@ -1,14 +1,22 @@
 import traceback
 import asyncio
+from dronecontrol.common.executor import ExecutorMode
+from dronecontrol.common.recorder import RecordFormat
 from dronecontrol.tools.test_camera import ImageDetection, VideoCamera
 from dronecontrol.tools.test_controller import ControlTest
 from dronecontrol.tools.tune_controller import TunePIDController
+from dronecontrol.tools.benchmark_gestures import GestureBenchmark
+from dronecontrol.tools.train_gestures import GestureTrainer
+from dronecontrol.tools import benchmarks
 
 
 def test_camera(use_simulator, use_hardware, use_wsl, use_camera, use_hands, use_pose,
-                hardware_address=None, simulator_ip=None, file=None):
+                hardware_address=None, simulator_ip=None, file=None, cache_dir=None,
+                executor_mode=ExecutorMode.THREAD, real_time=True, skip=0, record_format=RecordFormat.MJPG,
+                monitor_file=None):
     detection = ImageDetection.HAND if use_hands else (ImageDetection.POSE if use_pose else ImageDetection.NONE)
-    camera = VideoCamera(use_simulator, use_hardware, use_wsl, use_camera, detection, hardware_address, simulator_ip, file)
+    camera = VideoCamera(use_simulator, use_hardware, use_wsl, use_camera, detection, hardware_address, simulator_ip, file,
+                         cache_dir, executor_mode, real_time, skip, record_format, monitor_file)
     try:
         asyncio.run(camera.run())
     except asyncio.CancelledError:
@@ -49,5 +57,61 @@ def tune_pid(tune_yaw, manual, sample_time, kp_values, ki_values, kd_values):
         control_test.close()
 
 
+def train_gestures(directory, output, jobs=None, use_cache=True, hidden_units=32, epochs=300, validation=0.2):
+    trainer = GestureTrainer(directory, output, jobs, use_cache, hidden_units, epochs, validation)
+    try:
+        trainer.run()
+    except KeyboardInterrupt:
+        trainer.log.warning("Cancelled with KeyboardInterrupt")
+
+
+def benchmark_gestures(directory, jobs=None, use_cache=True, model=None):
+    benchmark = GestureBenchmark(directory, jobs, use_cache, model)
+    try:
+        benchmark.run()
+    except KeyboardInterrupt:
+        benchmark.log.warning("Cancelled with KeyboardInterrupt")
+
+
+def benchmark_tracking(frames, people_counts, sprite=None, background=None):
+    try:
+        benchmarks.tracking(frames, people_counts, sprite, background)
+    except KeyboardInterrupt:
+        benchmarks.log.warning("Cancelled with KeyboardInterrupt")
+
+
+def benchmark_follow(frames, trajectory, sprite=None, background=None, closed_loop=True, speed=0.5):
+    try:
+        benchmarks.follow(frames, trajectory, sprite, background, closed_loop, speed)
+    except KeyboardInterrupt:
+        benchmarks.log.warning("Cancelled with KeyboardInterrupt")
+
+
+def benchmark_frames(frames):
+    benchmarks.frames(frames)
+
+
+def benchmark_archive(frames):
+    benchmarks.archive(frames)
+
+
+def benchmark_camera(frames, camera, fourcc, fps, buffer_size, drain, work):
+    try:
+        benchmarks.camera(frames, camera, fourcc, fps, buffer_size, drain, work)
+    except KeyboardInterrupt:
+        benchmarks.log.warning("Cancelled with KeyboardInterrupt")
+
+
+def benchmark_pid(gain_sets, steps):
+    benchmarks.pid(gain_sets, steps)
+
+
+def benchmark_fleet(count, ip, rate, duration):
+    try:
+        benchmarks.fleet(count, ip, rate, duration)
+    except KeyboardInterrupt:
+        benchmarks.log.warning("Cancelled with KeyboardInterrupt")
+
+
 if __name__ == "__main__":
     test_camera(False, False, False)
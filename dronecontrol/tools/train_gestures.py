@@ -0,0 +1,96 @@
+"""
+Train the learned gesture classifier from a labelled corpus
+
+Uses the same corpus layout and landmark cache as the gesture benchmark,
+a subdirectory of images and videos for each gesture. Part of the
+files are held out to measure the accuracy of the trained model,
+which is compared with the rule-based detector on the same hands.
+
+@author: Laura Gonzalez
+"""
+
+import time
+import numpy as np
+
+from dronecontrol.common import utils
+from dronecontrol.hands.gestures import Detector
+from dronecontrol.hands.classifier import GestureClassifier, HIDDEN_UNITS, EPOCHS
+from dronecontrol.tools.benchmark_gestures import GestureBenchmark, NO_LABEL
+
+
+VALIDATION_SPLIT = 0.2
+
+
+class GestureTrainer:
+    """Train a gesture classifier on the hands of a labelled corpus and save it."""
+
+    def __init__(self, directory, output, jobs=None, use_cache=True, hidden_units=HIDDEN_UNITS, epochs=EPOCHS,
+                 validation=VALIDATION_SPLIT, seed=0):
+        """
+        directory: corpus with a subdirectory of files for each gesture
+        output: file to save the model to
+        jobs: number of worker processes for the landmark extraction
+        use_cache: reuse the landmarks stored in previous runs
+        hidden_units: size of the hidden layer
+        epochs: passes over the training hands
+        validation: fraction of the files held out to measure the accuracy
+        seed: seed of the weights and of the split
+        """
+        self.log = utils.make_stdout_logger(__name__)
+        self.output = output
+        self.hidden_units = hidden_units
+        self.epochs = epochs
+        self.validation = validation
+        self.seed = seed
+        self.benchmark = GestureBenchmark(directory, jobs, use_cache)
+
+
+    def run(self):
+        files, samples, _ = self.benchmark.extract()
+        if not files:
+            return
+
+        # Split by file so frames of the same video are not on both sides
+        rng = np.random.default_rng(self.seed)
+        held_out = rng.random(len(files)) < self.validation
+        train, test = self.__get_hands(files, samples, ~held_out), self.__get_hands(files, samples, held_out)
+        if not train[0].size:
+            self.log.error("No hands found in the training files")
+            return
+
+        classifier = GestureClassifier.train(*train, hidden_units=self.hidden_units, epochs=self.epochs, seed=self.seed)
+        classifier.save(self.output)
+        if test[0].size:
+            self.__evaluate(classifier, *test)
+        else:
+            self.log.warning("No hands held out, accuracy not measured")
+        return classifier
+
+
+    def __evaluate(self, classifier, hands, labels, expected):
+        """Log the accuracy and speed of the classifier and the rule-based detector on the held out hands."""
+        for detector in (Detector(), classifier):
+            start = time.perf_counter()
+            detected = [detector.classify(hand, label) for hand, label in zip(hands, labels)]
+            per_hand = (time.perf_counter() - start) / len(hands)
+            start = time.perf_counter()
+            detector.classify_batch(hands, labels)
+            batch = time.perf_counter() - start
+            correct = sum(e == d for e, d in zip(expected, detected))
+            self.log.info(f"{type(detector).__name__:<18} accuracy {correct}/{len(hands)} ({correct / len(hands):.1%}), " +
+                          f"{per_hand * 1e6:.0f} us per hand, {len(hands) / batch:.0f} hands/s in batch")
+
+
+    @staticmethod
+    def __get_hands(files, samples, selected):
+        """Return the hands, labels and gestures of the selected files, skipping frames with no hand."""
+        hands, labels, expected = [], [], []
+        for (_, gesture), (landmarks, frame_labels, _), is_selected in zip(files, samples, selected):
+            if not is_selected:
+                continue
+            for hand, label in zip(landmarks, frame_labels):
+                if label != NO_LABEL:
+                    hands.append(hand)
+                    labels.append(label)
+                    expected.append(gesture)
+        return np.array(hands, dtype=np.float32).reshape(-1, 21, 3), labels, expected
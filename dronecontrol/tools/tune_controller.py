@@ -1,12 +1,12 @@
 import asyncio
-import cv2
 import traceback
 import math
+import numpy as np
 from mavsdk.offboard import PositionNedYaw
 from mavsdk.action import ActionError
-from mediapipe.python.solution_base import SolutionBase
 
 from dronecontrol.common import utils, input
+from dronecontrol.common.results import ResultWriter, Results
 from dronecontrol.follow.controller import Controller
 from dronecontrol.follow.follow import Follow
 from dronecontrol.common.pilot import System
@@ -21,6 +21,9 @@ class TunePIDController:
         self.log = utils.make_stdout_logger(__name__)
         self.input_handler = input.InputHandler()
         self.follow = Follow(port=14550, simulator_ip="")
+        self.input_handler.bind_pilot(self.run_pilot_key)
+        self.input_handler.bind(' ', self.verify_tuning)
+        self.input_handler.bind('r', lambda: self.follow.pose.process(self.follow.source.blank))
 
         self.follow.is_follow_on = True
         self.follow.is_keyboard_control_on = False
@@ -39,6 +42,7 @@ class TunePIDController:
         else:
             self.follow.controller.fwd_pid.tunings = (self.kp_values.pop(0), self.ki_values.pop(0), self.kd_values.pop(0))
             self.follow.controller.yaw_pid.tunings = (0, 0, 0)
+        self.results = ResultWriter("tune-pid", tune_yaw=tune_yaw, sample_time=sample_time)
 
 
     async def run(self):
@@ -53,13 +57,6 @@ class TunePIDController:
         await asyncio.sleep(2)
         self.follow.subscribe_to_image(self.on_new_image)
 
-        self.input_data = []
-        self.output_data = []
-        self.pilot_pos_data = []
-        self.pilot_vel_data = []
-        self.pilot_time = []
-        self.time = []
-
         await self.follow.pilot.start_offboard()
         await self.follow.pilot.set_position_ned_yaw(self.START_POS)
         await asyncio.sleep(3)
@@ -78,24 +75,19 @@ class TunePIDController:
                 await self.go_to_next_value(time_data)
 
         # Manual keyboard control
-        key = cv2.waitKey(1)
-        if key == ord(' '):
-            await self.verify_tuning()
-        else:
-            await self.keyboard_control(key)
+        await self.keyboard_control(self.input_handler.poll())
 
 
     async def go_to_next_value(self, time_data):
         # Save last run
         if not self.first_time:
+            pid = self.follow.controller.yaw_pid if self.tune_yaw else self.follow.controller.fwd_pid
             pid_data = self.follow.controller.get_yaw_data() if self.tune_yaw else self.follow.controller.get_fwd_data()
-            self.input_data.append(pid_data[1])
-            self.output_data.append(pid_data[2])
-            pilot_data = self.follow.get_pilot_telemetry()
-            self.pilot_time.append(pilot_data[0])
-            self.pilot_pos_data.append(pilot_data[1])
-            self.pilot_vel_data.append(pilot_data[2])
-            self.time.append(time_data)
+            pilot_time, pilot_pos, pilot_vel = self.follow.get_pilot_telemetry()
+            self.results.append(" ".join(f"{k:g}" for k in pid.tunings),
+                                input=pid_data[1], output=pid_data[2], time=time_data, pilot_time=pilot_time,
+                                pilot_position=np.reshape([[p.north_m, p.east_m, p.down_m, p.yaw_deg] for p in pilot_pos], (-1, 4)),
+                                pilot_velocity=np.reshape(pilot_vel, (-1, 2)))
 
         # Reset position
         self.follow.is_follow_on = False
@@ -144,17 +136,7 @@ class TunePIDController:
 
 
     async def keyboard_control(self, key):
-        key_action = self.input_handler.handle(key)
-        if key_action:
-            if System.__name__ in key_action.__qualname__:
-                try:
-                    await key_action(self.follow.pilot)
-                except ActionError as e:
-                    self.log.error(e)
-                    await self.follow.pilot.hold()     
-            elif SolutionBase.__name__ in key_action.__qualname__:
-                key_action(self.follow.pose, self.follow.source.get_blank())
-        else:
+        if not await self.input_handler.handle(key):
             time_data = self.follow.controller.get_time_data()
             if (self.follow.is_follow_on and len(time_data) > 2 
                 and int(time_data[-1] - time_data[0]) % 5 == 0
@@ -162,6 +144,14 @@ class TunePIDController:
                 self.log.warning(f"Elapsed {time_data[-1] - time_data[0]} seconds")
 
 
+    async def run_pilot_key(self, action):
+        try:
+            await action(self.follow.pilot)
+        except ActionError as e:
+            self.log.error(e)
+            await self.follow.pilot.hold()
+
+
     async def restart_control(self, delay):
         await asyncio.sleep(delay)
         if not self.tune_yaw:
@@ -201,47 +191,51 @@ class TunePIDController:
             )
             self.log.info(f"Values left {len(self.target_values)}/{len(self.legend)}")
         else:
-            self.plot_results(pid)
+            self.results.close()
+            self.plot_results(pid, Results(self.results.directory))
             raise KeyboardInterrupt
         
 
-    def plot_results(self, pid):
-        input_norm = [[pid.setpoint - i for i in sample] for sample in self.input_data]
-        utils.plot(self.time, input_norm, legend=self.legend[3:], block=False,
+    def plot_results(self, pid, results: Results):
+        records = [record for _, record in results.records()]
+        time = [record["time"] for record in records]
+        input_norm = [pid.setpoint - record["input"] for record in records]
+        utils.plot(time, input_norm, legend=self.legend[3:], block=False,
                    title=("Yaw" if self.tune_yaw else "Forward") + " controller input",
                    ylabel="Computed error [-]")
-        utils.plot(self.time, self.output_data, legend=self.legend[3:], block=False,
+        utils.plot(time, [record["output"] for record in records], legend=self.legend[3:], block=False,
                    title=("Yaw" if self.tune_yaw else "Forward") + " controller output", 
                    ylabel="Output velocity" + " [deg/s]" if self.tune_yaw else " [m/s]")
 
         if self.tune_yaw:
             target_heading = math.atan(100 / 420) * 180 / math.pi + self.START_POS.yaw_deg
-            pilot_time = [[i - sample[0] for i in sample] for sample in self.pilot_time]
-            pilot_pos = [[i.yaw_deg for i in sample] for sample in self.pilot_pos_data]
-            calculated_limits = [sum(sample[-(len(sample)//4):])/(len(sample)//4) for sample in pilot_pos]
+            pilot_time = [record["pilot_time"] - record["pilot_time"][0] for record in records]
+            pilot_pos = [record["pilot_position"][:, 3] for record in records]
+            calculated_limits = [sample[-(len(sample)//4):].mean() for sample in pilot_pos]
             self.log.warn(f"Limits: {calculated_limits}")
             utils.plot(pilot_time + [[0, self.sample_time]], 
                        pilot_pos + [[target_heading, target_heading]],
                        block=False, title="Measured yaw position", legend=self.legend + ["Target"],
                        ylabel="Heading [deg]")
-            utils.plot(pilot_time, [[i[1] for i in sample] for sample in self.pilot_vel_data], block=True,
+            utils.plot(pilot_time, [record["pilot_velocity"][:, 1] for record in records], block=True,
                        title="Measured yaw speed" if self.tune_yaw else "Measured ground speed", legend=self.legend,
                        ylabel="Velocity [deg/s]")
         else:
             target_distance = -100 / 100
-            pilot_time = [[i - sample[0] for i in sample] for sample in self.pilot_time]
-            pilot_pos = [[i.north_m for i in sample] for sample in self.pilot_pos_data]
-            calculated_limits = [sum(sample[-(len(sample)//4):])/(len(sample)//4) for sample in pilot_pos]
+            pilot_time = [record["pilot_time"] - record["pilot_time"][0] for record in records]
+            pilot_pos = [record["pilot_position"][:, 0] for record in records]
+            calculated_limits = [sample[-(len(sample)//4):].mean() for sample in pilot_pos]
             self.log.warn(f"Limits: {calculated_limits}")
             utils.plot(pilot_time[3:] + [[0, self.sample_time]], 
                        pilot_pos[3:] + [[target_distance, target_distance]],
                        block=False, title="Measured forward position", legend=self.legend[3:] + ["Target"],
                        ylabel="Forward movement [m]")
-            utils.plot(pilot_time[3:], [[i[0] for i in sample] for sample in self.pilot_vel_data][3:], block=True,
+            utils.plot(pilot_time[3:], [record["pilot_velocity"][:, 0] for record in records][3:], block=True,
                        title="Measured yaw speed" if self.tune_yaw else "Measured ground speed", legend=self.legend[3:],
                        ylabel="Velocity" + " [rad/s]" if self.tune_yaw else " [m/s]")
 
 
     def close(self):
         self.log.info("All tasks finished")
+        self.results.close()
         self.follow.close()
\ No newline at end of file
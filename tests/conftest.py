@@ -0,0 +1,40 @@
+import numpy
+import pytest
+
+
+FRAME_SIZE = (8, 6) # Width and height of the test frames
+
+
+def build_hand(extended=(True,) * 5, angle=numpy.pi / 2, spread=0.25, scale=1.0, offset=(0.5, 0.5, 0.0)):
+    """Return 21 hand landmarks with the fingers fanned around a direction.
+
+    extended: whether each finger, thumb first, is stretched or curled back
+    angle: direction of the middle finger in radians, anticlockwise from the right
+    spread: angle between neighbour fingers, positive puts the thumb on the left"""
+    hand = numpy.zeros((21, 3))
+    for finger in range(5):
+        direction = angle + (2 - finger) * spread
+        unit = numpy.array([numpy.cos(direction), -numpy.sin(direction), 0])
+        step = 0.1 * unit if extended[finger] else -0.04 * unit
+        hand[1 + 4 * finger:5 + 4 * finger] = [0.3 * unit + i * step for i in range(4)]
+    return hand * scale * 0.3 + offset
+
+
+@pytest.fixture
+def make_hand():
+    return build_hand
+
+
+def build_frame(value, size=FRAME_SIZE):
+    """Return a BGR frame of the given size filled with a value."""
+    return numpy.full((size[1], size[0], 3), value, numpy.uint8)
+
+
+@pytest.fixture
+def frame_size():
+    return FRAME_SIZE
+
+
+@pytest.fixture
+def make_frame():
+    return build_frame
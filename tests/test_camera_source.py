@@ -0,0 +1,53 @@
+import time
+import cv2
+from dronecontrol.common import video_source
+from dronecontrol.common.video_source import CameraSource
+
+class FakeCapture:
+    """Camera with buffered frames numbered in their first pixel,
+    grabs wait for a new frame once the buffer is empty."""
+    def __init__(self, camera, buffered=4):
+        self.buffered = buffered
+        self.count = 0
+        self.grabs = 0
+        self.props = {}
+    def isOpened(self): return True
+    def set(self, prop, value):
+        self.props[prop] = value
+        return True
+    def get(self, prop):
+        return {3: 640, 4: 480, cv2.CAP_PROP_FPS: 30}.get(prop, self.props.get(prop, 0))
+    def grab(self):
+        self.grabs += 1
+        self.count += 1
+        if self.grabs > self.buffered:
+            time.sleep(0.02)
+        return True
+    def retrieve(self, image):
+        image[0, -1] = self.count
+        return True, image
+    def read(self, image):
+        self.grab()
+        return self.retrieve(image)
+    def release(self): pass
+
+def test_options_requested(monkeypatch):
+    monkeypatch.setattr(video_source.cv2, "VideoCapture", FakeCapture)
+    source = CameraSource(fourcc="MJPG", fps=60, buffer_size=1)
+    props = source._CameraSource__source.props
+    assert props[cv2.CAP_PROP_FOURCC] == cv2.VideoWriter_fourcc(*"MJPG")
+    assert props[cv2.CAP_PROP_FPS] == 60
+    assert props[cv2.CAP_PROP_BUFFERSIZE] == 1
+
+def test_read_returns_oldest_frame(monkeypatch):
+    monkeypatch.setattr(video_source.cv2, "VideoCapture", FakeCapture)
+    source = CameraSource()
+    assert source.get_frame()[0, 0, 0] == 1
+    assert source.drained == 0
+
+def test_drain_returns_newest_frame(monkeypatch):
+    monkeypatch.setattr(video_source.cv2, "VideoCapture", FakeCapture)
+    source = CameraSource(drain=True)
+    frame = source.get_frame()
+    assert source.drained == 4
+    assert frame[0, 0, 0] == 5
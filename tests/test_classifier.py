@@ -0,0 +1,44 @@
+import numpy
+from dronecontrol.hands import gestures
+from dronecontrol.hands.classifier import GestureClassifier
+
+det = gestures.Detector()
+
+def make_hands(make_hand, count, seed):
+    """Random hands pointing in random directions with random extended fingers,
+    labelled by the rule-based detector."""
+    rng = numpy.random.default_rng(seed)
+    hands, labels, expected = [], [], []
+    while len(hands) < count:
+        hand = make_hand(extended=rng.random(5) < 0.5, angle=rng.uniform(0.2, numpy.pi - 0.2),
+                         scale=rng.uniform(0.5, 2), offset=rng.uniform(0, 1, 3))
+        hand += rng.normal(0, 0.002, hand.shape)
+        label = str(rng.choice(gestures.HAND_LABELS))
+        gesture = det.classify(hand, label)
+        if gesture:
+            hands.append(hand)
+            labels.append(label)
+            expected.append(gesture)
+    return numpy.array(hands), labels, expected
+
+def accuracy(classifier, hands, labels, expected):
+    return numpy.mean([d == e for d, e in zip(classifier.classify_batch(hands, labels), expected)])
+
+def test_learns_rules(make_hand):
+    classifier = GestureClassifier.train(*make_hands(make_hand, 1500, 0), epochs=60)
+    assert accuracy(classifier, *make_hands(make_hand, 300, 1)) > 0.9
+
+def test_save_and_load(tmp_path, make_hand):
+    hands, labels, expected = make_hands(make_hand, 300, 2)
+    classifier = GestureClassifier.train(hands, labels, expected, epochs=5)
+    classifier.save(tmp_path / "model.npz")
+    loaded = GestureClassifier.load(tmp_path / "model.npz")
+    assert loaded.gestures == classifier.gestures
+    assert numpy.allclose(loaded.predict(hands, labels)[1], classifier.predict(hands, labels)[1])
+
+def test_low_confidence_not_recognised(make_hand):
+    hands, labels, expected = make_hands(make_hand, 300, 3)
+    classifier = GestureClassifier.train(hands, labels, expected, epochs=5)
+    classifier.min_confidence = 1.01
+    assert classifier.classify_batch(hands, labels) == [None] * len(hands)
+    assert classifier.get_gestures(None, None) == {}
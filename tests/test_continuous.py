@@ -0,0 +1,51 @@
+import types
+import asyncio
+import numpy
+from dronecontrol.hands import continuous
+from dronecontrol.hands.gestures import Gesture
+
+def make_palm(x=0.5, y=0.5, size=0.2):
+    """Upright hand with the wrist at the bottom of the palm."""
+    hand = numpy.zeros((21, 3))
+    hand[:, 0] = x
+    hand[:, 1] = y - numpy.linspace(0, size * 2, 21)
+    hand[0, :2] = (x, y)
+    hand[9, :2] = (x, y - size)
+    return hand
+
+def test_clutch():
+    control = continuous.ProportionalControl()
+    assert control.update(make_palm(), Gesture.STOP) == continuous.Velocity()
+    assert control.update(make_palm(x=0.8), Gesture.FIST) == continuous.Velocity()
+    assert control.update(make_palm(x=0.8), Gesture.STOP) == continuous.Velocity()
+
+def test_proportional():
+    control = continuous.ProportionalControl()
+    control.update(make_palm(), Gesture.STOP)
+    assert control.update(make_palm(x=0.51), Gesture.STOP) == continuous.Velocity()
+    velocity = control.update(make_palm(x=0.8, y=0.4), Gesture.STOP)
+    assert velocity.right == control.max_velocity[1]
+    assert 0 < velocity.up < control.max_velocity[2]
+    assert velocity.forward == velocity.yaw == 0
+    assert control.update(make_palm(size=0.3), Gesture.STOP).forward > 0
+
+def test_stream_sends_in_offboard():
+    sent = []
+    async def send_velocity(*velocity):
+        sent.append(velocity)
+    pilot = types.SimpleNamespace(actions=[], current_action_name="", offboard_on=False, send_velocity=send_velocity)
+    stream = continuous.SetpointStream(pilot, rate=100, time_constant=0)
+    stream.set_target(continuous.Velocity(forward=1.0))
+
+    async def run():
+        task = asyncio.create_task(stream.run())
+        await asyncio.sleep(0.05)
+        assert not sent
+        pilot.offboard_on = True
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await task
+
+    asyncio.run(run())
+    assert sent and sent[-1] == (1.0, 0.0, 0.0, 0.0)
+    assert stream.sent == len(sent)
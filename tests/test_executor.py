@@ -0,0 +1,20 @@
+import os
+import asyncio
+from dronecontrol.common.executor import VisionExecutor, ExecutorMode
+
+def get_pids(mode):
+    async def run():
+        executor = VisionExecutor(mode)
+        try:
+            return await executor.run(os.getpid), await executor.run_cpu(os.getpid)
+        finally:
+            executor.close()
+    return asyncio.run(run())
+
+def test_process_mode_runs_cpu_work_in_pool():
+    thread_pid, cpu_pid = get_pids(ExecutorMode.PROCESS)
+    assert thread_pid == os.getpid()
+    assert cpu_pid != os.getpid()
+
+def test_thread_mode_runs_cpu_work_in_thread():
+    assert get_pids(ExecutorMode.THREAD) == (os.getpid(), os.getpid())
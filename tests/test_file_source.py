@@ -0,0 +1,33 @@
+import pytest
+from dronecontrol.common import video_source
+from dronecontrol.common.video_source import FileSource, VideoSourceEmpty
+
+class FakeCapture:
+    """Video file of a few frames that counts how often its size is read."""
+    def __init__(self, file, frames=3):
+        self.frames = frames
+        self.size_reads = 0
+    def isOpened(self): return True
+    def get(self, prop):
+        if prop in (3, 4):
+            self.size_reads += 1
+        return {3: 64, 4: 48}.get(prop, 0)
+    def read(self, image):
+        if self.frames == 0:
+            return False, None
+        self.frames -= 1
+        return True, image
+    def grab(self): return False
+    def release(self): pass
+
+def test_size_not_read_while_prefetching(monkeypatch):
+    captures = []
+    monkeypatch.setattr(video_source.cv2, "VideoCapture", lambda file: captures.append(FakeCapture(file)) or captures[-1])
+    monkeypatch.setattr(video_source.cv2, "destroyAllWindows", lambda: None)
+    source = FileSource("video.avi", real_time=False, prefetch=True)
+    reads = captures[0].size_reads
+    with pytest.raises(VideoSourceEmpty):
+        while True:
+            assert source.get_frame().shape == (48, 64, 3)
+            assert source.get_size() == (64, 48)
+    assert captures[0].size_reads == reads
@@ -0,0 +1,14 @@
+from dronecontrol.common.fleet import Fleet
+from dronecontrol.common.pilot import System
+
+def test_links():
+    fleet = Fleet(2, serials=["/dev/ttyUSB1"], server_addresses=[None, "localhost"])
+    assert len(fleet) == 3
+    assert [vehicle.port for vehicle in fleet.vehicles[:2]] == [14540, 14541]
+    assert fleet.vehicles[2].serial == "/dev/ttyUSB1"
+    assert fleet.connected == []
+
+def test_target():
+    fleet = Fleet(3)
+    fleet.target([0, 2], System.takeoff)
+    assert [len(vehicle.actions) for vehicle in fleet.vehicles] == [1, 0, 1]
@@ -0,0 +1,33 @@
+import numpy
+from dronecontrol.common import frame_archive
+
+def write_archive(path, count, frame_size, make_frame, close=True):
+    writer = frame_archive.ArchiveWriter(str(path), frame_size, fps=10)
+    for i in range(count):
+        writer.write(make_frame(i), timestamp=i * 0.5)
+    if close:
+        writer.release()
+    else:
+        writer.file.close()
+
+def test_read_frames_and_index(tmp_path, frame_size, make_frame):
+    path = tmp_path / "frames.dcfa"
+    write_archive(path, 4, frame_size, make_frame)
+    archive = frame_archive.FrameArchive(str(path))
+    assert len(archive) == 4
+    assert numpy.array_equal(archive[2], make_frame(2))
+    assert archive.timestamps.tolist() == [0, 0.5, 1, 1.5]
+
+def test_copy_on_write(tmp_path, frame_size, make_frame):
+    path = tmp_path / "frames.dcfa"
+    write_archive(path, 2, frame_size, make_frame)
+    frame = frame_archive.FrameArchive(str(path), writable=True)[1]
+    frame[:] = 255
+    assert numpy.array_equal(frame_archive.FrameArchive(str(path))[1], make_frame(1))
+
+def test_recover_unclosed(tmp_path, frame_size, make_frame):
+    path = tmp_path / "frames.dcfa"
+    write_archive(path, 3, frame_size, make_frame, close=False)
+    archive = frame_archive.FrameArchive(str(path))
+    assert len(archive) == 3
+    assert numpy.allclose(archive.timestamps, [0, 0.1, 0.2])
@@ -0,0 +1,38 @@
+import numpy
+from dronecontrol.common.frame_pool import FramePool
+
+def test_reuse_released_frame():
+    pool = FramePool((4, 4, 3), size=1)
+    frame = pool.acquire()
+    pool.release(frame)
+    assert pool.acquire() is frame
+    assert pool.allocated == 1
+
+def test_grow_when_empty():
+    pool = FramePool((4, 4, 3), size=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    assert pool.allocated == 2
+
+def test_retained_frame_not_reused():
+    pool = FramePool((4, 4, 3), size=1)
+    frame = pool.acquire()
+    pool.retain(frame)
+    pool.release(frame)
+    assert pool.in_use() == 1
+    pool.release(frame)
+    assert pool.in_use() == 0
+
+def test_copy_and_blank():
+    pool = FramePool((4, 4, 3))
+    image = numpy.full((4, 4, 3), 7, numpy.uint8)
+    copy = pool.copy(image)
+    assert numpy.array_equal(copy, image)
+    assert not pool.blank.any() and not pool.blank.flags.writeable
+    pool.release(image)
+    assert pool.in_use() == 1
+
+def test_dropped_frame_forgotten():
+    pool = FramePool((4, 4, 3), size=0)
+    pool.acquire()
+    assert pool.in_use() == 0
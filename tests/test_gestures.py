@@ -1,34 +1,75 @@
-from dronecontrol.hands import graphics
+import numpy
 from dronecontrol.hands import gestures
+from dronecontrol.tools.benchmark_gestures import GestureBenchmark
 
-gui = graphics.HandGui()
+det = gestures.Detector()
+
+POINT = (False, True, False, False, False)
+POSES = {
+    gestures.Gesture.STOP: dict(extended=(True,) * 5),
+    gestures.Gesture.FIST: dict(extended=(False,) * 5),
+    gestures.Gesture.POINT_UP: dict(extended=POINT, spread=0.0),
+    gestures.Gesture.POINT_RIGHT: dict(extended=POINT, angle=0.3),
+    gestures.Gesture.POINT_LEFT: dict(extended=POINT, angle=numpy.pi - 0.3),
+    gestures.Gesture.THUMB_RIGHT: dict(extended=(True, True, False, False, False), spread=-0.4),
+    gestures.Gesture.THUMB_LEFT: dict(extended=(True, True, False, False, False), spread=0.4),
+}
+
+class CorpusBenchmark(GestureBenchmark):
+    """Benchmark over hands built in memory instead of extracted from files."""
+    def __init__(self, samples):
+        super().__init__(".", jobs=1, use_cache=False)
+        self.samples = samples
+    def extract(self):
+        files = [(f"{gesture.name}.jpg", gesture) for gesture, _ in self.samples]
+        return files, [sample for _, sample in self.samples], 1.0
 
 def test_no_hand():
-    lm = gui.get_landmarks("img/empty.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.NO_HAND
-
-def test_stop():
-    lm = gui.get_landmarks("img/stop.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.STOP
-
-def test_fist():
-    lm = gui.get_landmarks("img/fist.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.FIST
-
-def test_point_up():
-    lm = gui.get_landmarks("img/one-finger.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.POINT_UP
-
-def test_point_right():
-    lm = gui.get_landmarks("img/one-finger-right.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.POINT_RIGHT
-
-def test_point_left():
-    lm = gui.get_landmarks("img/one-finger-left.jpg").multi_hand_landmarks
-    det = gestures.Detector(lm)
-    assert det.get_gesture() == gestures.Gesture.POINT_LEFT
+    assert det.get_gesture(None, None) == gestures.Gesture.NO_HAND
+
+def test_poses(make_hand):
+    for gesture, pose in POSES.items():
+        for label in gestures.HAND_LABELS:
+            assert det.classify(make_hand(**pose), label) == gesture, (gesture, label)
+
+def test_pose_position_and_size(make_hand):
+    hand = make_hand(**POSES[gestures.Gesture.POINT_LEFT], scale=0.3, offset=(0.9, 0.2, 0.1))
+    assert det.classify(hand, "Right") == gestures.Gesture.POINT_LEFT
+
+def test_benchmark(make_hand):
+    stop, fist = make_hand(**POSES[gestures.Gesture.STOP]), make_hand(**POSES[gestures.Gesture.FIST])
+    samples = [
+        (gestures.Gesture.STOP, (numpy.stack((stop, stop)), ["Right", "Left"], 0.1)),
+        (gestures.Gesture.FIST, (numpy.stack((fist, stop)), ["Right", "Right"], 0.1)),
+        (gestures.Gesture.NO_HAND, (numpy.zeros((1, 21, 3)), [""], 0.1)),
+    ]
+    expected, detected = CorpusBenchmark(samples).run()
+    assert expected == [gestures.Gesture.STOP] * 2 + [gestures.Gesture.FIST] * 2 + [gestures.Gesture.NO_HAND]
+    assert detected == [gestures.Gesture.STOP] * 2 + [gestures.Gesture.FIST, gestures.Gesture.STOP, gestures.Gesture.NO_HAND]
+
+def test_filter_flicker():
+    flt = gestures.GestureFilter(hold_frames=3, rules={})
+    frames = [gestures.Gesture.STOP] * 3 + [gestures.Gesture.NO_HAND, gestures.Gesture.STOP] * 5
+    accepted = [flt.update(g, i / 30) for i, g in enumerate(frames)]
+    assert [g for g in accepted if g] == [gestures.Gesture.STOP]
+
+def test_filter_hold_time():
+    flt = gestures.GestureFilter(window=1, hold_frames=1, hold_time=0.5, rules={})
+    assert all(flt.update(gestures.Gesture.FIST, t / 10) is None for t in range(5))
+    assert flt.update(gestures.Gesture.FIST, 0.5) == gestures.Gesture.FIST
+
+def test_filter_cooldown():
+    rule = gestures.GestureRule(hold_frames=1, cooldown=1.0)
+    flt = gestures.GestureFilter(window=1, rules={gestures.Gesture.FIST: rule})
+    assert flt.update(gestures.Gesture.FIST, 0) == gestures.Gesture.FIST
+    flt.update(gestures.Gesture.STOP, 0.1)
+    flt.update(gestures.Gesture.STOP, 0.2)
+    flt.update(gestures.Gesture.STOP, 0.3)
+    assert flt.update(gestures.Gesture.FIST, 0.4) is None
+    assert flt.update(gestures.Gesture.FIST, 1.1) == gestures.Gesture.FIST
+
+def test_classify_batch(make_hand):
+    hands = numpy.stack([make_hand(**pose) for pose in POSES.values()] * 2)
+    labels = ["Right"] * len(POSES) + ["Left"] * len(POSES)
+    assert det.classify_batch(hands, labels) == list(POSES) * 2
+    assert det.classify_batch(numpy.empty((0, 21, 3)), []) == []
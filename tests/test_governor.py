@@ -0,0 +1,24 @@
+import numpy
+from dronecontrol.common.governor import InferenceGovernor
+
+still = numpy.full((480, 640, 3), 100, numpy.uint8)
+moved = still.copy()
+moved[100:300, 200:400] = 255
+
+def test_still_scene_lowers_rate():
+    governor = InferenceGovernor(still_frames=2, max_interval=4)
+    decisions = [governor.should_infer(still) for _ in range(20)]
+    assert decisions[:3] == [True, True, False]
+    assert governor.interval == 4
+    assert 4 <= governor.skipped <= 15
+
+def test_motion_restores_rate():
+    governor = InferenceGovernor(still_frames=2, max_interval=4)
+    for _ in range(20):
+        governor.should_infer(still)
+    assert governor.should_infer(moved)
+    assert governor.interval == 1
+
+def test_error_keeps_rate():
+    governor = InferenceGovernor(still_frames=2)
+    assert all(governor.should_infer(still, (0.2, 0.0)) for _ in range(20))
@@ -0,0 +1,33 @@
+import asyncio
+import pytest
+from dronecontrol.common import input
+
+def test_bound_functions_called():
+    handler = input.InputHandler()
+    calls = []
+    async def land(): calls.append("land")
+    handler.bind('p', lambda: calls.append("dump"))
+    handler.bind('l', land)
+    assert asyncio.run(handler.handle(ord('p')))
+    assert asyncio.run(handler.handle(ord('l')))
+    assert not asyncio.run(handler.handle(ord('x')))
+    assert not asyncio.run(handler.handle(input.NO_KEY))
+    assert calls == ["dump", "land"]
+
+def test_pilot_keys_bound():
+    handler = input.InputHandler()
+    actions = []
+    handler.bind_pilot(actions.append)
+    asyncio.run(handler.handle(ord('t')))
+    assert actions == [input.PILOT_KEYS['t']]
+
+def test_quit_key():
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(input.InputHandler().handle(ord(input.QUIT_KEY)))
+
+def test_poll_terminal_keys(monkeypatch):
+    monkeypatch.setattr(input.cv2, "pollKey", lambda: -1)
+    handler = input.InputHandler()
+    handler.keys.put(ord('w'))
+    assert handler.poll() == ord('w')
+    assert handler.poll() == input.NO_KEY
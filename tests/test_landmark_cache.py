@@ -0,0 +1,28 @@
+import os
+import numpy
+from dronecontrol.common.landmark_cache import LandmarkCache
+
+def test_overwrite_counts_once(tmp_path):
+    cache = LandmarkCache(str(tmp_path))
+    cache.put("key", numpy.zeros(100))
+    size = cache.size
+    cache.put("key", numpy.ones(100))
+    assert cache.size == size
+    assert numpy.all(cache.get("key") == 1)
+
+def test_temporary_files_not_entries(tmp_path):
+    (tmp_path / "other.npy.123.tmp").write_bytes(b"0" * 1000)
+    cache = LandmarkCache(str(tmp_path))
+    assert cache.size == 0
+    cache.put("key", numpy.zeros(10))
+    assert not [name for name in os.listdir(tmp_path) if name.startswith("key") and name != "key.npy"]
+
+def test_evict_oldest(tmp_path):
+    cache = LandmarkCache(str(tmp_path), max_size=2500)
+    for i in range(3):
+        cache.put(str(i), numpy.zeros(100))
+        os.utime(tmp_path / f"{i}.npy", (i, i))
+    cache.put("3", numpy.zeros(100))
+    assert cache.get("0") is None
+    assert cache.get("3") is not None
+    assert cache.size <= 2500
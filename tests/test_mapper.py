@@ -0,0 +1,38 @@
+from dronecontrol.hands import mapper
+from dronecontrol.hands.gestures import Gesture
+
+class FakePilot:
+    """Pilot that records the queued actions."""
+    def __init__(self, current_action_name=None):
+        self.current_action_name = current_action_name
+        self.actions = []
+    def queue_action(self, func, interrupt=False, **kwargs):
+        self.actions.append((func.__name__, interrupt, kwargs))
+
+def map_hands(yaw=None, move=None, current_action_name=None):
+    """Return the action queued for the gestures of the right (yaw) and left (move) hands."""
+    pilot = FakePilot(current_action_name)
+    hand_gestures = {label: gesture for label, gesture in (("Right", yaw), ("Left", move)) if gesture}
+    mapper.map_hands_to_action(pilot, hand_gestures, yaw_hand="Right")
+    assert len(pilot.actions) == 1
+    return pilot.actions[0]
+
+def test_no_hands_hold():
+    assert map_hands() == ("hold", True, {})
+
+def test_backhand_returns_home():
+    assert map_hands(yaw=Gesture.BACKHAND, move=Gesture.POINT_RIGHT)[0] == "return_home"
+    assert map_hands(move=Gesture.BACKHAND)[0] == "return_home"
+
+def test_resting_yaw_hand_commands():
+    assert map_hands(move=Gesture.FIST) == ("toggle_takeoff_land", True, {})
+    assert map_hands(yaw=Gesture.STOP, move=Gesture.POINT_UP)[0] == "start_offboard"
+    # Not toggled again while the previous toggle is running
+    assert map_hands(move=Gesture.FIST, current_action_name="toggle_takeoff_land") == ("set_velocity", True, {})
+
+def test_velocities_combined():
+    assert map_hands(yaw=Gesture.POINT_RIGHT, move=Gesture.THUMB_RIGHT) == \
+        ("set_velocity", True, dict(yaw=mapper.YAW_SPEED, forward=mapper.MOVE_SPEED))
+    assert map_hands(yaw=Gesture.FIST, move=Gesture.POINT_LEFT) == \
+        ("set_velocity", True, dict(up=-mapper.CLIMB_SPEED, right=-mapper.MOVE_SPEED))
+    assert map_hands(yaw=Gesture.POINT_LEFT) == ("set_velocity", True, dict(yaw=-mapper.YAW_SPEED))
@@ -0,0 +1,67 @@
+import time
+import urllib.request
+from dronecontrol.common.metrics import Registry, MetricsExporter
+
+def test_render():
+    registry = Registry()
+    registry.counter("frames_total", "Frames read", app="follow").inc(3)
+    registry.gauge("queue_depth", "Queued actions").set_function(lambda: 2)
+    histogram = registry.histogram("stage_seconds", "Stage time", buckets=(0.01, 0.1), stage="detect")
+    for value in (0.005, 0.05, 0.5):
+        histogram.observe(value)
+    text = registry.render()
+    assert '# TYPE dronecontrol_frames_total counter' in text
+    assert 'dronecontrol_frames_total{app="follow"} 3' in text
+    assert 'dronecontrol_queue_depth 2' in text
+    assert 'dronecontrol_stage_seconds_bucket{stage="detect",le="0.1"} 2' in text
+    assert 'dronecontrol_stage_seconds_bucket{stage="detect",le="+Inf"} 3' in text
+    assert 'dronecontrol_stage_seconds_count{stage="detect"} 3' in text
+
+def test_same_metric():
+    registry = Registry()
+    assert registry.counter("a_total", "A") is registry.counter("a_total", "A")
+    assert registry.counter("a_total", "A", x=1) is not registry.counter("a_total", "A")
+
+def test_exporter(tmp_path):
+    registry = Registry()
+    registry.counter("frames_total", "Frames read").inc()
+    filepath = str(tmp_path / "metrics.prom")
+    exporter = MetricsExporter(0, filepath, interval=60, registry=registry)
+    with urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics") as response:
+        assert b"dronecontrol_frames_total 1" in response.read()
+    exporter.close()
+    with open(filepath) as file:
+        assert "dronecontrol_frames_total 1" in file.read()
+
+def test_gauge_owner_freed():
+    class Queue:
+        depth = 4
+    registry = Registry()
+    queue = Queue()
+    registry.gauge("queue_depth", "Queued actions", vehicle="a").set_function(lambda owner: owner.depth, queue)
+    assert 'dronecontrol_queue_depth{vehicle="a"} 4' in registry.render()
+    del queue
+    assert "dronecontrol_queue_depth{" not in registry.render()
+
+def test_instance_labels():
+    registry = Registry()
+    assert [registry.instance("loop") for _ in range(3)] == ["loop", "loop-2", "loop-3"]
+    assert registry.instance("follow") == "follow"
+
+def test_exporter_write_error(tmp_path):
+    reads = []
+    def read():
+        reads.append(1)
+        if len(reads) == 1:
+            raise RuntimeError("first read fails")
+        return 1
+    registry = Registry()
+    registry.gauge("flaky", "Fails the first time it is read").set_function(read)
+    filepath = tmp_path / "metrics.prom"
+    exporter = MetricsExporter(filepath=str(filepath), interval=0.01, registry=registry)
+    for _ in range(100):
+        if filepath.exists():
+            break
+        time.sleep(0.01)
+    exporter.close()
+    assert "dronecontrol_flaky 1" in filepath.read_text()
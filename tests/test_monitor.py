@@ -0,0 +1,36 @@
+import time
+import asyncio
+from dronecontrol.common.monitor import LoopMonitor
+
+def test_debug_mode_restored():
+    async def main():
+        loop = asyncio.get_running_loop()
+        monitor = LoopMonitor()
+        monitor.start(slow_callback_time=0.01)
+        assert loop.get_debug() and loop.slow_callback_duration == 0.01
+        await monitor.stop()
+        return loop.get_debug(), loop.slow_callback_duration
+    assert asyncio.run(main(), debug=False) == (False, 0.1)
+
+def test_lag_measured():
+    async def main():
+        monitor = LoopMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05) # Blocks the probe
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+        return monitor
+    monitor = asyncio.run(main())
+    assert max(monitor.lag) >= 0.03
+    assert monitor.get_stats()["loop_lag"]["count"] == len(monitor.lag)
+
+def test_samples_bounded(monkeypatch):
+    monkeypatch.setattr(LoopMonitor, "HISTORY", 3)
+    monitor = LoopMonitor()
+    for i in range(5):
+        monitor.record_action("land", 0, i, i + 1, timed_out=i == 4)
+    stats = monitor.get_stats()["actions"]["land"]
+    assert stats["wait"]["count"] == 3 and stats["wait"]["max"] == 4000
+    assert stats["timeouts"] == 1
+    assert monitor.lag.maxlen == 3
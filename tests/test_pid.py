@@ -0,0 +1,55 @@
+import numpy
+import pytest
+from simple_pid import PID
+from dronecontrol.follow.pid import VectorPID
+
+TUNINGS = [(100, 40, 0), (4, 1, 0.5), (2, 30, 1)]
+LIMITS = [(-5, 5), (-0.4, 0.4), (None, 1)]
+
+def test_matches_simple_pid():
+    inputs = numpy.sin(numpy.linspace(0, 10, 200))[:, None] + numpy.array([0, 0.5, -0.5])
+    scalar = [PID(*gains, setpoint=0.5, output_limits=limits) for gains, limits in zip(TUNINGS, LIMITS)]
+    vector = VectorPID(3, TUNINGS, setpoint=0.5, output_limits=tuple(zip(*LIMITS)))
+    for row in inputs:
+        expected = [pid(value, 0.05) for pid, value in zip(scalar, row)]
+        assert numpy.allclose(vector(row, 0.05), expected)
+        for i, pid in enumerate(scalar):
+            assert numpy.allclose(vector.axis(i).components, pid.components)
+
+def test_sample_time():
+    vector = VectorPID(2, (1, 1, 0))
+    first = vector([0, 1], 0.1)
+    assert vector([5, 5], 0.001) is first
+
+def test_axis_view():
+    vector = VectorPID(2)
+    yaw = vector.axis(0)
+    yaw.tunings = (1, 2, 3)
+    yaw.setpoint = 0.5
+    yaw.output_limits = (-1, None)
+    assert yaw.tunings == (1, 2, 3)
+    assert vector.setpoint.tolist() == [0.5, 0]
+    assert yaw.output_limits == (-1, None)
+    with pytest.raises(ValueError):
+        yaw.output_limits = (1, -1)
+
+def test_evaluate():
+    vector = VectorPID(2, [(1, 0, 0), (2, 0, 0)], sample_time=None)
+    outputs = vector.evaluate(numpy.ones(4), 0.1)
+    assert outputs.shape == (4, 2)
+    assert numpy.allclose(outputs, [[-1, -2]] * 4)
+
+def test_controller_simulated_clock():
+    from dronecontrol.follow.controller import Controller
+    boxes = [((0.1 + i / 100, 0.2), (0.4 + i / 100, 0.9)) for i in range(30)]
+    runs = []
+    for _ in range(2):
+        clock = [0.0]
+        controller = Controller(0.5, 0.6, time_fn=lambda: clock[0])
+        outputs = []
+        for p1, p2 in boxes:
+            clock[0] += 1 / 30
+            outputs.append(controller.control(numpy.array(p1), numpy.array(p2)))
+        runs.append(outputs)
+    assert runs[0] == runs[1]
+    assert numpy.allclose(controller._time_list, numpy.arange(1, 31) / 30)
@@ -0,0 +1,118 @@
+import asyncio
+import types
+import pytest
+from dronecontrol.common import pilot
+from dronecontrol.common.pilot import System
+from mavsdk.telemetry import LandedState, FlightMode
+
+
+class FakeMav:
+    """Telemetry that stops while the link is down, or fails like a crashed mavsdk_server."""
+    def __init__(self, **server):
+        self.link_up = True
+        self.failed = False
+        self.stopped = False
+        self.offboard_active = False
+        self.telemetry = types.SimpleNamespace(attitude_euler=self.attitude_euler, landed_state=self.landed_state,
+                                               flight_mode=self.flight_mode)
+        self.offboard = types.SimpleNamespace(is_active=self.is_active, start=self.start,
+                                              set_velocity_body=self.set_velocity_body)
+
+    async def attitude_euler(self):
+        while True:
+            await asyncio.sleep(0.01)
+            if self.failed:
+                raise RuntimeError("mavsdk_server stopped responding")
+            if self.link_up:
+                yield 0
+
+    async def landed_state(self):
+        yield LandedState.IN_AIR
+
+    async def flight_mode(self):
+        while True:
+            await asyncio.sleep(0.01)
+            if self.link_up:
+                yield FlightMode.OFFBOARD if self.offboard_active else FlightMode.HOLD
+
+    async def connect(self, system_address=None): pass
+    async def is_active(self): return self.offboard_active
+    async def start(self): self.offboard_active = True
+    async def set_velocity_body(self, velocity): pass
+    def _stop_mavsdk_server(self): self.stopped = True
+
+
+@pytest.fixture
+def servers(monkeypatch):
+    """mavsdk Systems created by the pilot, the first one by the constructor."""
+    created = []
+    monkeypatch.setattr(pilot.mavsdk, "System", lambda **server: created.append(FakeMav(**server)) or created[-1])
+    return created
+
+
+def test_unknown_ready_check():
+    with pytest.raises(ValueError):
+        System(ready_checks=("gps",))
+
+def test_supervise_recovers(servers):
+    vehicle = System(ready_checks=())
+    vehicle.RECONNECT_DELAY = 0.05
+    restarted = []
+
+    async def restart():
+        restarted.append(True)
+
+    async def run():
+        vehicle.subscribe_to_reconnect(restart)
+        await vehicle.start_offboard()
+        task = asyncio.create_task(vehicle.supervise(heartbeat_timeout=0.1))
+        await asyncio.sleep(0.2)
+        assert await vehicle.is_connected()
+        vehicle.mav.link_up = False
+        vehicle.mav.offboard_active = False # The vehicle leaves offboard without setpoints
+        await asyncio.sleep(0.3)
+        assert not await vehicle.is_connected()
+        vehicle.mav.link_up = True
+        await asyncio.sleep(0.3)
+        assert await vehicle.is_connected()
+        task.cancel()
+        await task
+
+    vehicle.link_ok = True
+    asyncio.run(run())
+    assert len(vehicle.outages) == 1
+    assert 0.3 < vehicle.outages[0] < 0.6
+    assert restarted == [True]
+    assert vehicle.mav.offboard_active
+    assert len(servers) == 1
+
+def test_failed_server_replaced(servers):
+    vehicle = System(ready_checks=())
+    vehicle.RECONNECT_DELAY = 0.05
+    servers[0].failed = True
+
+    async def run():
+        task = asyncio.create_task(vehicle.supervise(heartbeat_timeout=0.1))
+        await asyncio.sleep(0.4)
+        task.cancel()
+        await task
+
+    asyncio.run(run())
+    assert servers[0].stopped
+    assert vehicle.mav is servers[-1] and not vehicle.mav.stopped
+    assert len(vehicle.outages) == 1
+
+def test_offboard_tracked(servers):
+    vehicle = System(ready_checks=())
+
+    async def run():
+        task = asyncio.create_task(vehicle.supervise(heartbeat_timeout=0.1))
+        await vehicle.start_offboard()
+        assert vehicle.offboard_on
+        vehicle.mav.offboard_active = False # Switched out of offboard by the vehicle
+        await asyncio.sleep(0.05)
+        assert not vehicle.offboard_on
+        task.cancel()
+        await task
+
+    asyncio.run(run())
@@ -0,0 +1,37 @@
+import numpy
+import pytest
+from dronecontrol.common import plotting
+
+x = numpy.linspace(0, 10, 10000)
+y = numpy.sin(x) + (numpy.arange(len(x)) == 5000) * 5
+
+def test_lttb():
+    dx, dy = plotting.lttb(x, y, 200)
+    assert len(dx) == 200
+    assert dx[0] == x[0] and dx[-1] == x[-1]
+    assert numpy.all(numpy.diff(dx) > 0)
+    assert dy.max() == y.max()
+
+def test_short_series_unchanged():
+    dx, dy = plotting.lttb(x[:50], y[:50], 200)
+    assert numpy.array_equal(dy, y[:50])
+
+def test_plot_error_reported(tmp_path, monkeypatch):
+    monkeypatch.setattr(plotting.tempfile, "tempdir", str(tmp_path))
+    plotter = plotting.Plotter()
+    # One panel without its ylabel fails in the plotting process
+    assert not plotter.plot(x, [y], subplots=[1], ylabel=[], block=True)
+    assert len(plotter.errors) == 1
+    plotter.close()
+    assert list(tmp_path.iterdir()) == []
+
+def test_blocking_plot_drawn(tmp_path, monkeypatch):
+    pytest.importorskip("matplotlib")
+    monkeypatch.setenv("MPLBACKEND", "Agg")
+    monkeypatch.setattr(plotting.tempfile, "tempdir", str(tmp_path))
+    plotter = plotting.Plotter()
+    assert plotter.plot(x, [y, -y], title="Test", block=True)
+    assert plotter.errors == []
+    assert all(not any(directory.iterdir()) for directory in tmp_path.iterdir())
+    plotter.close()
+    assert list(tmp_path.iterdir()) == []
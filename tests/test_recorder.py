@@ -0,0 +1,43 @@
+import time
+import numpy
+from dronecontrol.common import recorder
+
+def test_raw_segments(tmp_path, frame_size, make_frame):
+    rec = recorder.Recorder(frame_size, format=recorder.RecordFormat.RAW, directory=str(tmp_path), segment_frames=2)
+    rec.start()
+    for i in range(5):
+        assert rec.write(make_frame(i), timestamp=i / 10)
+    rec.stop()
+    assert rec.written == 5 and rec.dropped == 0
+
+    info, index = recorder.load_recording(str(tmp_path))
+    assert info["format"] == "RAW"
+    assert index[:, 0].tolist() == [0, 0, 1, 1, 2]
+    assert index[:, 1].tolist() == [0, 1, 0, 1, 0]
+    assert numpy.allclose(index[:, 2], [0, 0.1, 0.2, 0.3, 0.4])
+
+    segment = numpy.fromfile(tmp_path / recorder.get_segment_name(1, recorder.RecordFormat.RAW), numpy.uint8)
+    frames = segment.reshape(-1, frame_size[1], frame_size[0], 3)
+    assert numpy.array_equal(frames[1], make_frame(3))
+
+def test_write_when_stopped(tmp_path, frame_size, make_frame):
+    rec = recorder.Recorder(frame_size, directory=str(tmp_path))
+    assert not rec.write(make_frame(0))
+    assert rec.dropped == 0
+
+def test_write_error_stops_recording(tmp_path, frame_size, make_frame, monkeypatch):
+    def write(self, frame):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(recorder.RawWriter, "write", write)
+    rec = recorder.Recorder(frame_size, format=recorder.RecordFormat.RAW, directory=str(tmp_path), queue_size=2)
+    rec.start()
+    assert rec.write(make_frame(0))
+    for _ in range(100):
+        if rec.failed:
+            break
+        time.sleep(0.01)
+    assert rec.failed
+    assert not rec.write(make_frame(1))
+    rec.stop()
+    assert rec.written == 0
+    assert (tmp_path / recorder.INDEX_FILE).read_text().splitlines() == ["segment,frame,timestamp"]
@@ -0,0 +1,26 @@
+import numpy
+from dronecontrol.common.results import ResultWriter, Results
+
+def test_append_and_load(tmp_path):
+    writer = ResultWriter("test", str(tmp_path), axis="yaw")
+    writer.append(-150, time=[0, 0.1, 0.2], yaw=[[0.5] * 3, [0.2, 0.3, 0.4], [5, 4, 3]])
+    writer.append("4 1 0", time=[0.0])
+    writer.append("4 1 0", time=[1.0])
+
+    # Records are readable before the writer is closed
+    results = Results(str(tmp_path))
+    assert results.info == {"name": "test", "axis": "yaw"}
+    assert results.keys() == ["-150", "4 1 0"]
+    assert results[-150]["yaw"].shape == (3, 3)
+    assert results["4 1 0"]["time"].tolist() == [1.0]
+    assert [r["time"][0] for _, r in results.records("4 1 0")] == [0.0, 1.0]
+    writer.close()
+
+def test_resume(tmp_path):
+    ResultWriter("test", str(tmp_path), axis="yaw").append("a", x=numpy.zeros(2))
+    writer = ResultWriter("test", str(tmp_path), axis="fwd")
+    writer.append("b", x=numpy.ones(2))
+    writer.close()
+    results = Results(str(tmp_path))
+    assert len(results) == 2
+    assert results.info == {"name": "test", "axis": "yaw"}
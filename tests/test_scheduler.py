@@ -0,0 +1,53 @@
+import asyncio
+from dronecontrol.common.scheduler import RateScheduler, LatePolicy
+
+class FakeClock:
+    """Clock that only moves when the loop works or sleeps."""
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+    def time(self):
+        return self.now
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+def make_scheduler(rate, policy=LatePolicy.SKIP_RENDER):
+    clock = FakeClock()
+    return RateScheduler(rate, policy, time_fn=clock.time, sleep_fn=clock.sleep), clock
+
+def run_cycles(scheduler, clock, work_times):
+    async def loop():
+        scheduler.start()
+        start = clock.now
+        for work_time in work_times:
+            clock.now += work_time
+            await scheduler.wait()
+        return clock.now - start
+    return asyncio.run(loop())
+
+def test_fixed_rate():
+    scheduler, clock = make_scheduler(100)
+    elapsed = run_cycles(scheduler, clock, [0.002] * 20)
+    assert abs(elapsed - 0.2) < 1e-9
+    assert all(abs(delay - 0.008) < 1e-9 for delay in clock.sleeps)
+    assert scheduler.overruns == 0
+
+def test_skip_render_when_late():
+    scheduler, clock = make_scheduler(100, LatePolicy.SKIP_RENDER)
+    run_cycles(scheduler, clock, [0.015])
+    assert scheduler.overruns == 1
+    assert not scheduler.should_render
+    run_cycles(scheduler, clock, [0])
+    assert scheduler.should_render
+
+def test_skip_frame():
+    scheduler, clock = make_scheduler(100, LatePolicy.SKIP_FRAME)
+    run_cycles(scheduler, clock, [0.025])
+    assert scheduler.skipped == 2
+    assert abs(clock.now - 0.03) < 1e-9
+
+def test_degrade():
+    scheduler, clock = make_scheduler(100, LatePolicy.DEGRADE)
+    run_cycles(scheduler, clock, [0.015] * RateScheduler.DEGRADE_AFTER)
+    assert scheduler.degraded
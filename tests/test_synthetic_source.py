@@ -0,0 +1,48 @@
+import numpy
+from dronecontrol.common.video_source import SyntheticSource
+
+def centre(box):
+    return (box[0] + box[1]) / 2
+
+def test_still_person_centred():
+    source = SyntheticSource("still", distance=4.0)
+    frame = source.get_frame()
+    p1, p2 = source.subject_box
+    assert abs(centre(source.subject_box)[0] - 0.5) < 0.01
+    assert 0.2 < p2[1] - p1[1] < 0.4
+    assert frame.shape == (480, 640, 3)
+
+def test_person_moves_across_mirrored_image():
+    source = SyntheticSource(lambda t: (t, 4.0))
+    source.get_frame()
+    for _ in range(30):
+        source.get_frame()
+    # One metre to the right of the camera is on the left of the mirrored image
+    assert centre(source.subject_box)[0] < 0.4
+
+def test_commands_close_the_loop():
+    source = SyntheticSource(lambda t: (2.0, 6.0))
+    source.get_frame()
+    for _ in range(300):
+        box = source.subject_box
+        source.command(yaw=100 * (0.5 - centre(box)[0]), forward=4 * (0.5 - (box[1][1] - box[0][1])))
+        source.get_frame()
+    assert abs(centre(source.subject_box)[0] - 0.5) < 0.02
+    assert abs(source.subject_box[1][1] - source.subject_box[0][1] - 0.5) < 0.02
+
+def test_person_behind_camera_not_visible():
+    source = SyntheticSource("still")
+    source.command(yaw=180 * source.fps)
+    source.get_frame()
+    assert source.subject_box is None
+
+def test_other_people_drawn_behind_closer_ones():
+    source = SyntheticSource("still", others=[lambda t: (0.0, 8.0), lambda t: (-2.0, -1.0)])
+    frame = source.get_frame()
+    person, behind, not_visible = source.people_boxes
+    assert numpy.allclose(numpy.concatenate(person), numpy.concatenate(source.subject_box))
+    assert behind[1][1] - behind[0][1] < person[1][1] - person[0][1]
+    assert not_visible is None
+    # The far person is hidden where the closer one stands
+    alone = SyntheticSource("still").get_frame()
+    assert numpy.array_equal(frame[240, 320], alone[240, 320])
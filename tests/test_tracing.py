@@ -0,0 +1,26 @@
+import json
+import asyncio
+from dronecontrol.common.tracing import Tracer
+
+def test_traced_records_calls_with_frame(tmp_path):
+    tracer = Tracer()
+    def control(): return 1
+    async def set_velocity(): return 2
+    control, set_velocity = tracer.traced(control), tracer.traced(set_velocity)
+    tracer.next_frame()
+    assert control() == 1
+    assert asyncio.run(set_velocity()) == 2
+
+    with open(tracer.dump(tmp_path / "trace.json")) as file:
+        events = [event for event in json.load(file)["traceEvents"] if event["ph"] == "X"]
+    assert [(event["name"], event["args"]["frame"]) for event in events] == [("control", 1), ("set_velocity", 1)]
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer(enabled=False)
+    tracer.traced(lambda: None)()
+    assert len(tracer.events) == 0
+
+def test_disabled_tracer_dumps_nothing(tmp_path):
+    tracer = Tracer(enabled=False)
+    assert tracer.dump(tmp_path / "trace.json") is None
+    assert not (tmp_path / "trace.json").exists()
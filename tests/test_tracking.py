@@ -0,0 +1,37 @@
+import numpy
+from dronecontrol.follow import tracking
+
+LEFT = numpy.array([0.1, 0.2, 0.3, 0.8])
+CENTER = numpy.array([0.4, 0.2, 0.6, 0.8])
+
+def test_iou():
+    ious = tracking.iou(numpy.array([LEFT, CENTER]), numpy.array([CENTER]))
+    assert ious[0, 0] == 0
+    assert abs(ious[1, 0] - 1) < 1e-6
+
+def test_lock_center():
+    tracker = tracking.PersonTracker()
+    tracker.update([LEFT, CENTER])
+    assert numpy.array_equal(tracker.target.box, CENTER)
+
+def test_keep_identity():
+    tracker = tracking.PersonTracker()
+    tracker.update([LEFT, CENTER])
+    target_id = tracker.target_id
+    tracker.update([CENTER + 0.02, LEFT + 0.01])
+    assert tracker.target_id == target_id
+    assert numpy.allclose(tracker.target.box, CENTER + 0.02)
+
+def test_lost_target():
+    tracker = tracking.PersonTracker(max_misses=1)
+    tracker.update([LEFT, CENTER])
+    tracker.update([LEFT])
+    tracker.update([LEFT])
+    assert numpy.array_equal(tracker.target.box, LEFT)
+
+def test_switch_target():
+    tracker = tracking.PersonTracker()
+    tracker.update([LEFT, CENTER])
+    target_id = tracker.target_id
+    tracker.switch_target()
+    assert tracker.target_id != target_id
@@ -0,0 +1,30 @@
+from dronecontrol.common.frame_pool import FramePool
+from dronecontrol.common.video_source import VideoSource
+
+class CountingSource(VideoSource):
+    """Source whose frames are filled with their number."""
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+    def get_frame(self):
+        self.count += 1
+        frame = self.pool.acquire()
+        frame.fill(self.count)
+        return self._set_frame(frame)
+    def close(self): pass
+
+def test_held_frame_not_reused():
+    source = CountingSource()
+    held = source.get_frame()
+    for _ in range(10):
+        source.get_frame()
+    assert (held == 1).all()
+
+def test_released_frame_reused():
+    source = CountingSource()
+    frame = source.get_frame()
+    source.release(frame)
+    next_frame = source.get_frame()
+    source.release(next_frame)
+    assert source.get_frame() is frame
+    assert source.pool.allocated == FramePool.DEFAULT_SIZE